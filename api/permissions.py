@@ -330,8 +330,7 @@ class InMaintenance(permissions.BasePermission):
     """
 
     def has_permission(self, request, view):
-        records = MaintenanceRecord.active()\
-                                   .filter(provider__isnull=True)
+        records = MaintenanceRecord.active_global()
         if records:
             request_username = request.user.username
             #TODO: Optional logic related to session_username -- the one who is 'Authenticated'..
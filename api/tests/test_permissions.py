@@ -4,8 +4,16 @@ tests for custom permission classes
 import unittest
 import mock
 
-from api.permissions import CanEditOrReadOnly
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from api import ServiceUnavailable
+from api.permissions import CanEditOrReadOnly, InMaintenance
 from api.tests.factories import UserFactory, AnonymousUserFactory
+from core.models import MaintenanceRecord
+from core.models import maintenance
+from service.tests.test_cache import FakeRedis
 
 
 class TestCanEditOrReadOnly(unittest.TestCase):
@@ -75,3 +83,63 @@ class TestCanEditOrReadOnly(unittest.TestCase):
         assert self.permissions.has_object_permission(
             self.request, self.view, self.obj
         )
+
+
+@override_settings(MAINTENANCE_CACHE_TTL=60)
+class TestInMaintenance(TestCase):
+    def setUp(self):
+        maintenance._global_records_cache.clear()
+        self.permission = InMaintenance()
+        self.request = mock.Mock()
+        self.request.user = UserFactory.create()
+        self.view = mock.Mock()
+
+    def tearDown(self):
+        maintenance._global_records_cache.clear()
+
+    def test_no_maintenance_is_cached(self):
+        assert self.permission.has_permission(self.request, self.view)
+        with self.assertNumQueries(0):
+            assert self.permission.has_permission(self.request, self.view)
+
+
+@override_settings(MAINTENANCE_CACHE_TTL=60)
+class TestInMaintenanceInvalidation(TransactionTestCase):
+    """
+    The cache is invalidated on commit, which TestCase never does.
+    """
+
+    def setUp(self):
+        maintenance._global_records_cache.clear()
+        self.redis = FakeRedis()
+        patcher = mock.patch(
+            'service.cache.redis_connection', return_value=self.redis
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.permission = InMaintenance()
+        self.request = mock.Mock()
+        self.request.user = UserFactory.create()
+        self.view = mock.Mock()
+
+    def tearDown(self):
+        maintenance._global_records_cache.clear()
+
+    def test_new_record_invalidates_cache(self):
+        assert self.permission.has_permission(self.request, self.view)
+        with transaction.atomic():
+            MaintenanceRecord.objects.create(
+                title="Maintenance",
+                message="Down for maintenance",
+                start_date=timezone.now()
+            )
+            # Not bumped yet: other processes would reload the old records
+            self.assertEqual(
+                self.redis.get(maintenance.MAINTENANCE_VERSION_KEY), 0
+            )
+            assert self.permission.has_permission(self.request, self.view)
+        self.assertEqual(
+            self.redis.get(maintenance.MAINTENANCE_VERSION_KEY), 1
+        )
+        with self.assertRaises(ServiceUnavailable):
+            self.permission.has_permission(self.request, self.view)
@@ -2,6 +2,8 @@ import uuid
 import mock
 
 from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from rest_framework.test import APIClient
@@ -14,6 +16,10 @@ from api.tests.factories import (
 )
 from .base import APISanityTestCase
 from api.v2.views import InstanceViewSet
+from core.models import (
+    AllocationSource, AllocationSourceSnapshot,
+    InstanceAllocationSourceSnapshot, UserAllocationSnapshot
+)
 
 
 class InstanceTests(APITestCase, APISanityTestCase):
@@ -164,3 +170,56 @@ class InstanceTests(APITestCase, APISanityTestCase):
         with mock.patch('api.v2.views.instance.destroy_instance'):
             response = client.delete(url, HTTP_ACCEPT='application/json')
         self.assertEquals(response.status_code, 204)
+
+    def _list_queries(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(reverse(self.url_route + "-list"))
+        self.assertEquals(response.status_code, 200)
+        return response.data, len(context.captured_queries)
+
+    def _add_instance(self, status, allocation_source):
+        instance = InstanceFactory.create(
+            provider_alias=uuid.uuid4(),
+            source=self.machine.instance_source,
+            created_by=self.user,
+            created_by_identity=self.user_identity,
+            start_date=timezone.now()
+        )
+        InstanceHistoryFactory.create(status=status, instance=instance)
+        InstanceAllocationSourceSnapshot.objects.create(
+            instance=instance, allocation_source=allocation_source
+        )
+
+    def test_list_query_count_does_not_grow_with_instances(self):
+        allocation_source = AllocationSource.objects.create(
+            name='TEST_INSTANCE_LIST_QUERIES', compute_allowed=1000
+        )
+        AllocationSourceSnapshot.objects.create(
+            allocation_source=allocation_source,
+            compute_used=10,
+            compute_allowed=1000,
+            global_burn_rate=1
+        )
+        UserAllocationSnapshot.objects.create(
+            allocation_source=allocation_source,
+            user=self.user,
+            burn_rate=1,
+            compute_used=5
+        )
+        active = InstanceStatusFactory.create(name='active')
+        self._add_instance(active, allocation_source)
+        data, queries = self._list_queries()
+
+        for _ in range(5):
+            self._add_instance(active, allocation_source)
+        more_data, more_queries = self._list_queries()
+        self.assertEquals(more_data['count'], data['count'] + 5)
+        self.assertEquals(more_queries, queries)
+        allocation_data = [
+            instance['allocation_source'] for instance in more_data['results']
+            if instance['allocation_source']
+        ]
+        self.assertEquals(len(allocation_data), 6)
+        self.assertEquals(allocation_data[0]['user_compute_used'], 5)
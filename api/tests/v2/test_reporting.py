@@ -1,11 +1,68 @@
+import zipfile
+from datetime import datetime
+from io import BytesIO
 from unittest import skip
+from xml.etree import ElementTree
 
+import pytz
 from django.core.urlresolvers import reverse
 from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
 
-from api.tests.factories import UserFactory, AnonymousUserFactory
+from api.tests.factories import (
+    UserFactory, AnonymousUserFactory, InstanceFactory, TagFactory
+)
 from api.v2.views import ReportingViewSet
 
+XLSX_NAMESPACE = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+def _read_workbook(content):
+    """
+    Return [(sheet name, rows)] of an XLSX file written by xlsxwriter, where
+    rows are {column letter: value} dicts.
+    """
+    archive = zipfile.ZipFile(BytesIO(content))
+    shared_strings = []
+    if 'xl/sharedStrings.xml' in archive.namelist():
+        shared_strings = [
+            ''.join(text.text or '' for text in item.iter(XLSX_NAMESPACE + 't'))
+            for item in ElementTree.fromstring(
+                archive.read('xl/sharedStrings.xml')
+            ).iter(XLSX_NAMESPACE + 'si')
+        ]
+    sheets = []
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    for index, sheet in enumerate(workbook.iter(XLSX_NAMESPACE + 'sheet'), 1):
+        rows = []
+        for row in ElementTree.fromstring(
+            archive.read('xl/worksheets/sheet%s.xml' % index)
+        ).iter(XLSX_NAMESPACE + 'row'):
+            values = {}
+            for cell in row.iter(XLSX_NAMESPACE + 'c'):
+                column = cell.get('r').rstrip('0123456789')
+                if cell.get('t') == 'inlineStr':
+                    values[column] = ''.join(
+                        text.text or ''
+                        for text in cell.iter(XLSX_NAMESPACE + 't')
+                    )
+                    continue
+                value = cell.find(XLSX_NAMESPACE + 'v')
+                if value is None:
+                    continue
+                if cell.get('t') == 's':
+                    values[column] = shared_strings[int(value.text)]
+                elif cell.get('t') in ['str', 'b']:
+                    values[column] = value.text
+                else:
+                    values[column] = float(value.text)
+            rows.append(values)
+        sheets.append((sheet.get('name'), rows))
+    return sheets
+
+
+def _excel_date(date):
+    return float((date - datetime(1899, 12, 30)).days)
+
 
 class ReportingTests(APITestCase):
     def setUp(self):
@@ -51,6 +108,94 @@ class ReportingTests(APITestCase):
                 'Invalid filter parameters'
             )
 
+    def test_streaming_csv(self):
+        instance = InstanceFactory.create(created_by=self.user)
+        provider = instance.created_by_identity.provider
+        factory = APIRequestFactory()
+        url = (
+            'api/v2/reporting?start_date=1901-10-29&end_date=3077-10-29'
+            '&provider_id=%s&format=csv&stream=true' % provider.id
+        )
+        request = factory.get(url)
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = ''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('id,instance_id,username'))
+        self.assertIn(instance.provider_alias, lines[1])
+
+    def test_streaming_xlsx(self):
+        first = InstanceFactory.create(
+            created_by=self.user,
+            provider_alias='instance-0',
+            start_date=datetime(2017, 1, 2, tzinfo=pytz.utc)
+        )
+        first.source.providermachine.application_version.application.tags.add(
+            TagFactory.create(name='featured')
+        )
+        instances = [first] + [
+            InstanceFactory.create(
+                created_by=self.user,
+                created_by_identity=first.created_by_identity,
+                source=first.source,
+                provider_alias='instance-%s' % index,
+                start_date=start_date
+            ) for index, start_date in [
+                (1, datetime(2017, 1, 20, tzinfo=pytz.utc)),
+                (2, datetime(2017, 3, 5, tzinfo=pytz.utc)),
+            ]
+        ]
+        provider = first.created_by_identity.provider
+        factory = APIRequestFactory()
+        url = (
+            'api/v2/reporting?start_date=1901-10-29&end_date=3077-10-29'
+            '&provider_id=%s&format=xlsx&stream=true&frequency=monthly'
+            '&ordering=-start_date' % provider.id
+        )
+        request = factory.get(url)
+        force_authenticate(request, user=self.user)
+        response = self.view(request)
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        sheets = _read_workbook(''.join(response.streaming_content))
+        self.assertEqual(
+            [name for name, _ in sheets], [
+                'Monthly Summary', 'Image Summary', 'User Summary',
+                'Raw Data'
+            ]
+        )
+        summary_rows, image_rows, user_rows, raw_rows = [
+            rows for _, rows in sheets
+        ]
+        # As with `resample`, the empty February is listed
+        self.assertEqual(len(summary_rows), 4)
+        self.assertEqual(
+            summary_rows[1], {
+                'A': _excel_date(datetime(2017, 1, 1)),
+                'B': 1.0,
+                'C': 2.0,
+                'D': 1.0,
+                'E': 2.0
+            }
+        )
+        self.assertEqual(
+            summary_rows[2], {
+                'A': _excel_date(datetime(2017, 2, 1)),
+                'C': 0.0,
+                'E': 0.0
+            }
+        )
+        self.assertEqual((len(image_rows), len(user_rows)), (3, 3))
+        # Rows follow ?ordering=
+        self.assertEqual(len(raw_rows), 4)
+        self.assertEqual(
+            [row['B'] for row in raw_rows[1:]],
+            [instance.provider_alias for instance in reversed(instances)]
+        )
+
     @skip('skip for now')
     def test_access_invalid_provider(self):
         raise NotImplementedError
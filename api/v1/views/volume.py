@@ -26,6 +26,7 @@ from core.models.instance_source import InstanceSource
 from core.models.group import IdentityMembership
 
 from service.driver import prepare_driver
+from service.quota import invalidate_quota_usage
 from service.volume import create_esh_volume,\
     create_bootable_volume,\
     _update_volume_metadata
@@ -548,6 +549,7 @@ class Volume(AuthAPIView):
         )
         # Delete the object, update the DB
         esh_driver.destroy_volume(esh_volume)
+        invalidate_quota_usage(identity_uuid)
         core_volume.end_date = now()
         core_volume.save()
         # Return the object
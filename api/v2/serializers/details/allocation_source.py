@@ -20,10 +20,9 @@ class AllocationSourceSerializer(serializers.HyperlinkedModelSerializer):
     )
 
     def _get_allocation_source_snapshot(self, allocation_source, attr_name):
-        snapshot = AllocationSourceSnapshot.objects.filter(
-            allocation_source=allocation_source
-        ).first()
-        if not snapshot:
+        try:
+            snapshot = allocation_source.snapshot
+        except AllocationSourceSnapshot.DoesNotExist:
             return None
         attr = getattr(snapshot, attr_name)
         return attr
@@ -35,9 +34,15 @@ class AllocationSourceSerializer(serializers.HyperlinkedModelSerializer):
 
     def _get_user_allocation_snapshot(self, allocation_source, attr_name):
         user = self._get_request_user()
-        snapshot = UserAllocationSnapshot.objects.filter(
-            allocation_source=allocation_source, user=user
-        ).first()
+        # Set by a Prefetch(..., to_attr='request_user_snapshots') filtered
+        # on the request user, as in InstanceViewSet
+        snapshots = getattr(allocation_source, 'request_user_snapshots', None)
+        if snapshots is not None:
+            snapshot = snapshots[0] if snapshots else None
+        else:
+            snapshot = UserAllocationSnapshot.objects.filter(
+                allocation_source=allocation_source, user=user
+            ).first()
         if not snapshot:
             return None
         attr = getattr(snapshot, attr_name)
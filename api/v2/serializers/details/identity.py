@@ -47,7 +47,8 @@ class IdentitySerializer(serializers.HyperlinkedModelSerializer):
             raise serializers.ValidationError(
                 "Unexpected error occurred during Event save: %s" % exc
             )
-        # Synchronous call to EventTable -> Set Quota for Identity's CloudProvider -> Save the Quota to Identity
+        # EventTable -> Save the Quota to Identity (synchronous)
+        # -> Set Quota for Identity's CloudProvider (once committed)
         identity = Identity.objects.get(uuid=core_identity.uuid)
         return identity
 
@@ -1,7 +1,4 @@
-from core.models import (
-    Project, BootScript, Instance, Application as Image,
-    InstanceAllocationSourceSnapshot
-)
+from core.models import Project, BootScript, Instance
 from rest_framework import serializers
 from core.serializers.fields import ModelRelatedField
 from api.v2.serializers.details import AllocationSourceSerializer
@@ -46,14 +43,14 @@ class InstanceSerializer(serializers.HyperlinkedModelSerializer):
         uuid_field='provider_alias'
     )
 
+    # NOTE: Every method below reads relations that
+    # InstanceViewSet.get_queryset selects up front. Keep the two in sync.
     def get_allocation_source(self, instance):
-        snapshot = InstanceAllocationSourceSnapshot.objects.filter(
-            instance=instance
-        ).first()
-        if not snapshot:
+        allocation_source = instance.allocation_source
+        if not allocation_source:
             return None
         serializer = AllocationSourceSerializer(
-            snapshot.allocation_source, context=self.context
+            allocation_source, context=self.context
         )
         return serializer.data
 
@@ -71,8 +68,7 @@ class InstanceSerializer(serializers.HyperlinkedModelSerializer):
     def get_image(self, obj):
         if not obj.source.is_machine():
             return {}
-        image_uuid = obj.application_uuid()
-        image = Image.objects.get(uuid=image_uuid)
+        image = obj.source.providermachine.application_version.application
         serializer = ImageSuperSummarySerializer(image, context=self.context)
         return serializer.data
 
@@ -1,5 +1,5 @@
 import django_filters
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 
 from api.v2.serializers.details import InstanceSerializer, InstanceActionSerializer
 from api.v2.serializers.post import InstanceSerializer as POST_InstanceSerializer
@@ -8,6 +8,7 @@ from api.v2.views.mixins import MultipleFieldLookup
 
 from core.exceptions import ProviderNotActive
 from core.models import Instance, Identity, UserAllocationSource, Project, AllocationSource
+from core.models.allocation_source import UserAllocationSnapshot
 from core.models.boot_script import _save_scripts_to_instance
 from core.models.instance import find_instance
 from core.models.instance_action import InstanceAction
@@ -82,10 +83,27 @@ class InstanceViewSet(MultipleFieldLookup, AuthModelViewSet):
         if 'archived' not in self.request.query_params:
             qs = qs.filter(only_current_instances())
         # logger.info("DEBUG- User %s querying for instances, available IDs are:%s" % (user, qs.values_list('id',flat=True)))
-        qs = qs.select_related("created_by")\
-            .select_related('created_by_identity')\
-            .select_related('source')\
-            .select_related('project')
+        # Everything InstanceSerializer reads, so a page costs a fixed
+        # number of queries
+        qs = qs.select_related(
+            'created_by',
+            'created_by_identity__provider',
+            'source__providermachine__application_version__application',
+            'project__created_by',
+            'project__owner',
+            'last_status_history__status',
+            'last_status_history__size',
+            'instanceallocationsourcesnapshot__allocation_source__snapshot',
+        ).prefetch_related(
+            'created_by_identity__credential_set',
+            'scripts__script_type',
+            Prefetch(
+                'instanceallocationsourcesnapshot__allocation_source'
+                '__user_allocation_snapshots',
+                queryset=UserAllocationSnapshot.objects.filter(user=user),
+                to_attr='request_user_snapshots'
+            ),
+        )
         return qs
 
     @detail_route(methods=['post'])
@@ -1,11 +1,18 @@
 """
  RESTful Reporting API
 """
+import csv
+import tempfile
+from datetime import timedelta
+from wsgiref.util import FileWrapper
+
 import numpy as np
 import pandas as pd
 import pytz
+import xlsxwriter
 from dateutil.parser import parse
 from django.db.models import Q
+from django.http import StreamingHttpResponse
 from rest_framework import exceptions
 from rest_framework import status
 from rest_framework.settings import api_settings
@@ -27,6 +34,23 @@ class ReportingViewSet(AuthModelViewSet):
     ordering_fields = ('id', 'start_date')
     http_method_names = ['get', 'head', 'options', 'trace']
 
+    headers_ordering = [
+        "id", "instance_id", "username", "staff_user", "provider",
+        "start_date", "end_date", "image_name", "version_name", "size.active",
+        "size.start_date", "size.end_date", "size.name", "size.id",
+        "size.uuid", "size.url", "size.alias", "size.cpu", "size.mem",
+        "size.disk", "is_featured_image", "hit_active", "hit_deploy_error",
+        "hit_error", "hit_aborted", "hit_active_or_aborted",
+        "hit_active_or_aborted_or_error"
+    ]
+    # Columns left out of the 'Raw Data' worksheet
+    excel_dropped_headers = [
+        'size.id', 'size.uuid', 'size.alias', 'size.active', 'size.start_date',
+        'size.end_date', 'size.url'
+    ]
+    # Bytes read from the temporary workbook per streamed chunk
+    excel_chunk_size = 64 * 1024
+
     class Meta:
         model = Instance
 
@@ -56,16 +80,7 @@ class ReportingViewSet(AuthModelViewSet):
             'excel_writer_hook':
                 self.create_excel_file,
             'headers_ordering':
-                [
-                    "id", "instance_id", "username", "staff_user", "provider",
-                    "start_date", "end_date", "image_name", "version_name",
-                    "size.active", "size.start_date", "size.end_date",
-                    "size.name", "size.id", "size.uuid", "size.url",
-                    "size.alias", "size.cpu", "size.mem", "size.disk",
-                    "is_featured_image", "hit_active", "hit_deploy_error",
-                    "hit_error", "hit_aborted", "hit_active_or_aborted",
-                    "hit_active_or_aborted_or_error"
-                ],
+                self.headers_ordering,
         }
 
     def set_frequency(self):
@@ -201,16 +216,7 @@ class ReportingViewSet(AuthModelViewSet):
         global_summary_data = new_datasets['Global Summary']
 
         # Write summary data to the writer
-        if frequency in ['AS']:
-            summary_format = 'yyyy'
-        elif frequency in ['MS', 'QS']:
-            summary_format = 'mmmm yyyy'
-        elif frequency in ['W', 'D']:
-            summary_format = 'mmm d yyyy'
-        else:
-            summary_format = 'mmm d yyyy hh:mm:ss'
-
-        writer.datetime_format = summary_format
+        writer.datetime_format = _summary_date_format(frequency)
         global_summary_data.to_excel(writer, 'Monthly Summary')
         image_summary_data.to_excel(writer, 'Image Summary')
         user_summary_data.to_excel(writer, 'User Summary')
@@ -270,6 +276,132 @@ class ReportingViewSet(AuthModelViewSet):
 
         return writer
 
+    def is_streaming(self):
+        stream = self.request.query_params.get('stream', '').lower()
+        return stream in ['1', 'true', 'yes']
+
+    def streaming_response(self):
+        """
+        Export the report without holding it in memory.
+
+        Instances are read through a server-side cursor and serialized one
+        at a time. CSV rows are sent as they are produced; XLSX rows are
+        written to a temporary file in constant-memory mode, which is then
+        sent in chunks.
+        """
+        renderer_format = getattr(self.request.accepted_renderer, 'format', '')
+        filename = self.get_renderer_context()['filename']
+        if renderer_format == 'csv':
+            response = StreamingHttpResponse(
+                self._stream_csv(), content_type='text/csv'
+            )
+            filename = filename.replace('.xlsx', '.csv')
+        elif renderer_format == 'xlsx':
+            workbook_file = self._write_excel_file()
+            response = StreamingHttpResponse(
+                FileWrapper(workbook_file, self.excel_chunk_size),
+                content_type='application/vnd.ms-excel'
+            )
+        else:
+            return failure_response(
+                status.HTTP_400_BAD_REQUEST,
+                "Streaming is only available for the 'csv' and 'xlsx' formats"
+            )
+        response['Content-Disposition'
+                ] = 'attachment; filename="%s"' % filename
+        return response
+
+    def _iter_rows(self):
+        """
+        Yield (instance, flattened serializer row) for the report queryset.
+        """
+        # prefetch_related is ignored by iterator(), so every relation the
+        # serializer follows is joined instead.
+        queryset = self.filter_queryset(self.get_queryset()).select_related(
+            'created_by', 'created_by_identity__provider',
+            'source__providermachine__application_version__application'
+        )
+        # Keep any ?ordering=, otherwise rows come out by start date
+        if not queryset.ordered:
+            queryset = queryset.order_by('start_date')
+        context = self.get_serializer_context()
+        for instance in queryset.iterator():
+            data = self.serializer_class(instance, context=context).data
+            yield instance, _flatten_row(data)
+
+    def _stream_csv(self):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(self.headers_ordering)
+        for _, row in self._iter_rows():
+            yield writer.writerow(
+                [
+                    _csv_value(row.get(header))
+                    for header in self.headers_ordering
+                ]
+            )
+
+    def _write_excel_file(self):
+        frequency = self.set_frequency()
+        headers = [
+            header for header in self.headers_ordering
+            if header not in self.excel_dropped_headers
+        ]
+        summaries = [
+            # Like `resample`, every period in range is listed, empty or not.
+            # The grouped summaries, like `groupby`, only list the periods
+            # (and keys) that have rows.
+            _ReportSummary(
+                'Monthly Summary', [], 'Start Date',
+                ['hit_active_or_aborted', 'hit_active_or_aborted_or_error'],
+                frequency=frequency
+            ),
+            _ReportSummary(
+                'Image Summary', ['image_name'], 'Image Name',
+                ['hit_active_or_aborted', 'hit_active_or_aborted_or_error']
+            ),
+            _ReportSummary(
+                'User Summary', ['username'], 'Username', [
+                    'hit_active', 'hit_deploy_error', 'hit_aborted',
+                    'hit_active_or_aborted', 'hit_active_or_aborted_or_error'
+                ]
+            ),
+        ]
+        workbook_file = tempfile.TemporaryFile()
+        workbook = xlsxwriter.Workbook(
+            workbook_file, {
+                'constant_memory': True,
+                'default_date_format': 'mmm d yyyy hh:mm:ss'
+            }
+        )
+        # Worksheets are created in the order the buffered report uses
+        summary_sheets = [
+            workbook.add_worksheet(summary.name) for summary in summaries
+        ]
+        raw_ws = workbook.add_worksheet('Raw Data')
+        raw_ws.write_row(0, 0, headers)
+        row_total = 0
+        for instance, row in self._iter_rows():
+            row_total += 1
+            raw_ws.write_row(
+                row_total, 0, [row.get(header) for header in headers]
+            )
+            if row.get('is_featured_image'):
+                period = _period_start(instance.start_date, frequency)
+                for summary in summaries:
+                    summary.add(period, row)
+        raw_ws.autofilter(0, 0, row_total, len(headers) - 1)
+
+        date_format = workbook.add_format(
+            {
+                'num_format': _summary_date_format(frequency)
+            }
+        )
+        for summary, worksheet in zip(summaries, summary_sheets):
+            summary.write(worksheet, date_format)
+        workbook.close()
+        workbook_file.seek(0)
+        return workbook_file
+
     def get_queryset(self):
         request_user = self.request.user
         if request_user.is_staff or request_user.is_superuser:
@@ -337,6 +469,8 @@ class ReportingViewSet(AuthModelViewSet):
                 " ['start_date', 'end_date', 'provider_id']"
             )
         try:
+            if self.is_streaming():
+                return self.streaming_response()
             results = super(ReportingViewSet,
                             self).list(request, *args, **kwargs)
         except ValueError:
@@ -344,3 +478,149 @@ class ReportingViewSet(AuthModelViewSet):
                 status.HTTP_400_BAD_REQUEST, 'Invalid filter parameters'
             )
         return results
+
+
+class _Echo(object):
+    """
+    File-like object handing back what is written, so csv.writer output
+    can be yielded straight into a StreamingHttpResponse.
+    """
+
+    def write(self, value):
+        return value
+
+
+class _ReportSummary(object):
+    """
+    Running sums and counts of featured-image rows per period (and key),
+    enough to write the 'mean' and 'sum' columns of a summary worksheet
+    without keeping the rows themselves.
+
+    frequency - If set, for a summary without key fields, the periods
+        without rows between the first and the last one are written too,
+        with an empty mean and a sum of 0.
+    """
+
+    def __init__(
+        self, name, key_fields, key_label, value_fields, frequency=None
+    ):
+        self.name = name
+        self.key_fields = key_fields
+        self.key_label = key_label
+        self.value_fields = value_fields
+        self.frequency = frequency
+        self.totals = {}
+
+    def add(self, period, row):
+        key = (period, ) + tuple(row.get(field) for field in self.key_fields)
+        count, sums = self.totals.get(key, (0, [0] * len(self.value_fields)))
+        self.totals[key] = (
+            count + 1, [
+                total + int(bool(row.get(field)))
+                for total, field in zip(sums, self.value_fields)
+            ]
+        )
+
+    def write(self, worksheet, date_format):
+        headers = ['Start Date']
+        if self.key_fields:
+            headers.append(self.key_label)
+        for field in self.value_fields:
+            label = field.replace('hit_', '').replace('_or_', '/').replace(
+                '_', ' '
+            ).title()
+            headers.extend(['Average of %s' % label, 'Sum of %s' % label])
+        worksheet.write_row(0, 0, headers)
+        worksheet.set_column(0, 0, 34)
+        for index, key in enumerate(self._keys(), 1):
+            count, sums = self.totals.get(
+                key, (0, [0] * len(self.value_fields))
+            )
+            worksheet.write_datetime(index, 0, key[0], date_format)
+            values = list(key[1:])
+            for total in sums:
+                values.extend([float(total) / count if count else None, total])
+            worksheet.write_row(index, 1, values)
+
+    def _keys(self):
+        keys = sorted(self.totals)
+        if not self.frequency or self.key_fields or not keys:
+            return keys
+        periods = [keys[0][0]]
+        while periods[-1] < keys[-1][0]:
+            periods.append(_next_period(periods[-1], self.frequency))
+        return [(period, ) for period in periods]
+
+
+def _flatten_row(data, prefix=''):
+    row = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            row.update(_flatten_row(value, prefix='%s%s.' % (prefix, key)))
+        else:
+            row['%s%s' % (prefix, key)] = value
+    return row
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def _period_start(date, frequency):
+    """
+    Label `date` with its resampling period, as pandas would for `frequency`
+    """
+    date = date.astimezone(pytz.utc).replace(tzinfo=None)
+    if frequency == 'AS':
+        return date.replace(
+            month=1, day=1, hour=0, minute=0, second=0, microsecond=0
+        )
+    elif frequency == 'QS':
+        return date.replace(
+            month=date.month - (date.month - 1) % 3,
+            day=1,
+            hour=0,
+            minute=0,
+            second=0,
+            microsecond=0
+        )
+    elif frequency == 'MS':
+        return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif frequency == 'W':
+        # Weekly periods end on Sunday, and are labeled by that day
+        day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+        return day + timedelta(days=6 - day.weekday())
+    elif frequency == 'D':
+        return date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return date.replace(minute=0, second=0, microsecond=0)
+
+
+def _next_period(period, frequency):
+    """
+    Return the label of the period after `period`, see `_period_start`
+    """
+    if frequency in ['AS', 'QS', 'MS']:
+        months = {'AS': 12, 'QS': 3, 'MS': 1}[frequency]
+        month = period.month - 1 + months
+        return period.replace(
+            year=period.year + month // 12, month=month % 12 + 1
+        )
+    elif frequency == 'W':
+        return period + timedelta(days=7)
+    elif frequency == 'D':
+        return period + timedelta(days=1)
+    return period + timedelta(hours=1)
+
+
+def _summary_date_format(frequency):
+    if frequency in ['AS']:
+        return 'yyyy'
+    elif frequency in ['MS', 'QS']:
+        return 'mmmm yyyy'
+    elif frequency in ['W', 'D']:
+        return 'mmm d yyyy'
+    return 'mmm d yyyy hh:mm:ss'
@@ -55,6 +55,8 @@ IMAGING_TASKS = [
 PERIODIC_TASKS = [
     "monitor_instances",
     "monitor_instances_for",
+    "monitor_instances_for_tenants",
+    "monitor_instances_for_complete",
     "monitor_machines",
     "monitor_machines_for",
     "monitor_sizes",
@@ -119,6 +119,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.messages.middleware.MessageMiddleware',
     'atmosphere.slash_middleware.RemoveSlashMiddleware',
     'atmosphere.slash_middleware.RemoveCSRFMiddleware',
+    'core.request_cache.RequestCacheMiddleware',
 )
 
 ROOT_URLCONF = 'atmosphere.urls'
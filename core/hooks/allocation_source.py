@@ -77,9 +77,7 @@ def listen_before_allocation_snapshot_changes(sender, instance, raw, **kwargs):
         source.all_users.count(), percent_event_triggered
     )
     prev_email_event = EventTable.objects \
-        .filter(name="allocation_source_threshold_met") \
-        .filter(entity_id=allocation_source_name,
-                payload__threshold=percent_event_triggered)
+        .threshold_met(allocation_source_name, percent_event_triggered)
     if prev_email_event:
         return
     new_payload = {
@@ -540,6 +538,77 @@ def listen_for_user_allocation_source_deleted(
     logger.info('deleted_info: {}'.format(deleted_info))
 
 
+def handle_user_allocation_sources_created(events):
+    """
+    Batch handler of 'user_allocation_source_created' events (see
+    `listen_for_user_allocation_source_created`): assign every user to
+    their allocation source in a few queries.
+    """
+    from core.models import AtmosphereUser
+    memberships = set(
+        (event.entity_id, event.payload['allocation_source_name'])
+        for event in events
+    )
+    user_ids = dict(
+        AtmosphereUser.objects.filter(
+            username__in=set(username for username, _ in memberships)
+        ).values_list('username', 'id')
+    )
+    source_ids = dict(
+        AllocationSource.objects.filter(
+            name__in=set(source_name for _, source_name in memberships)
+        ).values_list('name', 'id')
+    )
+    for username, source_name in memberships:
+        if username not in user_ids:
+            raise AtmosphereUser.DoesNotExist(
+                "User %s does not exist" % username
+            )
+        if source_name not in source_ids:
+            raise AllocationSource.DoesNotExist(
+                "Allocation Source %s does not exist" % source_name
+            )
+    existing = set(
+        UserAllocationSource.objects.filter(
+            user_id__in=user_ids.values(),
+            allocation_source_id__in=source_ids.values()
+        ).values_list('user_id', 'allocation_source_id')
+    )
+    new_memberships = set(
+        (user_ids[username], source_ids[source_name])
+        for username, source_name in memberships
+    ) - existing
+    UserAllocationSource.objects.bulk_create(
+        [
+            UserAllocationSource(user_id=user_id, allocation_source_id=source_id)
+            for user_id, source_id in new_memberships
+        ]
+    )
+    logger.info(
+        'user_allocation_source_created: %s events, %s created' %
+        (len(events), len(new_memberships))
+    )
+
+
+def handle_user_allocation_sources_deleted(events):
+    """
+    Batch handler of 'user_allocation_source_deleted' events (see
+    `listen_for_user_allocation_source_deleted`): remove users from their
+    allocation source with one query per allocation source.
+    """
+    usernames_by_source = {}
+    for event in events:
+        usernames_by_source.setdefault(
+            event.payload['allocation_source_name'], set()
+        ).add(event.entity_id)
+    for source_name, usernames in usernames_by_source.items():
+        deleted_info = UserAllocationSource.objects.filter(
+            user__username__in=usernames,
+            allocation_source__name__exact=source_name
+        ).delete()
+        logger.info('deleted_info: {}'.format(deleted_info))
+
+
 # THIS EVENT IS NEVER FIRED
 
 
@@ -0,0 +1,238 @@
+"""
+Dispatch EventTable saves to the hooks registered for the event's name.
+
+One `pre_save` and one `post_save` receiver are connected to EventTable;
+each looks up the handlers of the saved event's name, instead of every
+hook being called for every event.
+
+Handlers that are cheap (a few queries) run inline, in the saving
+transaction. Handlers that talk to a cloud or send mail are registered
+with `run_async=True`: once the saving transaction commits, they run in
+the `run_event_handler` Celery task, so they never block the request that
+saved the event.
+
+Events created in bulk (see `EventTable.bulk_create_events`) skip the
+per-event hooks of their name when a batch handler is registered for it:
+the batch handler applies the side effects of all the events at once.
+
+The duration of every handler run is logged and kept, per handler, in
+`handler_timings()`.
+"""
+import collections
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from threepio import logger
+
+PRE_SAVE = 'pre_save'
+POST_SAVE = 'post_save'
+
+# {signal: {event name: [EventHandler]}}
+_handlers = {PRE_SAVE: {}, POST_SAVE: {}}
+# {event name: EventHandler}, called with a list of events
+_batch_handlers = {}
+# {event name: payload keys required by `validate_events`}
+_payload_keys = {}
+# {handler name: EventHandler}
+_handlers_by_name = {}
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+class EventHandler(object):
+    def __init__(self, event_name, method, signal=POST_SAVE, run_async=False):
+        self.event_name = event_name
+        self.method = method
+        self.signal = signal
+        self.run_async = run_async
+        self.name = "%s.%s" % (method.__module__, method.__name__)
+
+    def __call__(self, *args, **kwargs):
+        started = time.time()
+        try:
+            return self.method(*args, **kwargs)
+        finally:
+            _record_timing(self, time.time() - started)
+
+    def __repr__(self):
+        return "<EventHandler %s: %s>" % (self.event_name, self.name)
+
+
+def register_event_handler(
+    event_name, method, signal=POST_SAVE, run_async=False
+):
+    """
+    Call `method(sender, instance, ...)` whenever an EventTable named
+    `event_name` is saved, with the arguments of the `signal` receivers.
+    run_async - Run the handler in a Celery task once the event is
+        committed. Only `post_save` handlers can be asynchronous.
+    """
+    if run_async and signal != POST_SAVE:
+        raise ValueError(
+            "Only post_save event handlers can run asynchronously"
+        )
+    handler = EventHandler(event_name, method, signal, run_async)
+    _handlers[signal].setdefault(event_name, []).append(handler)
+    _handlers_by_name[handler.name] = handler
+    return handler
+
+
+def register_batch_handler(event_name, method, payload_keys=()):
+    """
+    Call `method(events)` once for all the `event_name` events created by
+    `EventTable.bulk_create_events`, instead of the inline post_save
+    handlers of `event_name` for each of them.
+    payload_keys - Keys each `event_name` payload must have
+    """
+    handler = EventHandler(event_name, method)
+    _batch_handlers[event_name] = handler
+    _payload_keys[event_name] = tuple(payload_keys)
+    _handlers_by_name[handler.name] = handler
+    return handler
+
+
+def can_batch(event_name):
+    """
+    Return True if events named `event_name` can be inserted in bulk:
+    they have no pre_save handlers, and their inline post_save handlers
+    (if any) have a batch handler to replace them.
+    """
+    if _handlers[PRE_SAVE].get(event_name):
+        return False
+    return event_name in _batch_handlers or all(
+        handler.run_async
+        for handler in _handlers[POST_SAVE].get(event_name, [])
+    )
+
+
+def validate_events(events):
+    """
+    Raise ValueError, listing every offending event, unless each of
+    `events` has a name and a dict payload with the keys required by the
+    batch handler of its name.
+    """
+    errors = []
+    for index, event in enumerate(events):
+        if not event.name:
+            errors.append("%s: missing name" % index)
+        elif not isinstance(event.payload, dict):
+            errors.append(
+                "%s (%s): payload is not a dict" % (index, event.name)
+            )
+        else:
+            missing = [
+                key for key in _payload_keys.get(event.name, ())
+                if key not in event.payload
+            ]
+            if missing:
+                errors.append(
+                    "%s (%s): payload is missing %s" %
+                    (index, event.name, ", ".join(missing))
+                )
+    if errors:
+        raise ValueError("Invalid events -- %s" % "; ".join(errors))
+
+
+def get_event_handlers(event_name, signal=POST_SAVE):
+    return list(_handlers[signal].get(event_name, []))
+
+
+def dispatch_pre_save(sender, instance, **kwargs):
+    for handler in _handlers[PRE_SAVE].get(instance.name, []):
+        handler(sender, instance, **kwargs)
+
+
+def dispatch_post_save(sender, instance, created, **kwargs):
+    for handler in _handlers[POST_SAVE].get(instance.name, []):
+        if handler.run_async and _async_handlers_enabled():
+            _run_on_commit(handler, instance, created)
+        else:
+            handler(sender, instance, created, **kwargs)
+
+
+def dispatch_bulk_create(events):
+    """
+    Apply the side effects of `events`, inserted in bulk: the batch handler
+    of each event name runs once, in the order the names first appear, and
+    the asynchronous handlers are queued for every event.
+    """
+    events_by_name = collections.OrderedDict()
+    for event in events:
+        events_by_name.setdefault(event.name, []).append(event)
+    for event_name, named_events in events_by_name.items():
+        batch_handler = _batch_handlers.get(event_name)
+        if batch_handler:
+            batch_handler(named_events)
+        for handler in _handlers[POST_SAVE].get(event_name, []):
+            if not handler.run_async:
+                continue
+            for event in named_events:
+                if _async_handlers_enabled():
+                    _run_on_commit(handler, event, True)
+                else:
+                    handler(event.__class__, event, True)
+
+
+def run_async_handler(handler_name, event_id, created=True):
+    """
+    Run an asynchronous handler on the saved event `event_id`.
+    Called by the `run_event_handler` task.
+    """
+    from core.models import EventTable
+    handler = _handlers_by_name[handler_name]
+    try:
+        event = EventTable.objects.get(id=event_id)
+    except EventTable.DoesNotExist:
+        logger.warn(
+            "Skipped %s -- EventTable %s does not exist" %
+            (handler_name, event_id)
+        )
+        return
+    return handler(EventTable, event, created)
+
+
+def handler_timings():
+    """
+    Return {handler name: {'calls', 'total', 'max'}} (in seconds) for the
+    handlers that ran in this process.
+    """
+    with _timings_lock:
+        return dict((name, dict(timing)) for name, timing in _timings.items())
+
+
+def _async_handlers_enabled():
+    return getattr(settings, 'EVENT_HANDLERS_ASYNC', True)
+
+
+def _run_on_commit(handler, event, created):
+    from core.tasks import run_event_handler
+    event_id = event.id
+    transaction.on_commit(
+        lambda: run_event_handler.apply_async(
+            args=[handler.name, event_id, created]
+        )
+    )
+
+
+def _record_timing(handler, duration):
+    with _timings_lock:
+        timing = _timings.setdefault(
+            handler.name, {
+                'calls': 0,
+                'total': 0.0,
+                'max': 0.0
+            }
+        )
+        timing['calls'] += 1
+        timing['total'] += duration
+        timing['max'] = max(timing['max'], duration)
+    if duration >= getattr(settings, 'EVENT_HANDLER_SLOW_SECONDS', 1):
+        logger.warn(
+            "Event handler %s took %.2fs" % (handler.name, duration)
+        )
+    else:
+        logger.debug(
+            "Event handler %s took %.2fs" % (handler.name, duration)
+        )
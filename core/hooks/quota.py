@@ -29,11 +29,13 @@ def listen_for_quota_assigned(sender, instance, created, **kwargs):
            }
 
            The result of this method will:
-           - Set the quota for the cloud provider of the Identity
            - assign the quota to the Identity
+
+           The quota is set on the cloud provider of the Identity by
+           `listen_for_quota_assigned_to_provider`, once the event is
+           committed.
         """
     event = instance
-    from service.quota import set_provider_quota
     if event.name != 'quota_assigned':
         return
     logger.info('quota_assigned: %s' % event.__dict__)
@@ -50,9 +52,22 @@ def listen_for_quota_assigned(sender, instance, created, **kwargs):
         quota = Quota.objects.create(**quota_values)
         created = True
     logger.info('Quota retrieved: %s, created: %s', quota, created)
-    set_provider_quota(str(identity.uuid), quota=quota)
-    logger.info("Set the quota for cloud provider to match: %s", identity)
-    identity = Identity.objects.get(uuid=identity_uuid)
     identity.quota = quota
     identity.save()
     logger.info("DB set identity to match quota: %s", identity)
+
+
+def listen_for_quota_assigned_to_provider(sender, instance, created, **kwargs):
+    """
+    Set the quota of a 'quota_assigned' event (see
+    `listen_for_quota_assigned`) for the cloud provider of the Identity.
+    """
+    event = instance
+    from service.quota import set_provider_quota
+    if event.name != 'quota_assigned':
+        return
+    payload = event.payload
+    quota = Quota.objects.filter(**payload['quota']).order_by('pk').first()
+    identity = Identity.objects.get(uuid=payload['identity'])
+    set_provider_quota(str(identity.uuid), quota=quota)
+    logger.info("Set the quota for cloud provider to match: %s", identity)
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min, OuterRef, Subquery
+
+from core.models import Instance, InstanceStatusHistory
+
+
+class Command(BaseCommand):
+    help = 'Point Instance.last_status_history at the newest history of ' \
+        'each instance'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of instance ids updated per statement"
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            default=False,
+            help="Recompute every instance, not only those without a pointer"
+        )
+
+    def handle(self, **options):
+        batch_size = options['batch_size']
+        instances = Instance.objects.all()
+        if not options['all']:
+            instances = instances.filter(last_status_history__isnull=True)
+        bounds = instances.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write("There are no instances to backfill")
+            return
+
+        newest_history = InstanceStatusHistory.objects.filter(
+            instance=OuterRef('pk')
+        ).order_by('-start_date').values('id')[:1]
+        total = 0
+        for batch_start in range(
+            bounds['first'], bounds['last'] + 1, batch_size
+        ):
+            total += instances.filter(
+                id__gte=batch_start, id__lt=batch_start + batch_size
+            ).update(last_status_history=Subquery(newest_history))
+        self.stdout.write(
+            "{}: {} instance(s)".format(self.style.SUCCESS("Backfilled"), total)
+        )
@@ -0,0 +1,167 @@
+from importlib import import_module
+import hashlib
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.models import EventTable
+
+BENCHMARK_TABLE = 'event_table_benchmark'
+
+payload_indexes = import_module(
+    'core.migrations.0101_eventtable_payload_indexes'
+)
+
+# One event in four of each kind, spread over 5000 allocation sources,
+# 20000 users and 100000 instances
+FILL_SQL = """
+INSERT INTO {table} (id, uuid, entity_id, name, payload, timestamp)
+SELECT i,
+       md5(i::text)::uuid,
+       CASE WHEN i %% 4 = 0 THEN 'TG-' || i %% 5000
+            ELSE 'user' || i %% 20000 END,
+       CASE i %% 4
+            WHEN 0 THEN 'allocation_source_created_or_renewed'
+            WHEN 1 THEN 'instance_allocation_source_changed'
+            WHEN 2 THEN 'user_allocation_source_created'
+            ELSE 'allocation_source_threshold_met' END,
+       CASE i %% 4
+            WHEN 0 THEN jsonb_build_object(
+                'allocation_source_name', 'TG-' || i %% 5000,
+                'compute_allowed', 1000)
+            WHEN 1 THEN jsonb_build_object(
+                'allocation_source_name', 'TG-' || i %% 5000,
+                'instance_id', md5((i %% 100000)::text),
+                'username', 'user' || i %% 20000)
+            WHEN 2 THEN jsonb_build_object(
+                'allocation_source_name', 'TG-' || i %% 5000)
+            ELSE jsonb_build_object(
+                'allocation_source_name', 'TG-' || i %% 5000,
+                'threshold', (i %% 2 + 1) * 50)
+       END,
+       now() - (i || ' seconds')::interval
+FROM generate_series(1, %s) AS i
+"""
+
+
+class Command(BaseCommand):
+    help = 'Compare EventTable payload lookups with and without the ' \
+        'payload indexes, on a synthetic copy of event_table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--events",
+            type=int,
+            default=3000000,
+            help="Number of synthetic events"
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=20,
+            help="Number of times each lookup is timed"
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            default=False,
+            help="Keep the %s table afterwards" % BENCHMARK_TABLE
+        )
+
+    def handle(self, **options):
+        lookups = [
+            (
+                'renewal of allocation source',
+                EventTable.objects.filter(
+                    name='allocation_source_created_or_renewed'
+                ).for_allocation_source('TG-40').order_by('timestamp')
+            ),
+            (
+                'threshold met',
+                EventTable.objects.threshold_met('TG-43', 100)
+            ),
+            (
+                'instance',
+                EventTable.objects.for_instance(hashlib.md5('41').hexdigest())
+            ),
+            ('username', EventTable.objects.for_username('user41')),
+        ]
+        with connection.cursor() as cursor:
+            self.stdout.write(
+                "Creating %s events in %s..." %
+                (options['events'], BENCHMARK_TABLE)
+            )
+            self._create_table(cursor, options['events'])
+            try:
+                before = self._time_lookups(
+                    cursor, lookups, options['repeat']
+                )
+                self.stdout.write("Creating the payload indexes...")
+                for index_name, expressions in \
+                        payload_indexes.PAYLOAD_INDEXES:
+                    cursor.execute(
+                        self._benchmark_sql(
+                            payload_indexes.create_index_sql(
+                                index_name, expressions
+                            ).replace(' CONCURRENTLY', '')
+                        )
+                    )
+                cursor.execute("ANALYZE %s" % BENCHMARK_TABLE)
+                after = self._time_lookups(cursor, lookups, options['repeat'])
+            finally:
+                if not options['keep']:
+                    cursor.execute("DROP TABLE %s" % BENCHMARK_TABLE)
+
+        self.stdout.write(
+            "%-30s %12s %12s %8s" % ('lookup', 'before (ms)', 'after (ms)', 'x')
+        )
+        for label, _ in lookups:
+            self.stdout.write(
+                "%-30s %12.2f %12.2f %8.1f" % (
+                    label, before[label], after[label],
+                    before[label] / max(after[label], 0.001)
+                )
+            )
+
+    def _create_table(self, cursor, event_count):
+        cursor.execute("DROP TABLE IF EXISTS %s" % BENCHMARK_TABLE)
+        cursor.execute(
+            "CREATE TABLE %s (LIKE event_table INCLUDING INDEXES)" %
+            BENCHMARK_TABLE
+        )
+        # Drop the payload indexes copied from event_table, if migrated
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes"
+            " WHERE tablename = %s AND indexdef LIKE %s",
+            [BENCHMARK_TABLE, '%payload%']
+        )
+        for (copied_index, ) in cursor.fetchall():
+            cursor.execute("DROP INDEX %s" % copied_index)
+        cursor.execute(FILL_SQL.format(table=BENCHMARK_TABLE), [event_count])
+        cursor.execute("ANALYZE %s" % BENCHMARK_TABLE)
+
+    def _benchmark_sql(self, sql):
+        """
+        Point `sql`, written for event_table, at the benchmark table.
+        """
+        return sql.replace('event_table_', BENCHMARK_TABLE + '_')\
+            .replace('"event_table"', '"%s"' % BENCHMARK_TABLE)\
+            .replace(' event_table ', ' %s ' % BENCHMARK_TABLE)
+
+    def _time_lookups(self, cursor, lookups, repeat):
+        """
+        Return {label: median duration in ms} of `lookups`.
+        """
+        durations = {}
+        for label, queryset in lookups:
+            sql, params = queryset.query.sql_with_params()
+            sql = self._benchmark_sql(sql)
+            timings = []
+            for _ in range(repeat):
+                started = time.time()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                timings.append((time.time() - started) * 1000)
+            durations[label] = sorted(timings)[len(timings) // 2]
+        return durations
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', 'remove-unused-applicationscore-model'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AllocationSourceUsageLedger',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID'
+                    )
+                ),
+                ('window_start', models.DateTimeField()),
+                ('high_water_mark', models.DateTimeField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+                (
+                    'allocation_source',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='usage_ledger',
+                        to='core.AllocationSource'
+                    )
+                ),
+            ],
+            options={
+                'db_table': 'allocation_source_usage_ledger',
+            },
+        ),
+        migrations.CreateModel(
+            name='InstanceAllocationUsage',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID'
+                    )
+                ),
+                (
+                    'compute_used',
+                    models.DecimalField(
+                        decimal_places=3, default=0, max_digits=19
+                    )
+                ),
+                ('is_running', models.BooleanField(default=False)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                (
+                    'instance',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='allocation_usage',
+                        to='core.Instance'
+                    )
+                ),
+                (
+                    'ledger',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='instance_usage',
+                        to='core.AllocationSourceUsageLedger'
+                    )
+                ),
+                (
+                    'user',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='instance_allocation_usage',
+                        to=settings.AUTH_USER_MODEL
+                    )
+                ),
+            ],
+            options={
+                'db_table': 'instance_allocation_usage',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='instanceallocationusage',
+            unique_together=set([('ledger', 'user', 'instance')]),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0099_allocation_usage_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='instance',
+            name='last_status_history',
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name='+',
+                to='core.InstanceStatusHistory'
+            ),
+        ),
+    ]
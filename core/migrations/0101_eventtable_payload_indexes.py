@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# (index name, indexed expressions) -- the expressions match the SQL Django
+# generates for `payload__<key>=value` (see EventTableQuerySet).
+PAYLOAD_INDEXES = [
+    (
+        'event_table_name_allocation_source_idx',
+        "name, (payload -> 'allocation_source_name')"
+    ),
+    ('event_table_instance_id_idx', "(payload -> 'instance_id')"),
+    ('event_table_username_idx', "(payload -> 'username')"),
+]
+
+
+def create_index_sql(index_name, expressions):
+    return (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS %s ON event_table (%s);" %
+        (index_name, expressions)
+    )
+
+
+def drop_index_sql(index_name):
+    return "DROP INDEX CONCURRENTLY IF EXISTS %s;" % index_name
+
+
+class Migration(migrations.Migration):
+    # Indexes are built CONCURRENTLY, so that events can still be written
+    # while they are built on a large table.
+    atomic = False
+
+    dependencies = [
+        ('core', '0100_instance_last_status_history'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            create_index_sql(index_name, expressions),
+            reverse_sql=drop_index_sql(index_name)
+        ) for index_name, expressions in PAYLOAD_INDEXES
+    ]
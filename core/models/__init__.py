@@ -6,7 +6,8 @@ from django.db.models import ObjectDoesNotExist
 from core.models.access_token import AccessToken
 from core.models.allocation_source import (
     AllocationSource, UserAllocationSource, UserAllocationSnapshot,
-    InstanceAllocationSourceSnapshot, AllocationSourceSnapshot
+    InstanceAllocationSourceSnapshot, AllocationSourceSnapshot,
+    AllocationSourceUsageLedger, InstanceAllocationUsage
 )
 from core.models.application import Application, ApplicationMembership,\
     ApplicationBookmark, ApplicationThreshold
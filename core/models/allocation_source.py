@@ -200,6 +200,64 @@ class AllocationSourceSnapshot(models.Model):
         app_label = 'core'
 
 
+class AllocationSourceUsageLedger(models.Model):
+    """
+    Persisted high-water mark for the incremental usage ledger of an
+    allocation source.
+
+    Usage between `window_start` and `high_water_mark` has already been
+    folded into the related InstanceAllocationUsage rows, so the next
+    snapshot only has to account for histories and events after the mark.
+    """
+    allocation_source = models.OneToOneField(
+        AllocationSource, related_name="usage_ledger"
+    )
+    window_start = models.DateTimeField()
+    high_water_mark = models.DateTimeField()
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return "%s (Window:%s High-water mark:%s)" %\
+            (self.allocation_source, self.window_start,
+             self.high_water_mark)
+
+    class Meta:
+        db_table = 'allocation_source_usage_ledger'
+        app_label = 'core'
+
+
+class InstanceAllocationUsage(models.Model):
+    """
+    Accumulated usage of one instance, charged to one allocation source on
+    behalf of one user, since the `window_start` of its ledger.
+    """
+    ledger = models.ForeignKey(
+        AllocationSourceUsageLedger, related_name="instance_usage"
+    )
+    user = models.ForeignKey(
+        "AtmosphereUser", related_name="instance_allocation_usage"
+    )
+    instance = models.ForeignKey(
+        "Instance", related_name="allocation_usage"
+    )
+    # CPU-seconds, stored in DecimalField to allow for partial hour calculation
+    compute_used = models.DecimalField(
+        max_digits=19, decimal_places=3, default=0
+    )
+    # True if the instance was active (and charging this source) at the mark
+    is_running = models.BooleanField(default=False)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __unicode__(self):
+        return "User %s + Instance %s + Ledger %s: Usage:%s CPU-seconds" %\
+            (self.user, self.instance, self.ledger, self.compute_used)
+
+    class Meta:
+        db_table = 'instance_allocation_usage'
+        app_label = 'core'
+        unique_together = ('ledger', 'user', 'instance')
+
+
 def total_usage(
     username,
     start_date,
@@ -7,6 +7,11 @@ Note:
 
 from uuid import uuid4
 from django.db import models
+from django.db.models import prefetch_related_objects
+from django.db.models.signals import post_delete, post_save
+from threepio import logger
+
+from core import request_cache
 from core.models.identity import Identity
 from core.models.provider import Provider
 
@@ -68,3 +73,101 @@ class Credential(models.Model):
     class Meta:
         db_table = 'credential'
         app_label = 'core'
+
+
+def load_identity_credentials(identity_ids):
+    """
+    Return {identity_id: {key: value}} for `identity_ids`, in one query.
+    """
+    credentials = {}
+    for identity_id, key, value in Credential.objects.filter(
+        identity_id__in=identity_ids
+    ).values_list('identity_id', 'key', 'value'):
+        credentials.setdefault(identity_id, {})[key] = value
+    return credentials
+
+
+def load_project_identities(providers, project_names=None):
+    """
+    Return {(provider_id, project_name): Identity} for the identities of
+    `providers` (optionally, only those of `project_names`), in one query.
+    When a project has several identities on a provider, the oldest is used.
+    """
+    credentials = Credential.objects.filter(
+        key='ex_project_name', identity__provider__in=providers
+    )
+    if project_names is not None:
+        credentials = credentials.filter(value__in=project_names)
+    project_identities = {}
+    for credential in credentials.select_related(
+        'identity__provider', 'identity__created_by'
+    ).order_by('id'):
+        key = (credential.identity.provider_id, credential.value)
+        if key in project_identities:
+            logger.warn(
+                "%s has >1 Credentials on Provider %s" %
+                (credential.value, credential.identity.provider)
+            )
+            continue
+        project_identities[key] = credential.identity
+    return project_identities
+
+
+def prefetch_credentials(identities):
+    """
+    Load the credentials of `identities` and of their providers in a few
+    queries, so `get_credential(s)` and `get_all_credentials` make none.
+    Returns the identities as a list.
+    """
+    identities = list(identities)
+    prefetch_related_objects(
+        identities, 'credential_set', 'provider__providercredential_set'
+    )
+    return identities
+
+
+def _invalidate_identity_credentials(sender, instance, **kwargs):
+    from service.cache import invalidate_cached_drivers
+    request_cache.invalidate(('identity.credentials', instance.identity_id))
+    try:
+        identity = instance.identity
+    except Identity.DoesNotExist:
+        # Deleted along with its identity
+        return
+    invalidate_cached_drivers(identity=identity)
+
+
+def _invalidate_provider_credentials(sender, instance, **kwargs):
+    request_cache.invalidate(('provider.credentials', instance.provider_id))
+    try:
+        provider = instance.provider
+    except Provider.DoesNotExist:
+        # Deleted along with its provider
+        return
+    invalidate_provider_caches(provider)
+
+
+def _invalidate_provider(sender, instance, **kwargs):
+    invalidate_provider_caches(instance)
+
+
+def invalidate_provider_caches(provider):
+    """
+    Forget the drivers of `provider`, and the monitoring caches built with
+    them, after it or its credentials changed. Only the caches of this process
+    are cleared: other processes rebuild theirs once they expire
+    (settings.DRIVER_CACHE_TTL, settings.MONITORING_CACHE_TTL).
+    """
+    from service.cache import invalidate_cached_drivers
+    from service.tasks.monitoring import invalidate_monitoring_caches
+    invalidate_cached_drivers(provider=provider)
+    invalidate_monitoring_caches(provider)
+
+
+post_save.connect(_invalidate_identity_credentials, sender=Credential)
+post_delete.connect(_invalidate_identity_credentials, sender=Credential)
+post_save.connect(_invalidate_provider_credentials, sender=ProviderCredential)
+post_delete.connect(
+    _invalidate_provider_credentials, sender=ProviderCredential
+)
+post_save.connect(_invalidate_provider, sender=Provider)
@@ -1,10 +1,17 @@
 from uuid import uuid4
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import post_save, pre_save
 from django.utils import timezone
 from django.contrib.postgres.fields import JSONField
-from core.hooks.quota import (listen_for_quota_assigned)
+from core.hooks.event_bus import (
+    PRE_SAVE, can_batch, dispatch_bulk_create, dispatch_post_save,
+    dispatch_pre_save, register_batch_handler, register_event_handler,
+    validate_events
+)
+from core.hooks.quota import (
+    listen_for_quota_assigned, listen_for_quota_assigned_to_provider
+)
 from core.hooks.allocation_source import (
     listen_before_allocation_snapshot_changes,
     listen_for_allocation_snapshot_changes, listen_for_user_snapshot_changes,
@@ -15,8 +22,12 @@ from core.hooks.allocation_source import (
     listen_for_allocation_source_renewal_strategy_changed,
     listen_for_allocation_source_name_changed,
     listen_for_allocation_source_compute_allowed_changed,
-    listen_for_allocation_source_removed, listen_for_instance_allocation_removed
+    listen_for_allocation_source_removed,
+    listen_for_instance_allocation_removed,
+    handle_user_allocation_sources_created,
+    handle_user_allocation_sources_deleted
 )
+from core.models.managers import EventTableQuerySet
 from threepio import logger
 
 
@@ -33,6 +44,8 @@ class EventTable(models.Model):
     payload = JSONField()
     timestamp = models.DateTimeField(default=timezone.now, db_index=True)
 
+    objects = EventTableQuerySet.as_manager()
+
     @classmethod
     def create_event(cls, name, payload, entity_id):
         logger.info("Creating new event: %s\tPayload: %s" % (name, payload))
@@ -40,6 +53,32 @@ class EventTable(models.Model):
             name=name, entity_id=entity_id, payload=payload
         )
 
+    @classmethod
+    def bulk_create_events(cls, events, batch_size=1000):
+        """
+        Save `events`, a list of unsaved EventTables, in one transaction.
+
+        Events that can be batched (see core.hooks.event_bus.can_batch)
+        are inserted with `bulk_create`, then the side effects of each
+        event name are applied at once by its batch handler. The others
+        are saved one by one, before them, with their hooks.
+        Side effects are applied per event name, so events of different
+        names must not depend on each other's order.
+        Returns `events`.
+        """
+        validate_events(events)
+        logger.info("Creating %s new events" % len(events))
+        with transaction.atomic():
+            batched_events = []
+            for event in events:
+                if can_batch(event.name):
+                    batched_events.append(event)
+                else:
+                    event.save()
+            cls.objects.bulk_create(batched_events, batch_size=batch_size)
+            dispatch_bulk_create(batched_events)
+        return events
+
     def __str__(self):
         return "%s" % self.name
 
@@ -51,24 +90,70 @@ class EventTable(models.Model):
         app_label = "core"
 
 
-# Instantiate the hooks:
-post_save.connect(listen_for_allocation_threshold_met, sender=EventTable)
-post_save.connect(listen_for_instance_allocation_changes, sender=EventTable)
-post_save.connect(
-    listen_for_allocation_source_created_or_renewed, sender=EventTable
-)
-post_save.connect(
-    listen_for_allocation_source_compute_allowed_changed, sender=EventTable
-)
-post_save.connect(listen_for_user_allocation_source_created, sender=EventTable)
-post_save.connect(listen_for_user_allocation_source_deleted, sender=EventTable)
-pre_save.connect(listen_before_allocation_snapshot_changes, sender=EventTable)
-post_save.connect(listen_for_instance_allocation_removed, sender=EventTable)
-post_save.connect(listen_for_allocation_snapshot_changes, sender=EventTable)
-post_save.connect(listen_for_user_snapshot_changes, sender=EventTable)
-post_save.connect(
-    listen_for_allocation_source_renewal_strategy_changed, sender=EventTable
-)
-post_save.connect(listen_for_allocation_source_name_changed, sender=EventTable)
-post_save.connect(listen_for_allocation_source_removed, sender=EventTable)
-post_save.connect(listen_for_quota_assigned, sender=EventTable)
+# Register the hooks by the name of the event they handle. Hooks that talk
+# to a cloud or send mail run in a Celery task once the event is committed.
+register_event_handler(
+    'allocation_source_threshold_met',
+    listen_for_allocation_threshold_met,
+    run_async=True
+)
+register_event_handler(
+    'instance_allocation_source_changed',
+    listen_for_instance_allocation_changes
+)
+register_event_handler(
+    'allocation_source_created_or_renewed',
+    listen_for_allocation_source_created_or_renewed
+)
+register_event_handler(
+    'allocation_source_compute_allowed_changed',
+    listen_for_allocation_source_compute_allowed_changed
+)
+register_event_handler(
+    'user_allocation_source_created', listen_for_user_allocation_source_created
+)
+register_event_handler(
+    'user_allocation_source_deleted', listen_for_user_allocation_source_deleted
+)
+register_batch_handler(
+    'user_allocation_source_created',
+    handle_user_allocation_sources_created,
+    payload_keys=['allocation_source_name']
+)
+register_batch_handler(
+    'user_allocation_source_deleted',
+    handle_user_allocation_sources_deleted,
+    payload_keys=['allocation_source_name']
+)
+register_event_handler(
+    'allocation_source_snapshot',
+    listen_before_allocation_snapshot_changes,
+    signal=PRE_SAVE
+)
+register_event_handler(
+    'instance_allocation_source_removed',
+    listen_for_instance_allocation_removed
+)
+register_event_handler(
+    'allocation_source_snapshot', listen_for_allocation_snapshot_changes
+)
+register_event_handler(
+    'user_allocation_snapshot_changed', listen_for_user_snapshot_changes
+)
+register_event_handler(
+    'allocation_source_renewal_strategy_changed',
+    listen_for_allocation_source_renewal_strategy_changed
+)
+register_event_handler(
+    'allocation_source_name_changed', listen_for_allocation_source_name_changed
+)
+register_event_handler(
+    'allocation_source_removed', listen_for_allocation_source_removed
+)
+register_event_handler('quota_assigned', listen_for_quota_assigned)
+register_event_handler(
+    'quota_assigned', listen_for_quota_assigned_to_provider, run_async=True
+)
+
+post_save.connect(dispatch_post_save, sender=EventTable)
+pre_save.connect(dispatch_pre_save, sender=EventTable)
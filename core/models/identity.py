@@ -8,6 +8,7 @@ from django.db.models import Q
 
 from threepio import logger
 from uuid import uuid4
+from core import request_cache
 from core.query import only_active_memberships, contains_credential
 from core.models.quota import Quota
 
@@ -386,16 +387,25 @@ class Identity(models.Model):
                creds.get("tenant_name", False)     or \
                ""
 
+    def credential_map(self):
+        """
+        Return {key: value} of this identity's credentials.
+        Uses a prefetched `credential_set` (see
+        `core.models.credential.prefetch_credentials`), and is loaded once
+        per API request for every copy of this identity.
+        Treat the result as read-only.
+        """
+        return request_cache.get_or_set(
+            ('identity.credentials', self.id), lambda: dict(
+                (cred.key, cred.value) for cred in self.credential_set.all()
+            )
+        )
+
     def get_credential(self, key):
-        for cred in self.credential_set.all():
-            if cred.key == key:
-                return cred.value
-        return None
+        return self.credential_map().get(key)
 
     def get_credentials(self):
-        cred_dict = {}
-        for cred in self.credential_set.all():
-            cred_dict[cred.key] = cred.value
+        cred_dict = dict(self.credential_map())
 
         # Hotfix to avoid errors in rtwo+OpenStack
         # Note: when this hotfix is removed, the creds dict can be removed
@@ -405,12 +415,9 @@ class Identity(models.Model):
         return cred_dict
 
     def get_all_credentials(self):
-        cred_dict = {}
-        for cred in self.provider.providercredential_set.all():
-            cred_dict[cred.key] = cred.value
+        cred_dict = dict(self.provider.credential_map())
         # Allow overriding in the identity
-        for cred in self.credential_set.all():
-            cred_dict[cred.key] = cred.value
+        cred_dict.update(self.credential_map())
         return cred_dict
 
     def get_urls(self):
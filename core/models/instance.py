@@ -22,7 +22,8 @@ from core.models.machine import (
     convert_esh_machine, get_or_create_provider_machine
 )
 from core.models.volume import convert_esh_volume
-from core.models.size import (convert_esh_size, Size)
+from core.models.provider import Provider
+from core.models.size import (cloud_size_changed, convert_esh_size, Size)
 from core.models.tag import Tag
 from core.models.managers import ActiveInstancesManager
 from service.mock import MockInstance
@@ -65,6 +66,15 @@ class Instance(models.Model):
     # FIXME  Problems when setting a default, missing auto_now_add
     start_date = models.DateTimeField()
     end_date = models.DateTimeField(null=True, blank=True)
+    # Denormalized pointer to the newest InstanceStatusHistory, maintained by
+    # InstanceStatusHistory.save (see `get_last_history`)
+    last_status_history = models.ForeignKey(
+        "InstanceStatusHistory",
+        models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
 
     # Model Managers
     objects = models.Manager()    # The default manager.
@@ -134,9 +144,13 @@ class Instance(models.Model):
         # except InstanceStatusHistory.DoesNotExist:
         # TODO: Profile current choice
         # FIXME: Move this call so that it happens inside InstanceStatusHistory to avoid circ.dep.
+        if self.last_status_history_id:
+            return self.last_status_history
         last_history = self.instancestatushistory_set.order_by('-start_date'
                                                               ).first()
         if last_history:
+            # Not backfilled yet, point at it for the next read
+            last_history.set_as_last_history()
             return last_history
         else:
             unknown_size, _ = Size.objects.get_or_create(
@@ -224,7 +238,8 @@ class Instance(models.Model):
         )
 
         # 2. Get the last history (or Build a new one if no other exists)
-        has_history = self.instancestatushistory_set.all().count()
+        has_history = self.last_status_history_id\
+            or self.instancestatushistory_set.exists()
         if not has_history:
             last_history = InstanceStatusHistory.create_history(
                 status_name,
@@ -506,9 +521,11 @@ class Instance(models.Model):
     @property
     def allocation_source(self):
         # FIXME: look up the current allocation source by "Scanning the event table" on this instance.
-        from core.models.allocation_source import InstanceAllocationSourceSnapshot as Snapshot
-        snapshot = Snapshot.objects.filter(instance=self).first()
-        return snapshot.allocation_source if snapshot else None
+        try:
+            snapshot = self.instanceallocationsourcesnapshot
+        except ObjectDoesNotExist:
+            return None
+        return snapshot.allocation_source
 
     def change_allocation_source(self, allocation_source, user=None):
         """
@@ -825,6 +842,125 @@ def convert_esh_instance(
     return core_instance
 
 
+def convert_esh_instances(
+    esh_driver, esh_instances, provider_uuid, identity_uuid, user
+):
+    """
+    Bulk version of `convert_esh_instance`, used by monitoring.
+
+    The matching Instance, latest InstanceStatusHistory and Size rows are
+    fetched for the whole list in a few queries and compared in memory.
+    An instance whose address, status and size are unchanged costs no
+    further queries and no writes; changed and new instances fall back to
+    the per-instance path.
+
+    Returns the core instances, with `esh` attached, in the same order.
+    """
+    from core.models.instance_history import InstanceStatusHistory
+    if not esh_instances:
+        return []
+    provider = Provider.objects.select_related('type').get(uuid=provider_uuid)
+    core_instances = dict(
+        (core_instance.provider_alias, core_instance)
+        for core_instance in Instance.objects.filter(
+            provider_alias__in=[esh_instance.id for esh_instance in esh_instances]
+        ).select_related('last_status_history__status')
+    )
+    last_histories = dict(
+        (core_instance.id, core_instance.last_status_history)
+        for core_instance in core_instances.values()
+        if core_instance.last_status_history_id
+    )
+    # Instances that were not backfilled yet: DISTINCT ON keeps only the
+    # newest history of each
+    last_histories.update(
+        (history.instance_id, history)
+        for history in InstanceStatusHistory.objects.filter(
+            instance__in=[
+                core_instance for core_instance in core_instances.values()
+                if not core_instance.last_status_history_id
+            ]
+        ).select_related('status').order_by('instance_id', '-start_date')
+        .distinct('instance_id')
+    )
+    core_sizes = _esh_instance_sizes_to_core(
+        esh_driver, esh_instances, provider
+    )
+
+    converted = []
+    for esh_instance in esh_instances:
+        core_instance = core_instances.get(esh_instance.id)
+        if not core_instance:
+            converted.append(
+                convert_esh_instance(
+                    esh_driver, esh_instance, provider_uuid, identity_uuid,
+                    user
+                )
+            )
+            continue
+        ip_address = _find_esh_ip(esh_instance)
+        if core_instance.ip_address != ip_address or core_instance.end_date:
+            _update_core_instance(core_instance, ip_address, None)
+        core_instance.esh = esh_instance
+        converted.append(core_instance)
+
+        core_size = core_sizes[esh_instance.id]
+        metadata = esh_instance.extra.get('metadata', {})
+        status_name = _get_status_name_for_provider(
+            provider, esh_instance.extra['status'],
+            esh_instance.extra.get('task'),
+            metadata.get('tmp_status', "MISSING")
+        )
+        last_history = last_histories.get(core_instance.id)
+        if last_history and last_history.status.name == status_name\
+                and last_history.size_id == core_size.id:
+            continue
+        core_instance.update_history(
+            esh_instance.extra['status'],
+            core_size,
+            esh_instance.extra.get('task'),
+            metadata.get('tmp_status', "MISSING"),
+            fault=esh_instance.extra.get('fault', None),
+            deploy_fault_message=metadata.get('fault_message', None),
+            deploy_fault_trace=metadata.get('fault_trace', None)
+        )
+    return converted
+
+
+def _esh_instance_sizes_to_core(esh_driver, esh_instances, provider):
+    """
+    Return {instance alias: core Size}, converting each distinct size once
+    and only saving sizes that changed in the cloud.
+    """
+    esh_sizes = {}
+    for esh_instance in esh_instances:
+        esh_size = esh_instance.size
+        if esh_size.id in esh_sizes:
+            continue
+        if isinstance(esh_size, MockSize):
+            lc_size = esh_driver.get_size(esh_size.id, forced_lookup=True)
+            new_size = OSSize(lc_size)
+            if new_size:
+                esh_size = new_size
+        esh_sizes[esh_instance.size.id] = esh_size
+
+    core_sizes = dict(
+        (core_size.alias, core_size) for core_size in Size.objects.filter(
+            provider=provider, alias__in=esh_sizes.keys()
+        )
+    )
+    for alias, esh_size in esh_sizes.items():
+        core_size = core_sizes.get(esh_size.id)
+        if not core_size or cloud_size_changed(core_size, esh_size):
+            core_size = convert_esh_size(esh_size, provider.uuid)
+        core_size.esh = esh_size
+        core_sizes[alias] = core_size
+    return dict(
+        (esh_instance.id, core_sizes[esh_instance.size.id])
+        for esh_instance in esh_instances
+    )
+
+
 def _esh_instance_size_to_core(esh_driver, esh_instance, provider_uuid):
     # NOTE: Querying for esh_size because esh_instance
     # Only holds the alias, not all the values.
@@ -5,7 +5,7 @@ from uuid import uuid4
 from datetime import timedelta
 
 from django.db import models, transaction, DatabaseError
-from django.db.models import ObjectDoesNotExist
+from django.db.models import ObjectDoesNotExist, Q
 from django.contrib.postgres.fields import JSONField
 
 from django.utils import timezone
@@ -115,6 +115,29 @@ class InstanceStatusHistory(models.Model):
                 % (self.instance, self.end_date)
             )
 
+    def save(self, *args, **kwargs):
+        super(InstanceStatusHistory, self).save(*args, **kwargs)
+        self.set_as_last_history()
+
+    def set_as_last_history(self):
+        """
+        Point `Instance.last_status_history` at this history, unless the
+        instance already points at a newer one.
+        """
+        from core.models.instance import Instance
+        updated = Instance.objects.filter(id=self.instance_id).filter(
+            Q(last_status_history__isnull=True) |
+            Q(last_status_history=self) |
+            Q(last_status_history__start_date__lte=self.start_date)
+        ).update(last_status_history=self)
+        # Keep an already loaded instance in step without fetching it
+        instance = getattr(
+            self, self._meta.get_field('instance').get_cache_name(), None
+        )
+        if updated and instance:
+            instance.last_status_history = self
+        return bool(updated)
+
     @classmethod
     def transaction(
         cls,
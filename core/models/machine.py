@@ -192,8 +192,13 @@ def build_cached_machines():
     return machine_dict
 
 
-def _lookup_image_owner_identity(account_driver, glance_image):
-    owner = account_driver.get_project_by_id(glance_image.get('owner'))
+def _lookup_image_owner_identity(
+    account_driver, glance_image, project_directory=None
+):
+    if project_directory is not None:
+        owner = project_directory.get_by_id(glance_image.get('owner'))
+    else:
+        owner = account_driver.get_project_by_id(glance_image.get('owner'))
     if not owner:
         return None
     matches = Identity.objects.filter(
@@ -208,9 +213,11 @@ def _lookup_image_owner_identity(account_driver, glance_image):
     return matches.first()
 
 
-def _application_and_version_from_metadata(account_driver, glance_image):
+def _application_and_version_from_metadata(
+    account_driver, glance_image, project_directory=None
+):
     """
-    Input: Account driver, glance image
+    Input: Account driver, glance image, (optional) ProjectDirectory
     - Determine if image was authored by Atmosphere
     - If so, return any application and/or version metadata found on glance_image.
     """
@@ -226,7 +233,9 @@ def _application_and_version_from_metadata(account_driver, glance_image):
     ).first()
 
     if not identity:
-        identity = _lookup_image_owner_identity(account_driver, glance_image)
+        identity = _lookup_image_owner_identity(
+            account_driver, glance_image, project_directory
+        )
     if not identity:
         identity = account_driver.core_provider.get_admin_identity()
     if not user:
@@ -271,10 +280,16 @@ def _application_and_version_from_metadata(account_driver, glance_image):
 
 
 def convert_glance_image(
-    account_driver, glance_image, provider_uuid, owner=None
+    account_driver,
+    glance_image,
+    provider_uuid,
+    owner=None,
+    project_directory=None
 ):
     """
     Guaranteed Return of ProviderMachine.
+    project_directory - a ProjectDirectory shared by the monitoring cycle,
+                        used to look up the image owner's project
     1. Load provider machine from DB and return
     2a. If 'Miss':
         * Lookup application based on glance_machine metadata for application_uuid
@@ -297,8 +312,9 @@ def convert_glance_image(
             provider_machine.instance_source, glance_image.get('size')
         )
         return (provider_machine, False)
-    (app_kwargs, version_kwargs
-    ) = _application_and_version_from_metadata(account_driver, glance_image)
+    (app_kwargs, version_kwargs) = _application_and_version_from_metadata(
+        account_driver, glance_image, project_directory
+    )
     # TODO: use version_kwargs in method below?
     version = get_version_for_machine(provider_uuid, image_id, fuzzy=True)
     if version:
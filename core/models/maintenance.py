@@ -1,11 +1,24 @@
 import collections
+import threading
+import time
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
+from threepio import logger
 
 from core.models.provider import Provider
 
+# Bumped whenever a MaintenanceRecord changes, so every process drops its
+# copy of the global records
+MAINTENANCE_VERSION_KEY = "maintenance.version"
+
+# {'version': ..., 'checked': ..., 'records': [...]}
+_global_records_cache = {}
+_global_records_lock = threading.Lock()
+
 
 class MaintenanceRecord(models.Model):
     """
@@ -38,6 +51,22 @@ class MaintenanceRecord(models.Model):
             records = records.filter(Q(provider__isnull=True))
         return records
 
+    @classmethod
+    def active_global(cls):
+        """
+        Return the global (provider-less) records active right now, as a list.
+
+        Unlike `active`, this is served from a process-local cache of the
+        current and scheduled global records (see `_scheduled_global_records`)
+        so that checking for maintenance on every request is free.
+        """
+        now = timezone.now()
+        return [
+            record for record in _scheduled_global_records()
+            if record.start_date <= now and
+            (record.end_date is None or record.end_date > now)
+        ]
+
     def json(self):
         json = {
             'start': self.start_date,
@@ -58,3 +87,72 @@ class MaintenanceRecord(models.Model):
     class Meta:
         db_table = "maintenance_record"
         app_label = "core"
+
+
+def _scheduled_global_records():
+    """
+    Return the global records that have not ended yet.
+
+    The list is kept for settings.MAINTENANCE_CACHE_TTL seconds (10, 0 to
+    disable). After that it is only reloaded if the version key in Redis
+    moved, which `_invalidate_maintenance_cache` does once every save/delete
+    is committed.
+    """
+    ttl = getattr(settings, 'MAINTENANCE_CACHE_TTL', 10)
+    if not ttl:
+        return _load_scheduled_global_records()
+    now = time.time()
+    with _global_records_lock:
+        cached = dict(_global_records_cache)
+    if cached and now - cached['checked'] < ttl:
+        return cached['records']
+    version = _get_maintenance_version()
+    if cached and version is not None and version == cached['version']:
+        records = cached['records']
+    else:
+        records = _load_scheduled_global_records()
+    with _global_records_lock:
+        _global_records_cache.update(
+            version=version, checked=now, records=records
+        )
+    return records
+
+
+def _load_scheduled_global_records():
+    return list(
+        MaintenanceRecord.objects.filter(
+            Q(provider__isnull=True),
+            Q(end_date__gt=timezone.now()) | Q(end_date__isnull=True)
+        )
+    )
+
+
+def _get_maintenance_version():
+    from service.cache import redis_connection
+    try:
+        connection = redis_connection()
+        connection.setnx(MAINTENANCE_VERSION_KEY, 0)
+        return connection.get(MAINTENANCE_VERSION_KEY)
+    except Exception as exc:
+        logger.warn("Could not read the maintenance version - %s" % exc)
+        return None
+
+
+def _invalidate_maintenance_cache(sender, instance, **kwargs):
+    # Bumped before the commit, another process could reload the old
+    # records and keep them under the new version.
+    transaction.on_commit(_bump_maintenance_version)
+
+
+def _bump_maintenance_version():
+    from service.cache import redis_connection
+    with _global_records_lock:
+        _global_records_cache.clear()
+    try:
+        redis_connection().incr(MAINTENANCE_VERSION_KEY)
+    except Exception as exc:
+        logger.warn("Could not bump the maintenance version - %s" % exc)
+
+
+post_save.connect(_invalidate_maintenance_cache, sender=MaintenanceRecord)
+post_delete.connect(_invalidate_maintenance_cache, sender=MaintenanceRecord)
@@ -6,6 +6,7 @@ TODO:
   files based on class being managed.
 """
 from core.query import only_current_instances
+from django.contrib.postgres.fields.jsonb import KeyTransform
 from django.db import models
 from django.utils import timezone
 
@@ -16,3 +17,50 @@ class ActiveInstancesManager(models.Manager):
         return super(ActiveInstancesManager, self).get_queryset().filter(
             only_current_instances(now_time)
         )
+
+
+class EventTableQuerySet(models.QuerySet):
+    """
+    Lookups on EventTable payload keys that use the expression indexes of
+    migration 0101_eventtable_payload_indexes. Each index is on
+    `payload -> '<key>'`, which is the SQL Django generates for
+    `payload__<key>=value`.
+    """
+
+    def for_allocation_source(self, allocation_source_name):
+        return self.filter(
+            payload__allocation_source_name=allocation_source_name
+        )
+
+    def for_instance(self, instance_id):
+        return self.filter(payload__instance_id=instance_id)
+
+    def for_instances(self, instance_ids):
+        return self.filter(payload__instance_id__in=list(instance_ids))
+
+    def latest_per_instance(self):
+        """
+        The latest event of each (payload 'instance_id', entity_id), using
+        DISTINCT ON. Replaces any ordering of the queryset.
+        """
+        return self.annotate(
+            event_instance_id=KeyTransform('instance_id', 'payload')
+        ).order_by('event_instance_id', 'entity_id', '-timestamp').distinct(
+            'event_instance_id', 'entity_id'
+        )
+
+    def for_username(self, username):
+        """
+        Events of `username`: about them (payload 'username') or raised
+        by them (entity_id).
+        """
+        return self.filter(
+            models.Q(payload__username=username) | models.Q(entity_id=username)
+        )
+
+    def threshold_met(self, allocation_source_name, threshold):
+        return self.filter(
+            name='allocation_source_threshold_met'
+        ).for_allocation_source(allocation_source_name).filter(
+            payload__threshold=threshold
+        )
@@ -10,6 +10,7 @@ from django.core.exceptions import ValidationError
 from django.contrib.postgres.fields import JSONField
 
 from rtwo.models.provider import EucaProvider, OSProvider
+from core import request_cache
 from core.validators import validate_timezone
 
 from uuid import uuid4
@@ -237,9 +238,19 @@ class Provider(models.Model):
     def get_location(self):
         return self.location
 
+    def credential_map(self):
+        """
+        Return {key: value} of this provider's credentials, loaded once per
+        API request. Treat the result as read-only.
+        """
+        return request_cache.get_or_set(
+            ('provider.credentials', self.id), lambda: dict(
+                (cred.key, cred.value) for cred in self.credentials()
+            )
+        )
+
     def get_credential(self, key):
-        cred = self.providercredential_set.filter(key=key)
-        return cred[0].value if cred else None
+        return self.credential_map().get(key)
 
     def credentials(self):
         return self.providercredential_set.all()
@@ -251,10 +262,7 @@ class Provider(models.Model):
         instead of
         [ <Credential: Key=key, Value=abc>, <Credential: Key=secret Value=xyz> ]
         """
-        cred_map = {}
-        for cred in self.credentials():
-            cred_map[cred.key] = cred.value
-        return cred_map
+        return dict(self.credential_map())
 
     def get_routers(self):
         """
@@ -293,7 +301,7 @@ class Provider(models.Model):
                 router_name = rtr_name
         return router_name
 
-    def get_router_distribution(self, router_count_map={}):
+    def get_router_distribution(self, router_count_map=None):
         """
         Determine the distibution of routers based on:
         * The router names that are stored on the provider
@@ -173,7 +173,92 @@ class Quota(models.Model):
         app_label = 'core'
 
 
-def has_cpu_quota(driver, quota, new_size=0, raise_exc=True):
+class QuotaUsage(object):
+    """
+    What an identity is currently using on its provider, for the `has_*_quota`
+    checks.
+
+    Each resource type is listed lazily and at most once, so evaluating every
+    quota for a launch costs one Nova/Neutron/Cinder listing per resource type
+    rather than one per check. `reserve` records resources that were granted
+    after the listings were taken, so a snapshot that is re-used for a short
+    while still accounts for launches made in the meantime.
+    """
+    RESOURCES = (
+        'cpu', 'memory', 'instances', 'ports', 'floating_ips', 'storage',
+        'volumes', 'snapshots'
+    )
+
+    def __init__(self, driver, identity=None):
+        self.driver = driver
+        self.identity = identity
+        self.pending = dict((resource, 0) for resource in self.RESOURCES)
+        self._listings = {}
+
+    def reserve(self, **resources):
+        """
+        Count resources granted since the listings were taken, e.g.
+        reserve(cpu=2, memory=4, instances=1). Memory and storage are in GB.
+        """
+        for resource, amount in resources.items():
+            self.pending[resource] += amount
+
+    def _listing(self, name, list_method):
+        if name not in self._listings:
+            self._listings[name] = list_method()
+        return self._listings[name]
+
+    @property
+    def instances(self):
+        return self._listing('instances', self._list_instances)
+
+    def _list_instances(self):
+        _pre_cache_sizes(self.driver)
+        return self.driver.list_instances()
+
+    @property
+    def floating_ips(self):
+        return self._listing(
+            'floating_ips', self.driver._connection.ex_list_floating_ips
+        )
+
+    @property
+    def volumes(self):
+        return self._listing('volumes', self.driver.list_volumes)
+
+    @property
+    def snapshots(self):
+        return self._listing(
+            'snapshots', self.driver._connection.ex_list_snapshots
+        )
+
+    @property
+    def ports(self):
+        """
+        Ports of compute devices in the identity's project,
+        or None if the network driver could not be reached.
+        """
+        return self._listing('ports', self._list_ports)
+
+    def _list_ports(self):
+        try:
+            from service.instance import _to_network_driver
+            network_driver = _to_network_driver(self.identity)
+            port_list = network_driver.list_ports()
+        except Exception as exc:
+            logger.warn(
+                "Could not verify quota due to failed call to network_driver.list_ports() - %s"
+                % exc
+            )
+            return None
+        project_id = network_driver.get_tenant_id()
+        return [
+            port for port in port_list if 'compute:' in port['device_owner']
+            and port.get('project_id', project_id) == project_id
+        ]
+
+
+def has_cpu_quota(driver, quota, new_size=0, raise_exc=True, usage=None):
     """
     True if the total number of CPU cores found on
     driver is less than or equal to Quota.cpu,
@@ -185,10 +270,9 @@ def has_cpu_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if cpu is null
     if not quota.cpu or quota.cpu < 0:
         return True
-    total_size = new_size
-    _pre_cache_sizes(driver)
-    instances = driver.list_instances()
-    for inst in instances:
+    usage = usage or QuotaUsage(driver)
+    total_size = new_size + usage.pending['cpu']
+    for inst in usage.instances:
         try:
             total_size += inst.size._size.extra['cpu']
         except (AttributeError, KeyError):
@@ -201,7 +285,7 @@ def has_cpu_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_mem_quota(driver, quota, new_size=0, raise_exc=True):
+def has_mem_quota(driver, quota, new_size=0, raise_exc=True, usage=None):
     """
     True if the total amount of RAM found on driver is
     less than or equal to Quota.mem, otherwise False.
@@ -212,10 +296,9 @@ def has_mem_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if ram is null
     if not quota.memory or quota.memory < 0:
         return True
-    total_size = new_size / 1024.0
-    _pre_cache_sizes(driver)
-    instances = driver.list_instances()
-    for inst in instances:
+    usage = usage or QuotaUsage(driver)
+    total_size = new_size / 1024.0 + usage.pending['memory']
+    for inst in usage.instances:
         try:
             total_size += inst.size._size.ram / 1024.0
         except (AttributeError, KeyError):
@@ -232,7 +315,9 @@ def has_mem_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_instance_count_quota(driver, quota, new_size=0, raise_exc=True):
+def has_instance_count_quota(
+    driver, quota, new_size=0, raise_exc=True, usage=None
+):
     """
     True if the total number of instances found on driver are
     greater than or equal to Quota.instance otherwise False.
@@ -243,8 +328,9 @@ def has_instance_count_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if instance count is null
     if not quota.instance_count or quota.instance_count < 0:
         return True
-    total_size = new_size
-    total_size += len(driver.list_instances())
+    usage = usage or QuotaUsage(driver)
+    total_size = new_size + usage.pending['instances']
+    total_size += len(usage.instances)
     if total_size <= quota.instance_count:
         return True
     if raise_exc:
@@ -254,7 +340,9 @@ def has_instance_count_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_port_count_quota(identity, driver, quota, new_size=0, raise_exc=True):
+def has_port_count_quota(
+    identity, driver, quota, new_size=0, raise_exc=True, usage=None
+):
     """
     True if the total number of ports found on driver are
     less than or equal to Quota.port_count, otherwise False.
@@ -265,23 +353,12 @@ def has_port_count_quota(identity, driver, quota, new_size=0, raise_exc=True):
     # Always True if port_count is null
     if not quota.port_count or quota.port_count < 0:
         return True
+    usage = usage or QuotaUsage(driver, identity)
+    fixed_ips = usage.ports
     # Consider it true if we fail to connect here
-    try:
-        from service.instance import _to_network_driver
-        network_driver = _to_network_driver(identity)
-        port_list = network_driver.list_ports()
-    except Exception as exc:
-        logger.warn(
-            "Could not verify quota due to failed call to network_driver.list_ports() - %s"
-            % exc
-        )
+    if fixed_ips is None:
         return True
-    project_id = network_driver.get_tenant_id()
-    fixed_ips = [
-        port for port in port_list if 'compute:' in port['device_owner']
-        and port.get('project_id', project_id) == project_id
-    ]
-    total_size = new_size
+    total_size = new_size + usage.pending['ports']
     total_size += len(fixed_ips)
     if total_size <= quota.port_count:
         return True
@@ -292,7 +369,9 @@ def has_port_count_quota(identity, driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_floating_ip_count_quota(driver, quota, new_size=0, raise_exc=True):
+def has_floating_ip_count_quota(
+    driver, quota, new_size=0, raise_exc=True, usage=None
+):
     """
     True if the total number of floating ips found on driver are
     less than or equal to Quota.floating_ip_count, otherwise False.
@@ -303,9 +382,9 @@ def has_floating_ip_count_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if floating_ip_count is null
     if not quota.floating_ip_count or quota.floating_ip_count < 0:
         return True
-    floating_ips = driver._connection.ex_list_floating_ips()
-    total_size = new_size
-    total_size += len(floating_ips)
+    usage = usage or QuotaUsage(driver)
+    total_size = new_size + usage.pending['floating_ips']
+    total_size += len(usage.floating_ips)
     if total_size <= quota.floating_ip_count:
         return True
     if raise_exc:
@@ -316,7 +395,7 @@ def has_floating_ip_count_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_storage_quota(driver, quota, new_size=0, raise_exc=True):
+def has_storage_quota(driver, quota, new_size=0, raise_exc=True, usage=None):
     """
     True if the total volume size found on driver is
     less than or equal to Quota.storage, otherwise False.
@@ -327,9 +406,9 @@ def has_storage_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if storage is null
     if not quota.storage:
         return True
-    vols = driver.list_volumes()
-    total_size = new_size
-    for vol in vols:
+    usage = usage or QuotaUsage(driver)
+    total_size = new_size + usage.pending['storage']
+    for vol in usage.volumes:
         total_size += vol.size
     if total_size <= quota.storage:
         return True
@@ -340,7 +419,9 @@ def has_storage_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_snapshot_count_quota(driver, quota, new_size=0, raise_exc=True):
+def has_snapshot_count_quota(
+    driver, quota, new_size=0, raise_exc=True, usage=None
+):
     """
     True if the total number of volumes found on driver are
     greater than or equal to Quota.snapshot otherwise False.
@@ -351,8 +432,9 @@ def has_snapshot_count_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if snapshot count is null
     if not quota.snapshot_count or quota.snapshot_count < 0:
         return True
-    total_size = new_size
-    total_size += len(driver._connection.ex_list_snapshots())
+    usage = usage or QuotaUsage(driver)
+    total_size = new_size + usage.pending['snapshots']
+    total_size += len(usage.snapshots)
     if total_size <= quota.snapshot_count:
         return True
     if raise_exc:
@@ -362,7 +444,9 @@ def has_snapshot_count_quota(driver, quota, new_size=0, raise_exc=True):
     return False
 
 
-def has_storage_count_quota(driver, quota, new_size=0, raise_exc=True):
+def has_storage_count_quota(
+    driver, quota, new_size=0, raise_exc=True, usage=None
+):
     """
     True if the total number of volumes found on driver are
     greater than or equal to Quota.storage otherwise False.
@@ -373,8 +457,9 @@ def has_storage_count_quota(driver, quota, new_size=0, raise_exc=True):
     # Always True if storage count is null
     if not quota.storage_count:
         return True
-    total_size = new_size
-    total_size += len(driver.list_volumes())
+    usage = usage or QuotaUsage(driver)
+    total_size = new_size + usage.pending['volumes']
+    total_size += len(usage.volumes)
     if total_size <= quota.storage_count:
         return True
     if raise_exc:
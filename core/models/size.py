@@ -102,6 +102,19 @@ def _update_from_cloud_size(core_size, rtwo_size):
     return core_size
 
 
+def cloud_size_changed(core_size, rtwo_size):
+    """
+    Return True if `_update_from_cloud_size` would change the core size.
+    """
+    if core_size.name != rtwo_size.name:
+        return True
+    if rtwo_size.cpu < 1 or rtwo_size.ram < 1:
+        return False
+    return (
+        core_size.disk, core_size.root, core_size.cpu, core_size.mem
+    ) != (rtwo_size.disk, rtwo_size.ephemeral, rtwo_size.cpu, rtwo_size.ram)
+
+
 def _create_from_cloud_size(esh_size, provider):
     core_size = Size.objects.create(
         alias=esh_size.id,
@@ -0,0 +1,43 @@
+"""
+Values cached for the duration of one API request.
+
+While a request is handled (see RequestCacheMiddleware), `get_or_set`
+remembers values per thread, so every copy of a model loaded during the
+request shares them. Outside of a request (Celery tasks, scripts) nothing
+is cached and `value_method` is called every time.
+"""
+import threading
+
+_local = threading.local()
+
+
+def start():
+    _local.values = {}
+
+
+def end():
+    _local.values = None
+
+
+def get_or_set(key, value_method):
+    values = getattr(_local, 'values', None)
+    if values is None:
+        return value_method()
+    if key not in values:
+        values[key] = value_method()
+    return values[key]
+
+
+def invalidate(key):
+    values = getattr(_local, 'values', None)
+    if values:
+        values.pop(key, None)
+
+
+class RequestCacheMiddleware(object):
+    def process_request(self, request):
+        start()
+
+    def process_response(self, request, response):
+        end()
+        return response
@@ -43,6 +43,23 @@ def send_email(subject, body, from_email, to, cc=None, html=False):
         return False
 
 
+@task(name="run_event_handler", ignore_result=True)
+def run_event_handler(handler_name, event_id, created=True):
+    """
+    Run an asynchronous EventTable hook (see core.hooks.event_bus) once the
+    event has been committed.
+    """
+    from core.hooks.event_bus import run_async_handler
+    try:
+        run_async_handler(handler_name, event_id, created)
+    except Exception as exc:
+        celery_logger.exception(
+            "Event handler %s failed for EventTable %s" %
+            (handler_name, event_id)
+        )
+        raise exc
+
+
 @task(name="close_request")
 def close_request(request):
     """
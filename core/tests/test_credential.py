@@ -0,0 +1,129 @@
+import mock
+from django.test import TestCase
+
+from api.tests.factories import IdentityFactory, ProviderFactory
+from core import request_cache
+from core.models import Identity
+from core.models.credential import (
+    Credential, ProviderCredential, load_identity_credentials,
+    load_project_identities, prefetch_credentials
+)
+from service.cache import admin_drivers, drivers
+
+
+class CredentialIndexTest(TestCase):
+    def setUp(self):
+        self.provider = ProviderFactory.create()
+        ProviderCredential.objects.create(
+            provider=self.provider, key='auth_url', value='https://cloud'
+        )
+        self.identities = []
+        for project_name in ['alpha', 'beta']:
+            identity = IdentityFactory.create(provider=self.provider)
+            Credential.objects.create(
+                identity=identity, key='ex_project_name', value=project_name
+            )
+            Credential.objects.create(
+                identity=identity, key='key', value=project_name
+            )
+            self.identities.append(identity)
+
+    def tearDown(self):
+        request_cache.end()
+
+    def test_load_project_identities(self):
+        other_provider = ProviderFactory.create()
+        with self.assertNumQueries(1):
+            project_identities = load_project_identities(
+                [self.provider, other_provider], ['alpha', 'beta', 'gamma']
+            )
+        self.assertEqual(
+            project_identities, {
+                (self.provider.id, 'alpha'): self.identities[0],
+                (self.provider.id, 'beta'): self.identities[1]
+            }
+        )
+
+    def test_load_identity_credentials(self):
+        credentials = load_identity_credentials(
+            [identity.id for identity in self.identities]
+        )
+        self.assertEqual(
+            credentials[self.identities[1].id], {
+                'ex_project_name': 'beta',
+                'key': 'beta'
+            }
+        )
+
+    def test_prefetched_credentials_make_no_queries(self):
+        identities = prefetch_credentials(
+            Identity.objects.filter(provider=self.provider)
+            .select_related('provider')
+        )
+        with self.assertNumQueries(0):
+            for identity in identities:
+                self.assertEqual(
+                    identity.get_all_credentials()['auth_url'],
+                    'https://cloud'
+                )
+                self.assertEqual(
+                    identity.project_name(), identity.get_credential('key')
+                )
+
+    def test_request_cache_is_shared_and_invalidated(self):
+        request_cache.start()
+        identity = self.identities[0]
+        self.assertEqual(identity.get_credential('key'), 'alpha')
+        copy = Identity.objects.get(id=identity.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(copy.get_credential('key'), 'alpha')
+        Credential.objects.filter(identity=identity, key='key').get().delete()
+        Credential.objects.create(identity=identity, key='key', value='new')
+        self.assertEqual(
+            Identity.objects.get(id=identity.id).get_credential('key'), 'new'
+        )
+
+    @mock.patch('service.tasks.monitoring.invalidate_monitoring_caches')
+    def test_credential_changes_invalidate_drivers(
+        self, invalidate_monitoring_caches
+    ):
+        identity, other_identity = self.identities
+        for pooled_identity in self.identities:
+            drivers.get_driver(
+                (self.provider.id, pooled_identity.uuid, 'hash'),
+                lambda: 'old driver'
+            )
+        admin_drivers.get_driver(self.provider, lambda: 'old admin driver')
+
+        Credential.objects.create(identity=identity, key='secret', value='1')
+        self.assertEqual(
+            drivers.get_driver(
+                (self.provider.id, identity.uuid, 'hash'),
+                lambda: 'new driver'
+            ), 'new driver'
+        )
+        self.assertEqual(
+            drivers.get_driver(
+                (self.provider.id, other_identity.uuid, 'hash'),
+                lambda: 'new driver'
+            ), 'old driver'
+        )
+        self.assertEqual(
+            admin_drivers.get_driver(self.provider, lambda: None),
+            'old admin driver'
+        )
+        self.assertFalse(invalidate_monitoring_caches.called)
+
+        ProviderCredential.objects.filter(provider=self.provider).delete()
+        self.assertEqual(
+            admin_drivers.get_driver(
+                self.provider, lambda: 'new admin driver'
+            ), 'new admin driver'
+        )
+        self.assertEqual(
+            drivers.get_driver(
+                (self.provider.id, other_identity.uuid, 'hash'),
+                lambda: 'new driver'
+            ), 'new driver'
+        )
+        invalidate_monitoring_caches.assert_called_once_with(self.provider)
@@ -0,0 +1,82 @@
+import mock
+from django.test import TestCase
+
+from core.hooks import event_bus
+from core.models import EventTable
+
+handled = []
+
+
+def handle_cheap_event(sender, instance, created, **kwargs):
+    handled.append(('cheap', instance.name, created))
+
+
+def handle_slow_event(sender, instance, created, **kwargs):
+    handled.append(('slow', instance.name, created))
+
+
+def handle_before_event(sender, instance, **kwargs):
+    handled.append(('before', instance.name, instance.pk))
+
+
+event_bus.register_event_handler('test_cheap_event', handle_cheap_event)
+event_bus.register_event_handler(
+    'test_cheap_event', handle_before_event, signal=event_bus.PRE_SAVE
+)
+event_bus.register_event_handler(
+    'test_slow_event', handle_slow_event, run_async=True
+)
+
+
+class EventBusTest(TestCase):
+    def setUp(self):
+        del handled[:]
+
+    def _create_event(self, name):
+        return EventTable.objects.create(
+            name=name, entity_id='test-user', payload={}
+        )
+
+    def test_dispatch_by_event_name(self):
+        self._create_event('test_cheap_event')
+        self.assertEqual(
+            handled, [('before', 'test_cheap_event', None),
+                      ('cheap', 'test_cheap_event', True)]
+        )
+        del handled[:]
+        self._create_event('test_unhandled_event')
+        self.assertEqual(handled, [])
+
+    def test_async_handlers_run_on_commit(self):
+        with mock.patch(
+            'core.hooks.event_bus.transaction.on_commit'
+        ) as on_commit:
+            event = self._create_event('test_slow_event')
+        self.assertEqual(handled, [])
+        self.assertEqual(on_commit.call_count, 1)
+        # Commit: the (eager) task loads the event and runs the handler
+        on_commit.call_args[0][0]()
+        self.assertEqual(handled, [('slow', event.name, True)])
+
+    def test_async_handlers_inline_when_disabled(self):
+        with self.settings(EVENT_HANDLERS_ASYNC=False):
+            self._create_event('test_slow_event')
+        self.assertEqual(handled, [('slow', 'test_slow_event', True)])
+
+    def test_async_pre_save_handler_is_refused(self):
+        with self.assertRaises(ValueError):
+            event_bus.register_event_handler(
+                'test_cheap_event',
+                handle_before_event,
+                signal=event_bus.PRE_SAVE,
+                run_async=True
+            )
+
+    def test_handler_timings(self):
+        name = 'core.tests.test_event_bus.handle_cheap_event'
+        calls = event_bus.handler_timings().get(name, {}).get('calls', 0)
+        self._create_event('test_cheap_event')
+        self._create_event('test_cheap_event')
+        timing = event_bus.handler_timings()[name]
+        self.assertEqual(timing['calls'], calls + 2)
+        self.assertGreaterEqual(timing['total'], timing['max'])
@@ -1,6 +1,8 @@
 from unittest import skip
 
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
 from api.tests.factories import UserFactory
 from core.models import EventTable, AllocationSource
@@ -47,3 +49,69 @@ class EventTableTest(TestCase):
                 'threshold': 10
             }
         )
+
+
+class BulkCreateEventsTest(TestCase):
+    def setUp(self):
+        self.users = [UserFactory.create() for _ in range(3)]
+        self.source = AllocationSource.objects.create(
+            name='TG-BULK100', compute_allowed=1000
+        )
+        self.old_source = AllocationSource.objects.create(
+            name='TG-BULK200', compute_allowed=1000
+        )
+        UserAllocationSource.objects.create(
+            user=self.users[0], allocation_source=self.source
+        )
+        UserAllocationSource.objects.create(
+            user=self.users[0], allocation_source=self.old_source
+        )
+
+    def _event(self, name, user, source):
+        return EventTable(
+            name=name,
+            entity_id=user.username,
+            payload={'allocation_source_name': source.name}
+        )
+
+    def test_user_allocation_source_events(self):
+        events = [
+            self._event('user_allocation_source_created', user, self.source)
+            for user in self.users
+        ] + [
+            self._event(
+                'user_allocation_source_deleted', self.users[0],
+                self.old_source
+            )
+        ]
+        # One insert, four queries to create the memberships and one
+        # delete, whatever the number of users
+        with CaptureQueriesContext(connection) as queries:
+            EventTable.bulk_create_events(events)
+        self.assertLessEqual(len(queries), 10)
+        self.assertEqual(EventTable.objects.count(), 4)
+        self.assertEqual(
+            set(
+                UserAllocationSource.objects.values_list(
+                    'user__username', 'allocation_source__name'
+                )
+            ), set((user.username, self.source.name) for user in self.users)
+        )
+
+    def test_invalid_events_are_not_created(self):
+        events = [
+            self._event(
+                'user_allocation_source_created', self.users[1], self.source
+            ),
+            EventTable(
+                name='user_allocation_source_created',
+                entity_id=self.users[2].username,
+                payload={}
+            )
+        ]
+        with self.assertRaises(ValueError):
+            EventTable.bulk_create_events(events)
+        self.assertEqual(EventTable.objects.count(), 0)
+        self.assertFalse(
+            UserAllocationSource.objects.filter(user=self.users[1]).exists()
+        )
@@ -3,9 +3,17 @@ import uuid
 import unittest
 
 from dateutil.relativedelta import relativedelta
+import mock
+from django.test import TestCase
 from django.utils.timezone import datetime
 import pytz
 
+from api.tests.factories import (
+    InstanceFactory, InstanceHistoryFactory, InstanceStatusFactory,
+    ProviderFactory, SizeFactory
+)
+from core.models import Instance, InstanceStatusHistory
+from core.models.instance import convert_esh_instances
 from core.tests.helpers import CoreStatusHistoryHelper, CoreInstanceHelper
 
 # Create an instance
@@ -89,3 +97,125 @@ class TestInstanceStatusHistory(CoreInstanceTestCase):
             next_start = next_start + self.history_swap_every
         self.instance_1.end_date_all(self.terminate_time)
         self.assertNoActiveHistory(self.instance_1)
+
+
+class TestLastStatusHistory(TestCase):
+    def setUp(self):
+        self.start_time = datetime(2015, 1, 1, tzinfo=pytz.utc)
+        self.instance = InstanceFactory.create(start_date=self.start_time)
+        self.size = SizeFactory.create()
+        self.first_history = InstanceHistoryFactory.create(
+            instance=self.instance,
+            size=self.size,
+            status=InstanceStatusFactory.create(name='build'),
+            start_date=self.start_time
+        )
+
+    def test_transaction_moves_pointer(self):
+        self.assertEqual(
+            self.instance.last_status_history, self.first_history
+        )
+        new_history = InstanceStatusHistory.transaction(
+            'active',
+            None,
+            self.instance,
+            self.size,
+            start_time=self.start_time + relativedelta(minutes=5)
+        )
+        instance = Instance.objects.select_related(
+            'last_status_history__status'
+        ).get(id=self.instance.id)
+        self.assertEqual(instance.last_status_history, new_history)
+        with self.assertNumQueries(0):
+            self.assertEqual(instance.api_status(), 'active')
+
+    def test_older_history_does_not_move_pointer(self):
+        InstanceHistoryFactory.create(
+            instance=self.instance,
+            size=self.size,
+            status=InstanceStatusFactory.create(name='unknown'),
+            start_date=self.start_time - relativedelta(days=1),
+            end_date=self.start_time
+        )
+        instance = Instance.objects.get(id=self.instance.id)
+        self.assertEqual(instance.get_last_history(), self.first_history)
+
+
+class TestConvertEshInstances(TestCase):
+    def setUp(self):
+        self.start_time = datetime(2015, 1, 1, tzinfo=pytz.utc)
+        self.provider = ProviderFactory.create()
+        self.size = SizeFactory.create(provider=self.provider)
+        self.active = InstanceStatusFactory.create(name='active')
+        self.instances = [self._create_instance(index) for index in range(6)]
+
+    def _create_instance(self, index):
+        instance = InstanceFactory.create(
+            start_date=self.start_time,
+            ip_address='10.0.0.%s' % index,
+            provider_machine__instance_source__provider=self.provider
+        )
+        InstanceHistoryFactory.create(
+            instance=instance,
+            size=self.size,
+            status=self.active,
+            start_date=self.start_time
+        )
+        return instance
+
+    def _esh_instance(self, instance, status='active'):
+        esh_size = mock.Mock(
+            id=self.size.alias,
+            cpu=self.size.cpu,
+            ram=self.size.mem,
+            disk=self.size.disk,
+            ephemeral=self.size.root
+        )
+        esh_size.name = self.size.name
+        return mock.Mock(
+            id=instance.provider_alias,
+            ip=instance.ip_address,
+            size=esh_size,
+            extra={
+                'status': status,
+                'metadata': {}
+            },
+            **{'get_status.return_value': status}
+        )
+
+    def _convert(self, esh_instances):
+        return convert_esh_instances(
+            mock.Mock(), esh_instances, self.provider.uuid, None, None
+        )
+
+    def test_unchanged_instances_make_a_fixed_number_of_queries(self):
+        # The provider, the instances (with their last history) and the sizes
+        for count in (2, len(self.instances)):
+            esh_instances = [
+                self._esh_instance(instance)
+                for instance in self.instances[:count]
+            ]
+            with self.assertNumQueries(3):
+                converted = self._convert(esh_instances)
+            self.assertEqual(
+                [instance.id for instance in converted],
+                [instance.id for instance in self.instances[:count]]
+            )
+        self.assertEqual(InstanceStatusHistory.objects.count(), 6)
+
+    def test_changed_instance_gets_a_new_history(self):
+        esh_instances = [
+            self._esh_instance(instance) for instance in self.instances
+        ]
+        changed = self.instances[2]
+        esh_instances[2] = self._esh_instance(changed, status='suspended')
+        self._convert(esh_instances)
+        self.assertEqual(InstanceStatusHistory.objects.count(), 7)
+        self.assertEqual(
+            Instance.objects.get(id=changed.id).get_last_history().status.name,
+            'suspended'
+        )
+        for instance in self.instances[:2] + self.instances[3:]:
+            self.assertEqual(
+                instance.instancestatushistory_set.get().status.name, 'active'
+            )
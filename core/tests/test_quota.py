@@ -0,0 +1,48 @@
+import unittest
+
+import mock
+from django.core.exceptions import ValidationError
+
+from core.models.quota import (
+    Quota, QuotaUsage, has_cpu_quota, has_instance_count_quota, has_mem_quota
+)
+
+
+def _mock_instance(cpu, ram):
+    instance = mock.Mock()
+    instance.size._size.extra = {'cpu': cpu}
+    instance.size._size.ram = ram
+    return instance
+
+
+class QuotaUsageTest(unittest.TestCase):
+    def setUp(self):
+        self.driver = mock.Mock()
+        self.driver.provider.sizeCls.sizes.get.return_value = ['cached']
+        self.driver.list_instances.return_value = [
+            _mock_instance(cpu=2, ram=4096),
+            _mock_instance(cpu=4, ram=8192),
+        ]
+        self.quota = Quota(cpu=8, memory=16, instance_count=3)
+
+    def test_checks_share_one_listing(self):
+        usage = QuotaUsage(self.driver)
+        self.assertTrue(has_cpu_quota(self.driver, self.quota, 2, usage=usage))
+        self.assertTrue(
+            has_mem_quota(self.driver, self.quota, 4096, usage=usage)
+        )
+        self.assertTrue(
+            has_instance_count_quota(self.driver, self.quota, 1, usage=usage)
+        )
+        self.assertEqual(self.driver.list_instances.call_count, 1)
+
+    def test_reserved_resources_are_counted(self):
+        usage = QuotaUsage(self.driver)
+        usage.reserve(cpu=2, instances=1)
+        with self.assertRaises(ValidationError):
+            has_cpu_quota(self.driver, self.quota, 1, usage=usage)
+        self.assertFalse(
+            has_instance_count_quota(
+                self.driver, self.quota, 1, raise_exc=False, usage=usage
+            )
+        )
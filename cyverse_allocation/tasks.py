@@ -8,10 +8,10 @@ from django.utils.timezone import datetime
 from threepio import celery_logger as logger
 
 from core.models import EventTable
-from core.models.allocation_source import AllocationSourceSnapshot, AllocationSource, UserAllocationSnapshot, \
-    total_usage
+from core.models.allocation_source import AllocationSourceSnapshot, AllocationSource, UserAllocationSnapshot
 from cyverse_allocation.cyverse_rules_engine_setup import CyverseTestRenewalVariables, CyverseTestRenewalActions, \
     cyverse_rules, renewal_strategies
+from service.allocation_logic import create_bulk_report
 
 
 @task(name="update_snapshot_cyverse")
@@ -21,13 +21,13 @@ def update_snapshot_cyverse(start_date=None, end_date=None):
         microsecond=0
     ) if not end_date else end_date
 
+    window_starts = []
     for allocation_source in AllocationSource.objects.order_by('name'):
-        # calculate and save snapshots here
         allocation_source_name = allocation_source.name
         last_renewal_event = EventTable.objects.filter(
-            name='allocation_source_created_or_renewed',
-            payload__allocation_source_name__exact=str(allocation_source_name)
-        ).order_by('timestamp')
+            name='allocation_source_created_or_renewed'
+        ).for_allocation_source(str(allocation_source_name)
+                               ).order_by('timestamp')
 
         if not last_renewal_event:
             logger.info(
@@ -39,17 +39,25 @@ def update_snapshot_cyverse(start_date=None, end_date=None):
         start_date = last_renewal_event.last().timestamp.replace(
             microsecond=0
         ) if not start_date else start_date
+        window_starts.append((allocation_source, start_date))
+
+    # Sources renewed together share a window, so every user's usage for
+    # that window comes from a single report.
+    reports = {}
+    for _, window_start in window_starts:
+        if window_start not in reports:
+            reports[window_start] = create_bulk_report(window_start, end_date)
 
+    for allocation_source, start_date in window_starts:
+        # calculate and save snapshots here
+        allocation_source_name = allocation_source.name
+        report = reports[start_date]
         total_compute_used = 0
         total_burn_rate = 0
         for user in allocation_source.all_users:
-            compute_used, burn_rate = total_usage(
-                user.username,
-                start_date=start_date,
-                end_date=end_date,
-                allocation_source_name=allocation_source_name,
-                burn_rate=True
-            )
+            usage = report.get((user.username, allocation_source_name), {})
+            compute_used = usage.get('compute_used', 0.0)
+            burn_rate = usage.get('burn_rate', 0)
 
             UserAllocationSnapshot.objects.update_or_create(
                 allocation_source=allocation_source,
@@ -99,6 +107,7 @@ def allocation_threshold_check():
         )
         return
 
+    threshold_events = []
     for allocation_source in AllocationSource.objects.filter(
         compute_allowed__gte=0
     ).all():
@@ -113,10 +122,8 @@ def allocation_threshold_check():
                 allocation_source_name = allocation_source.name
 
                 # check if event has been fired
-                prev_event = EventTable.objects.filter(
-                    name='allocation_source_threshold_met',
-                    payload__allocation_source_name=allocation_source_name,
-                    payload__threshold=threshold
+                prev_event = EventTable.objects.threshold_met(
+                    allocation_source_name, threshold
                 ).last()
                 if prev_event:
                     continue
@@ -126,12 +133,15 @@ def allocation_threshold_check():
                 payload['threshold'] = threshold
                 payload['usage_percentage'] = float(percentage_used)
 
-                EventTable.objects.create(
-                    name='allocation_source_threshold_met',
-                    payload=payload,
-                    entity_id=payload['allocation_source_name']
+                threshold_events.append(
+                    EventTable(
+                        name='allocation_source_threshold_met',
+                        payload=payload,
+                        entity_id=payload['allocation_source_name']
+                    )
                 )
                 break
+    EventTable.bulk_create_events(threshold_events)
     logger.debug(
         "allocation_threshold_check task finished at %s." % datetime.now()
     )
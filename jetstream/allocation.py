@@ -1,4 +1,7 @@
+import datetime
+from multiprocessing.pool import ThreadPool
 import uuid
+from django.apps import apps
 from django.conf import settings
 from django.db import IntegrityError
 from django.utils import timezone
@@ -59,22 +62,49 @@ class TASAPIDriver(object):
     def get_tacc_username(self, user, raise_exception=False):
         if self.username_map.get(user.username):
             return self.username_map[user.username]
+        if self.load_tacc_usernames([user.username]):
+            return self.username_map[user.username]
+        tacc_user = self.request_tacc_username(user.username, raise_exception)
+        if tacc_user:
+            save_tacc_usernames({user.username: tacc_user})
+        return tacc_user
+
+    def load_tacc_usernames(self, xsede_usernames):
+        """
+        Add the stored, unexpired TACC usernames of `xsede_usernames` to
+        `username_map`, in one query. Returns the number added.
+        """
+        if not _username_mappings_enabled():
+            return 0
+        mappings = dict(
+            _fresh_username_mappings().filter(
+                xsede_username__in=list(xsede_usernames)
+            ).values_list('xsede_username', 'tacc_username')
+        )
+        self.username_map.update(mappings)
+        return len(mappings)
+
+    def request_tacc_username(self, xsede_username, raise_exception=False):
+        """
+        Ask the TAS API for the TACC username of `xsede_username`, without
+        touching the database (so it can run in a worker thread).
+        """
         tacc_user = None
         try:
-            tacc_user = self._xsede_to_tacc_username(user.username)
+            tacc_user = self._xsede_to_tacc_username(xsede_username)
         except NoTaccUserForXsedeException:
-            logger.exception('User: %s has no TACC username', user.username)
+            logger.exception('User: %s has no TACC username', xsede_username)
             if raise_exception:
                 raise
         except TASAPIException:
             logger.exception(
                 'Some exception happened while getting TACC username for user: %s',
-                user.username
+                xsede_username
             )
             if raise_exception:
                 raise
         else:
-            self.username_map[user.username] = tacc_user
+            self.username_map[xsede_username] = tacc_user
         return tacc_user
 
     def find_projects_for(self, tacc_username):
@@ -135,11 +165,21 @@ class TASAPIDriver(object):
             raise TASAPIException("JSON Decode error -- %s" % exc)
 
     def report_project_allocation(
-        self, report_id, username, project_name, su_total, start_date, end_date,
-        queue_name, scheduler_id
+        self,
+        report_id,
+        username,
+        project_name,
+        su_total,
+        start_date,
+        end_date,
+        queue_name,
+        scheduler_id,
+        idempotency_key=None
     ):
         """
         Send back a report
+        idempotency_key - Sent as the 'Idempotency-Key' header, so a report
+            that is sent again (e.g. after a timeout) can be recognized
         """
         if not type(su_total) in [int, float]:
             raise Exception("SU total should be integer or float")
@@ -159,8 +199,11 @@ class TASAPIDriver(object):
         path = '/v1/jobs'
         url_match = self.tacc_api + path
         # logger.debug("TAS_REQ: %s - POST - %s" % (url_match, post_data))
+        headers = {'Idempotency-Key': idempotency_key
+                  } if idempotency_key else None
         resp = tacc_api_post(
-            url_match, post_data, self.tacc_username, self.tacc_password
+            url_match, post_data, self.tacc_username, self.tacc_password,
+            headers
         )
         # logger.debug("TAS_RESP: %s" % resp.__dict__)  # Overkill?
         try:
@@ -364,6 +407,46 @@ def get_or_create_allocation_source(api_allocation):
     return source
 
 
+def _username_mappings_enabled():
+    # TACCUsernameMapping only exists where the jetstream app is installed
+    return apps.is_installed('jetstream')
+
+
+def _fresh_username_mappings():
+    from jetstream.models import TACCUsernameMapping
+    ttl = getattr(settings, 'TACC_USERNAME_MAPPING_TTL', 86400)
+    return TACCUsernameMapping.objects.filter(
+        updated__gte=timezone.now() - datetime.timedelta(seconds=ttl)
+    )
+
+
+def save_tacc_usernames(tacc_usernames):
+    """
+    Store {xsede_username: tacc_username} mappings returned by the TAS API.
+    """
+    if not tacc_usernames or not _username_mappings_enabled():
+        return
+    from jetstream.models import TACCUsernameMapping
+    now = timezone.now()
+    TACCUsernameMapping.objects.filter(
+        xsede_username__in=list(tacc_usernames)
+    ).delete()
+    try:
+        TACCUsernameMapping.objects.bulk_create(
+            [
+                TACCUsernameMapping(
+                    xsede_username=xsede_username,
+                    tacc_username=tacc_username,
+                    updated=now
+                )
+                for xsede_username, tacc_username in tacc_usernames.items()
+            ]
+        )
+    except IntegrityError:
+        # Stored meanwhile by another process, which is just as good.
+        logger.info("TACC usernames were stored concurrently, skipping")
+
+
 def find_user_allocation_source_for(driver, user):
     tacc_user = driver.get_tacc_username(user, raise_exception=True)
     # allocations = driver.find_allocations_for(tacc_user)
@@ -375,22 +458,131 @@ def find_user_allocation_source_for(driver, user):
     return allocations
 
 
+def request_user_allocations(driver, xsede_username):
+    """
+    Return (TACC username, allocations) of `xsede_username`, asking the TAS
+    API only (no database access), so it can run in a worker thread.
+    Allocations are None if TAS did not return them.
+    """
+    tacc_user = driver.username_map.get(xsede_username)
+    if not tacc_user:
+        tacc_user = driver.request_tacc_username(
+            xsede_username, raise_exception=True
+        )
+    project_allocations = driver.get_user_allocations(tacc_user)
+    if project_allocations is None:
+        return tacc_user, None
+    # 2-tuples: (project, allocation)
+    return tacc_user, [pa[1] for pa in project_allocations]
+
+
+def request_all_user_allocations(driver, xsede_usernames, threads=None):
+    """
+    Return {xsede_username: (TACC username, allocations)} of
+    `xsede_usernames`, asking the TAS API on a pool of at most `threads`
+    (default: settings.TACC_API_THREADS) threads. A user whose lookup
+    failed maps to the exception raised.
+    """
+    xsede_usernames = list(xsede_usernames)
+    if not xsede_usernames:
+        return {}
+    if not threads:
+        threads = getattr(settings, 'TACC_API_THREADS', 8)
+
+    def _request(xsede_username):
+        try:
+            return xsede_username, request_user_allocations(
+                driver, xsede_username
+            )
+        except Exception as exc:
+            return xsede_username, exc
+
+    pool = ThreadPool(min(len(xsede_usernames), threads))
+    try:
+        return dict(pool.map(_request, xsede_usernames))
+    finally:
+        pool.close()
+        pool.join()
+
+
 def fill_user_allocation_sources():
     from core.models import AtmosphereUser
     driver = TASAPIDriver()
     allocation_resources = {}
-    for user in AtmosphereUser.objects.order_by('username'):
+    user_sources = {}
+    # Users of one project share its allocations, look each up once
+    sources = {}
+    users = list(AtmosphereUser.objects.order_by('username'))
+    driver.load_tacc_usernames([user.username for user in users])
+    known_usernames = set(driver.username_map)
+    user_allocations = request_all_user_allocations(
+        driver, [user.username for user in users]
+    )
+    save_tacc_usernames(
+        dict(
+            (xsede_username, result[0])
+            for xsede_username, result in user_allocations.items()
+            if not isinstance(result, Exception) and result[0]
+            and xsede_username not in known_usernames
+        )
+    )
+    for user in users:
         try:
-            resources = fill_user_allocation_source_for(driver, user)
+            result = user_allocations[user.username]
+            if isinstance(result, Exception):
+                raise result
+            allocation_list = result[1]
+            if allocation_list is None:
+                logger.info(
+                    "find_user_allocation_source_for %s is None, so stop and don't delete allocations"
+                    % user.username
+                )
+                resources = None
+            else:
+                resources = [
+                    _get_or_create_allocation_source_once(
+                        sources, api_allocation
+                    ) for api_allocation in allocation_list
+                ]
+                user_sources[user] = resources
         except Exception:
             logger.exception(
                 "Error filling user allocation source for %s" % user
             )
             resources = []
         allocation_resources[user.username] = resources
+    for user in _sync_each_user_allocation_sources(user_sources):
+        allocation_resources[user.username] = []
     return allocation_resources
 
 
+def _sync_each_user_allocation_sources(user_sources):
+    """
+    Sync the allocation sources of every user at once, or one user at a
+    time if that fails, so that one user's error does not roll back the
+    changes of the others.
+    Returns the users whose allocation sources could not be synced.
+    """
+    try:
+        sync_user_allocation_sources(user_sources)
+        return []
+    except Exception:
+        logger.exception(
+            "Could not sync the allocation sources of %s users at once, "
+            "syncing them one at a time" % len(user_sources)
+        )
+    failed_users = []
+    for user, allocation_sources in user_sources.items():
+        try:
+            sync_user_allocation_sources({user: allocation_sources})
+        except Exception:
+            logger.exception(
+                "Error filling user allocation source for %s" % user
+            )
+            failed_users.append(user)
+    return failed_users
+
+
 def fill_user_allocation_source_for(driver, user):
     from core.models import AtmosphereUser
     assert isinstance(user, AtmosphereUser)
@@ -401,29 +593,58 @@ def fill_user_allocation_source_for(driver, user):
             % user.username
         )
         return
-    allocation_resources = []
-    user_allocation_sources = []
-    old_user_allocation_sources = list(
-        UserAllocationSource.objects.filter(
-            user=user
-        ).order_by('allocation_source__name').all()
+    allocation_resources = [
+        get_or_create_allocation_source(api_allocation)
+        for api_allocation in allocation_list
+    ]
+    sync_user_allocation_sources({user: allocation_resources})
+    return allocation_resources
+
+
+def _get_or_create_allocation_source_once(sources, api_allocation):
+    key = (
+        api_allocation.get('project'), api_allocation.get('id'),
+        api_allocation.get('computeAllocated')
     )
+    if key not in sources:
+        sources[key] = get_or_create_allocation_source(api_allocation)
+    return sources[key]
 
-    for api_allocation in allocation_list:
-        allocation_source = get_or_create_allocation_source(api_allocation)
-        allocation_resources.append(allocation_source)
-        user_allocation_source = get_or_create_user_allocation_source(
-            user, allocation_source
-        )
-        user_allocation_sources.append(user_allocation_source)
 
-    canonical_source_names = [source.name for source in allocation_resources]
-    for user_allocation_source in old_user_allocation_sources:
-        if user_allocation_source.allocation_source.name not in canonical_source_names:
-            delete_user_allocation_source(
-                user, user_allocation_source.allocation_source
+def sync_user_allocation_sources(user_sources):
+    """
+    Make the allocation sources of each user of `user_sources`
+    ({AtmosphereUser: [AllocationSource]}) match the given ones, creating
+    the 'user_allocation_source_created' and 'user_allocation_source_deleted'
+    events of all users at once.
+    """
+    current_names = {}
+    for user_id, source_name in UserAllocationSource.objects.filter(
+        user_id__in=[user.id for user in user_sources]
+    ).values_list('user_id', 'allocation_source__name'):
+        current_names.setdefault(user_id, set()).add(source_name)
+    created_events = []
+    deleted_events = []
+    for user, allocation_sources in user_sources.items():
+        canonical_names = set(source.name for source in allocation_sources)
+        old_names = current_names.get(user.id, set())
+        for source_name in sorted(canonical_names - old_names):
+            created_events.append(
+                EventTable(
+                    name='user_allocation_source_created',
+                    entity_id=user.username,
+                    payload={'allocation_source_name': source_name}
+                )
             )
-    return allocation_resources
+        for source_name in sorted(old_names - canonical_names):
+            deleted_events.append(
+                EventTable(
+                    name='user_allocation_source_deleted',
+                    entity_id=user.username,
+                    payload={'allocation_source_name': source_name}
+                )
+            )
+    EventTable.bulk_create_events(created_events + deleted_events)
 
 
 def delete_user_allocation_source(user, allocation_source):
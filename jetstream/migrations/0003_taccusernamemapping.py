@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jetstream', '0002_admin-panel-dynamic-models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TACCUsernameMapping',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID'
+                    )
+                ),
+                (
+                    'xsede_username',
+                    models.CharField(max_length=256, unique=True)
+                ),
+                ('tacc_username', models.CharField(max_length=256)),
+                (
+                    'updated',
+                    models.DateTimeField(default=django.utils.timezone.now)
+                ),
+            ],
+        ),
+    ]
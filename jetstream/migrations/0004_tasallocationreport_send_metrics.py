@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jetstream', '0003_taccusernamemapping'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tasallocationreport',
+            name='last_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='tasallocationreport',
+            name='send_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tasallocationreport',
+            name='send_duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
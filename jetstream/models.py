@@ -1,3 +1,5 @@
+import time
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
@@ -6,6 +8,23 @@ from .allocation import TASAPIDriver
 AUTH_USER_MODEL = getattr(settings, "AUTH_USER_MODEL", 'auth.User')
 
 
+class TACCUsernameMapping(models.Model):
+    """
+    The TACC username of an XSEDE user, as last returned by the TAS API.
+    Mappings are trusted for `settings.TACC_USERNAME_MAPPING_TTL` seconds
+    (see TASAPIDriver.get_tacc_username).
+    """
+    xsede_username = models.CharField(max_length=256, unique=True)
+    tacc_username = models.CharField(max_length=256)
+    updated = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        app_label = 'jetstream'
+
+    def __unicode__(self):
+        return "%s -> %s" % (self.xsede_username, self.tacc_username)
+
+
 class TASAllocationReport(models.Model):
     """
     Keep track of each Allocation Report that is sent to TACC.API
@@ -32,10 +51,21 @@ class TASAllocationReport(models.Model):
     # FIXME:  Save a response confirmation -instead of- success
     report_date = models.DateTimeField(blank=True, null=True)
     success = models.BooleanField(default=False)
+    # Delivery metrics, see `record_submission`
+    send_attempts = models.PositiveIntegerField(default=0)
+    send_duration = models.FloatField(blank=True, null=True)    # seconds
+    last_error = models.TextField(blank=True, default='')
 
     class Meta:
         app_label = 'jetstream'
 
+    @property
+    def idempotency_key(self):
+        """
+        Identifies this report in every attempt to send it.
+        """
+        return "%s-%s" % (self.scheduler_id, self.id)
+
     def send(self, use_beta=False):
         if not self.id:
             raise Exception(
@@ -53,17 +83,46 @@ class TASAllocationReport(models.Model):
                 )
             else:
                 driver = TASAPIDriver()
+        except Exception as exc:
+            self.record_submission(str(exc), 0.0)
+            return
+        self.record_submission(*self.submit(driver))
+
+    def submit(self, driver):
+        """
+        POST the report to TAS with `driver`, without touching the database
+        (so reports can be submitted from worker threads).
+        Returns (error message or None, duration in seconds).
+        """
+        started = time.time()
+        try:
             success = driver.report_project_allocation(
-                self.id, self.username, self.project_name,
-                float(self.compute_used), self.start_date, self.end_date,
-                self.queue_name, self.scheduler_id
+                self.id,
+                self.username,
+                self.project_name,
+                float(self.compute_used),
+                self.start_date,
+                self.end_date,
+                self.queue_name,
+                self.scheduler_id,
+                idempotency_key=self.idempotency_key
             )
-            self.success = True if success else False
-            if self.success:
-                self.report_date = timezone.now()
-            self.save()
-        except:
-            return
+            error = None if success else "Empty response from TAS"
+        except Exception as exc:
+            error = str(exc) or exc.__class__.__name__
+        return error, time.time() - started
+
+    def record_submission(self, error, duration):
+        """
+        Save the outcome of an attempt to send the report.
+        """
+        self.send_attempts += 1
+        self.send_duration = duration
+        self.last_error = error or ''
+        self.success = not error
+        if self.success:
+            self.report_date = timezone.now()
+        self.save()
 
     @property
     def cpu_count(self):
@@ -1,5 +1,16 @@
+"""
+HTTP calls to the TACC Accounting System (TAS) API.
+
+Each thread keeps one `requests.Session`, so calls re-use keep-alive
+connections, and GETs that fail with a connection error or a 5xx response
+are retried with an exponential backoff (see `tas_session`).
+"""
+import threading
+
 import requests
-from requests.exceptions import ReadTimeout
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, ReadTimeout
+from requests.packages.urllib3.util.retry import Retry
 
 from django.conf import settings
 from memoize import memoize
@@ -8,15 +19,41 @@ from .exceptions import TASAPIException
 
 from threepio import logger
 
+_local = threading.local()
+
+
+def tas_session():
+    """
+    Return the TAS API session of the current thread.
+    """
+    session = getattr(_local, 'session', None)
+    if session is None:
+        retries = Retry(
+            total=getattr(settings, 'TACC_API_RETRIES', 3),
+            backoff_factor=getattr(settings, 'TACC_API_BACKOFF', 0.5),
+            status_forcelist=(500, 502, 503, 504),
+            # Reports (POST) are never retried, they are not idempotent
+            method_whitelist=frozenset(['GET']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(max_retries=retries)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _local.session = session
+    return session
+
 
-def tacc_api_post(url, post_data, username=None, password=None):
+def tacc_api_post(url, post_data, username=None, password=None, headers=None):
     if not username:
         username = settings.TACC_API_USER
     if not password:
         password = settings.TACC_API_PASS
     logger.debug('url: %s', url)
     # logger.debug("REQ BODY: %s" % post_data)
-    resp = requests.post(url, post_data, auth=(username, password))
+    resp = tas_session().post(
+        url, post_data, auth=(username, password), headers=headers
+    )
     logger.debug('resp.status_code: %s', resp.status_code)
     # logger.debug('resp.__dict__: %s', resp.__dict__)
     return resp
@@ -30,12 +67,13 @@ def tacc_api_get(url, username=None, password=None):
         password = settings.TACC_API_PASS
     logger.debug('url: %s', url)
     try:
-        resp = requests.get(
+        resp = tas_session().get(
             url,
             auth=(username, password),
             timeout=settings.TACC_READ_API_TIMEOUT
         )
-    except ReadTimeout:
+    except (ReadTimeout, ConnectionError):
+        # Read timeouts that exhausted the retries are ConnectionErrors
         raise TASAPIException(
             "TAS API is taking too long to respond, we're timing out ({})".
             format(url)
@@ -1,3 +1,7 @@
+from collections import OrderedDict
+from itertools import chain
+from multiprocessing.pool import ThreadPool
+
 from celery.decorators import task
 from django.conf import settings
 from django.utils import timezone
@@ -8,11 +12,11 @@ from core.models.allocation_source import (
     UserAllocationSource, AllocationSourceSnapshot, AllocationSource,
     UserAllocationSnapshot
 )
-from core.models.allocation_source import total_usage
+from service.allocation_ledger import advance_usage_ledgers
+from service.allocation_logic import window_usage
 from .allocation import (
     TASAPIDriver, fill_user_allocation_sources, select_valid_allocation
 )
-from .exceptions import TASPluginException
 from .models import TASAllocationReport
 
 from threepio import logger
@@ -33,119 +37,127 @@ def create_reports():
     GO through the list of all users or all providers
     For each username, get an XSede API map to the 'TACC username'
     if 'TACC username' includes a jetstream resource, create a report
+
+    The usage of every report is computed from a single report spanning
+    all of them (see `service.allocation_logic.window_usage`).
     """
     logger.debug('create_reports - START')
-    user_allocation_list = UserAllocationSource.objects.all()
-    all_reports = []
     end_date = timezone.now()
     logger.debug('create_reports - end_date: %s', end_date)
     max_report_end_date = TASAllocationReport.objects.all().aggregate(
         Max('end_date')
-    )
-
-    if not max_report_end_date:
-        last_report_date = end_date
-    else:
-        last_report_date = max_report_end_date['end_date__max']
+    )['end_date__max']
+    last_report_date = max_report_end_date or end_date
     logger.info('create_reports - last_report_date: %s', last_report_date)
 
-    for item in user_allocation_list:
-        allocation_name = item.allocation_source.name
-        logger.debug('create_reports - allocation_name: %s', allocation_name)
-        logger.debug('create_reports - item.user: %s', item.user)
-        project_report = _create_reports_for(
-            item.user, allocation_name, end_date
+    # (user, allocation_name, end_date) of each report to create
+    pending = [
+        (item.user, item.allocation_source.name, end_date)
+        for item in UserAllocationSource.objects.select_related(
+            'user', 'allocation_source'
         )
-        if project_report:
-            all_reports.append(project_report)
+    ]
 
     # Take care of Deleted Users
 
     # filter user_allocation_source_removed events which are created after the last report date
-
-    for event in EventTable.objects.filter(
-        name="user_allocation_source_deleted", timestamp__gte=last_report_date
-    ).order_by('timestamp'):
-
-        user = AtmosphereUser.objects.get(username=event.entity_id)
-        allocation_name = event.payload['allocation_source_name']
-        end_date = event.timestamp
-        project_report = _create_reports_for(user, allocation_name, end_date)
-        if project_report:
-            all_reports.append(project_report)
-    return all_reports
-
-
-def _create_reports_for(user, allocation_name, end_date):
-    logger.debug(
-        '_create_reports_for - user: %s, allocation_name: %s, end_date: %s',
-        user, allocation_name, end_date
+    deleted_events = list(
+        EventTable.objects.filter(
+            name="user_allocation_source_deleted",
+            timestamp__gte=last_report_date
+        ).order_by('timestamp')
     )
-    driver = TASAPIDriver()
-    tacc_username = driver.get_tacc_username(user)
-    if not tacc_username:
-        logger.error(
-            "No TACC username for user: '{}' which came from allocation id: {}".
-            format(user, allocation_name)
-        )
-        return
-    project_name = driver.get_allocation_project_name(allocation_name)
-    try:
-        project_report = _create_tas_report_for(
-            user, tacc_username, project_name, end_date
+    deleted_users = dict(
+        (user.username, user) for user in AtmosphereUser.objects.filter(
+            username__in=set(event.entity_id for event in deleted_events)
         )
-        return project_report
-    except TASPluginException:
-        logger.exception(
-            "Could not create the report because of the error below"
+    )
+    for event in deleted_events:
+        if event.entity_id not in deleted_users:
+            logger.error(
+                "No user %s for event %s" % (event.entity_id, event.uuid)
+            )
+            continue
+        pending.append(
+            (
+                deleted_users[event.entity_id],
+                event.payload['allocation_source_name'], event.timestamp
+            )
         )
-        return
+    return _create_tas_reports(pending)
 
 
-def _create_tas_report_for(user, tacc_username, tacc_project_name, end_date):
+def _create_tas_reports(pending):
     """
-    Create a new report
+    Create the TASAllocationReports of `pending`, a list of
+    (user, allocation_name, end_date) in the order they would be created one
+    at a time: each report starts where the previous report of the same
+    user and project ended.
     """
-    if not end_date:
-        raise TASPluginException("Explicit end date required")
-    if not user:
-        raise TASPluginException("User missing")
-    if not tacc_username:
-        raise TASPluginException("TACC Username missing")
-    if not tacc_project_name:
-        raise TASPluginException("OpenStack/TACC Project missing")
-
-    last_report = TASAllocationReport.objects.filter(
-        project_name=tacc_project_name, user=user
-    ).order_by('end_date').last()
-    if not last_report:
-        start_date = user.date_joined
-    else:
-        start_date = last_report.end_date
-
-    compute_used = total_usage(
-        user.username,
-        start_date,
-        allocation_source_name=tacc_project_name,
-        end_date=end_date
+    driver = TASAPIDriver()
+    driver.load_tacc_usernames(set(user.username for user, _, _ in pending))
+    project_names = {}
+    for allocation in driver.get_all_allocations():
+        project_names.setdefault(str(allocation['project']),
+                                 allocation['project'])
+    last_end_dates = dict(
+        ((row['user_id'], row['project_name']), row['end_date__max'])
+        for row in TASAllocationReport.objects.values('user_id', 'project_name')
+        .annotate(Max('end_date'))
     )
 
-    if compute_used < 0:
-        raise TASPluginException(
-            "Compute usage was not accurately calculated for user:%s" % user
+    windows = []
+    for user, allocation_name, end_date in pending:
+        logger.debug(
+            'create_reports - user: %s, allocation_name: %s, end_date: %s',
+            user, allocation_name, end_date
+        )
+        tacc_username = driver.get_tacc_username(user)
+        if not tacc_username:
+            logger.error(
+                "No TACC username for user: '{}' which came from allocation id: {}".
+                format(user, allocation_name)
+            )
+            continue
+        project_name = project_names.get(str(allocation_name))
+        if not project_name:
+            logger.error(
+                "Could not create the report: OpenStack/TACC Project missing "
+                "for allocation %s" % allocation_name
+            )
+            continue
+        key = (user.id, project_name)
+        start_date = last_end_dates.get(key) or user.date_joined
+        last_end_dates[key] = end_date
+        windows.append(
+            (user, tacc_username, project_name, start_date, end_date)
         )
 
-    new_report = TASAllocationReport.objects.create(
-        user=user,
-        username=tacc_username,
-        project_name=tacc_project_name,
-        compute_used=compute_used,
-        start_date=start_date,
-        end_date=end_date,
-        tacc_api=settings.TACC_API_URL
+    usage = window_usage(
+        [
+            (user.username, project_name, start_date, end_date)
+            for user, _, project_name, start_date, end_date in windows
+        ]
     )
-    logger.info("Created New Report:%s" % new_report)
-    return new_report
+    new_reports = []
+    for user, tacc_username, project_name, start_date, end_date in windows:
+        compute_used = usage[
+            (user.username, project_name, start_date, end_date)
+        ]
+        new_reports.append(
+            TASAllocationReport(
+                user=user,
+                username=tacc_username,
+                project_name=project_name,
+                compute_used=compute_used,
+                start_date=start_date,
+                end_date=end_date,
+                tacc_api=settings.TACC_API_URL
+            )
+        )
+    TASAllocationReport.objects.bulk_create(new_reports)
+    logger.info("Created %s New Reports" % len(new_reports))
+    return new_reports
 
 
 @task(name="report_allocations_to_tas")
@@ -158,24 +170,54 @@ def report_allocations_to_tas():
 
 
 def send_reports():
-    failed_reports = 0
-    reports_to_send = TASAllocationReport.objects.filter(
-        Q(compute_used__gt=0, success=False)
-    ).order_by('user__username', 'start_date')
-    count = reports_to_send.count()
+    """
+    Send every unsent report to TAS, on a pool of at most
+    settings.TACC_API_THREADS threads. The reports of one user are sent in
+    order, by one thread.
+
+    The outcome, duration and error of each attempt are saved on its report,
+    so only the reports that failed are sent again by the next run.
+    """
+    reports_to_send = list(
+        TASAllocationReport.objects.filter(
+            Q(compute_used__gt=0, success=False)
+        ).order_by('user__username', 'start_date')
+    )
+    count = len(reports_to_send)
     logger.info('send_reports - count: %d', count)
-    for current_report_index, tas_report in enumerate(reports_to_send):
+    if not count:
+        return
+    reports_by_user = OrderedDict()
+    for tas_report in reports_to_send:
+        reports_by_user.setdefault(tas_report.user_id, []).append(tas_report)
+    driver = TASAPIDriver()
+
+    def _submit_reports(user_reports):
+        return [
+            (tas_report, ) + tas_report.submit(driver)
+            for tas_report in user_reports
+        ]
+
+    threads = getattr(settings, 'TACC_API_THREADS', 8)
+    pool = ThreadPool(min(len(reports_by_user), threads))
+    try:
+        results = pool.map(_submit_reports, reports_by_user.values())
+    finally:
+        pool.close()
+        pool.join()
+
+    failed_reports = 0
+    for tas_report, error, duration in chain.from_iterable(results):
+        tas_report.record_submission(error, duration)
         logger.debug(
-            'send_reports - current_report_index: %d', current_report_index
+            'send_reports - report %s sent in %.2fs', tas_report.id, duration
         )
-        try:
-            tas_report.send()
-        except TASPluginException:
-            logger.exception(
-                "Could not send the report because of the error below"
+        if error:
+            logger.error(
+                "Could not send report %s (attempt %s): %s" %
+                (tas_report.id, tas_report.send_attempts, error)
             )
             failed_reports += 1
-            continue
     if failed_reports != 0:
         raise Exception(
             "%s/%s reports failed to send to TAS" % (failed_reports, count)
@@ -191,10 +233,11 @@ def update_snapshot(start_date=None, end_date=None):
     tas_api_obj = TASAPIDriver()
     allocation_source_usage_from_tas = tas_api_obj.get_all_projects()
 
+    window_starts = {}
+    tas_projects = []
     for project in allocation_source_usage_from_tas:
-        total_burn_rate = 0
-        allocation_source_name = project['chargeCode']
         try:
+            allocation_source_name = project['chargeCode']
             allocation_source = AllocationSource.objects.filter(
                 name=allocation_source_name
             ).order_by('id').last()
@@ -203,35 +246,39 @@ def update_snapshot(start_date=None, end_date=None):
                 continue
 
             created_or_updated_event = EventTable.objects.filter(
-                name='allocation_source_created_or_renewed',
-                payload__allocation_source_name=allocation_source.name
-            ).order_by('timestamp').last()
+                name='allocation_source_created_or_renewed'
+            ).for_allocation_source(allocation_source.name
+                                   ).order_by('timestamp').last()
 
             if created_or_updated_event:
                 # if renewed, change ignore old allocation usage
-                start_date = created_or_updated_event.payload['start_date']
-
-            for user in allocation_source.all_users:
-                compute_used, burn_rate = total_usage(
-                    user.username,
-                    start_date,
-                    allocation_source_name=allocation_source.name,
-                    end_date=end_date,
-                    burn_rate=True
-                )
-                total_burn_rate += burn_rate
-                UserAllocationSnapshot.objects.update_or_create(
-                    allocation_source_id=allocation_source.id,
-                    user_id=user.id,
-                    defaults={
-                        'compute_used': compute_used,
-                        'burn_rate': burn_rate
-                    }
-                )
-
+                window_start = created_or_updated_event.payload['start_date']
+            else:
+                window_start = start_date
         except KeyError:
             # This allocation source does not exist in our database yet. Create it? Skip for now.
             continue
+        window_starts[allocation_source] = window_start
+        tas_projects.append((allocation_source, project))
+
+    # Only the usage since the last snapshot is computed here, see
+    # service.allocation_ledger
+    usage_by_source = advance_usage_ledgers(window_starts, end_date)
+
+    for allocation_source, project in tas_projects:
+        total_burn_rate = 0
+        user_usage = usage_by_source.get(allocation_source.name, {})
+        for user in allocation_source.all_users:
+            compute_used, burn_rate = user_usage.get(user.username, (0.0, 0))
+            total_burn_rate += burn_rate
+            UserAllocationSnapshot.objects.update_or_create(
+                allocation_source_id=allocation_source.id,
+                user_id=user.id,
+                defaults={
+                    'compute_used': compute_used,
+                    'burn_rate': burn_rate
+                }
+            )
         valid_allocation = select_valid_allocation(project['allocations'])
         compute_used = valid_allocation['computeUsed'] if valid_allocation else 0
         AllocationSourceSnapshot.objects.update_or_create(
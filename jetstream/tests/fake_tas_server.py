@@ -0,0 +1,202 @@
+"""
+A local, in-memory stand-in for the TAS API, served over HTTP so tests
+exercise the real client (sessions, retries, worker pools).
+
+    with FakeTASServer(latency=0.1) as tas:
+        tas.add_user('xsede_user', 'tacc_user', ['TG-ABC123'])
+        with override_settings(TACC_API_URL=tas.url):
+            ...
+"""
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+import json
+import re
+import threading
+import time
+import urlparse
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeTASServer(object):
+    def __init__(self, latency=0, resource_name='Jetstream'):
+        """
+        latency - Seconds each response is delayed by
+        """
+        self.latency = latency
+        self.resource_name = resource_name
+        self.xsede_to_tacc_username = {}
+        self.tacc_username_to_projects = {}
+        self.projects = []
+        self.jobs = []
+        self.requests = []
+        # Number of next GET requests answered with a 503
+        self.failures = 0
+        # TACC usernames whose reports (POST /v1/jobs) are rejected
+        self.rejected_report_usernames = set()
+        self._lock = threading.Lock()
+        self._server = None
+        self.url = None
+
+    def add_project(self, charge_code, compute_allocated=1000, status='Active'):
+        project_id = len(self.projects) + 1
+        project = {
+            'id': project_id,
+            'chargeCode': charge_code,
+            'allocations': [
+                {
+                    'id': project_id,
+                    'project': charge_code,
+                    'projectId': project_id,
+                    'resource': self.resource_name,
+                    'computeAllocated': compute_allocated,
+                    'status': status,
+                    'start': '2017-01-01T00:00:00Z',
+                    'end': '2099-01-01T00:00:00Z',
+                }
+            ],
+        }
+        self.projects.append(project)
+        return project
+
+    def add_user(self, xsede_username, tacc_username, charge_codes=()):
+        self.xsede_to_tacc_username[xsede_username] = tacc_username
+        self.tacc_username_to_projects[tacc_username] = list(charge_codes)
+        known_codes = set(project['chargeCode'] for project in self.projects)
+        for charge_code in charge_codes:
+            if charge_code not in known_codes:
+                self.add_project(charge_code)
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake._handle(self, 'GET')
+
+            def do_POST(self):
+                fake._handle(self, 'POST')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%s' % self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count_requests(self, path_prefix):
+        with self._lock:
+            return len(
+                [
+                    path for method, path in self.requests
+                    if path.startswith(path_prefix)
+                ]
+            )
+
+    def _handle(self, request, method):
+        path = urlparse.urlparse(request.path).path
+        with self._lock:
+            self.requests.append((method, path))
+            failing = method == 'GET' and self.failures > 0
+            if failing:
+                self.failures -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failing:
+            return self._respond(request, 503, {'status': 'error'})
+        if method == 'POST':
+            length = int(request.headers.getheader('content-length', 0))
+            job = dict(urlparse.parse_qsl(request.rfile.read(length)))
+            if job.get('username') in self.rejected_report_usernames:
+                return self._respond(request, 500, {'status': 'error'})
+            job['idempotency_key'] = request.headers.getheader(
+                'idempotency-key'
+            )
+            with self._lock:
+                self.jobs.append(job)
+            return self._respond(request, 200, _success(True))
+        for pattern, view in [
+            (r'^/v1/users/xsede/(?P<username>[^/]+)$', self._xsede_user),
+            (r'^/v1/projects/username/(?P<username>[^/]+)$',
+             self._user_projects),
+            (r'^/v1/projects/resource/[^/]+$', self._all_projects),
+            (r'^/v1/allocations/resource/[^/]+$', self._all_allocations),
+            (r'^/v1/projects/(?P<project_id>\d+)/users$',
+             self._project_users),
+        ]:
+            match = re.match(pattern, path)
+            if match:
+                return self._respond(request, 200, view(**match.groupdict()))
+        self._respond(request, 404, {'status': 'error', 'message': path})
+
+    def _respond(self, request, status, data):
+        body = json.dumps(data)
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def _xsede_user(self, username):
+        if username not in self.xsede_to_tacc_username:
+            return {
+                'status': 'error',
+                'message': 'No user found for XSEDE username %s' % username,
+                'result': None
+            }
+        return _success(self.xsede_to_tacc_username[username])
+
+    def _user_projects(self, username):
+        charge_codes = self.tacc_username_to_projects.get(username, [])
+        return _success(
+            [
+                project for project in self.projects
+                if project['chargeCode'] in charge_codes
+            ]
+        )
+
+    def _all_projects(self):
+        return _success(self.projects)
+
+    def _all_allocations(self):
+        return _success(
+            [
+                allocation
+                for project in self.projects
+                for allocation in project['allocations']
+            ]
+        )
+
+    def _project_users(self, project_id):
+        charge_code = [
+            project['chargeCode']
+            for project in self.projects if project['id'] == int(project_id)
+        ]
+        return _success(
+            [
+                {
+                    'username': username
+                } for username, charge_codes in
+                self.tacc_username_to_projects.items()
+                if set(charge_code) & set(charge_codes)
+            ]
+        )
+
+
+def _success(result):
+    return {'status': 'success', 'message': None, 'result': result}
@@ -0,0 +1,150 @@
+import datetime
+import time
+from unittest import skipUnless
+
+import memoize
+import mock
+from django.apps import apps
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.tests.factories import UserFactory
+from core.models import UserAllocationSource
+from jetstream import allocation
+from jetstream.allocation import (
+    TASAPIDriver, fill_user_allocation_sources, request_all_user_allocations
+)
+from jetstream.exceptions import NoTaccUserForXsedeException
+from jetstream.tas_api import tacc_api_get
+from jetstream.tests.fake_tas_server import FakeTASServer
+
+
+class FakeTASTestCase(TestCase):
+    latency = 0
+
+    def setUp(self):
+        memoize.delete_memoized(tacc_api_get)
+        TASAPIDriver.username_map = {}
+        self.tas = FakeTASServer(latency=self.latency).start()
+        self.addCleanup(self.tas.stop)
+        settings_override = override_settings(
+            TACC_API_URL=self.tas.url,
+            TACC_API_USER='atmosphere',
+            TACC_API_PASS='secret',
+            TACC_READ_API_TIMEOUT=5
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class TestConcurrentTASClient(FakeTASTestCase):
+    latency = 0.2
+
+    def test_user_allocations_are_requested_concurrently(self):
+        for index in range(8):
+            self.tas.add_user(
+                'xsede%s' % index, 'tacc%s' % index, ['TG-TRA%s' % index]
+            )
+        started = time.time()
+        user_allocations = request_all_user_allocations(
+            TASAPIDriver(), ['xsede%s' % index for index in range(8)] +
+            ['unknown'],
+            threads=9
+        )
+        # Two requests per user, 9 users, on 9 threads
+        self.assertLess(time.time() - started, 9 * 2 * self.latency)
+        tacc_user, allocations = user_allocations['xsede3']
+        self.assertEqual(tacc_user, 'tacc3')
+        self.assertEqual(
+            [allocation['project'] for allocation in allocations], ['TG-TRA3']
+        )
+        self.assertIsInstance(
+            user_allocations['unknown'], NoTaccUserForXsedeException
+        )
+
+
+class TestTASClient(FakeTASTestCase):
+    def test_get_retries_server_errors(self):
+        self.tas.failures = 1
+        _, data = tacc_api_get(self.tas.url + '/v1/projects/resource/Jetstream')
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(self.tas.count_requests('/v1/projects/resource/'), 2)
+
+    @skipUnless(
+        apps.is_installed('jetstream'), 'Needs the jetstream app installed'
+    )
+    def test_tacc_usernames_are_stored(self):
+        from jetstream.models import TACCUsernameMapping
+        user = UserFactory.create(username='sgregory')
+        self.tas.add_user('sgregory', 'tacc_sgregory')
+        self.assertEqual(
+            TASAPIDriver().get_tacc_username(user), 'tacc_sgregory'
+        )
+        TASAPIDriver.username_map = {}
+        memoize.delete_memoized(tacc_api_get)
+        self.assertEqual(
+            TASAPIDriver().get_tacc_username(user), 'tacc_sgregory'
+        )
+        self.assertEqual(self.tas.count_requests('/v1/users/xsede/'), 1)
+
+        # Expired mappings are requested again
+        TACCUsernameMapping.objects.update(
+            updated=timezone.now() - datetime.timedelta(days=2)
+        )
+        TASAPIDriver.username_map = {}
+        TASAPIDriver().get_tacc_username(user)
+        self.assertEqual(self.tas.count_requests('/v1/users/xsede/'), 2)
+
+    def test_fill_user_allocation_sources(self):
+        users = [UserFactory.create() for _ in range(3)]
+        self.tas.add_user(users[0].username, 'tacc0', ['TG-ABC100'])
+        self.tas.add_user(
+            users[1].username, 'tacc1', ['TG-ABC100', 'TG-ABC200']
+        )
+        resources = fill_user_allocation_sources()
+        self.assertEqual(
+            set(
+                UserAllocationSource.objects.values_list(
+                    'user__username', 'allocation_source__name'
+                )
+            ),
+            set(
+                [
+                    (users[0].username, 'TG-ABC100'),
+                    (users[1].username, 'TG-ABC100'),
+                    (users[1].username, 'TG-ABC200'),
+                ]
+            )
+        )
+        # No TACC user: the lookup failed, memberships are left alone
+        self.assertEqual(resources[users[2].username], [])
+
+    def test_fill_user_allocation_sources_isolates_failures(self):
+        users = [UserFactory.create() for _ in range(2)]
+        for index, user in enumerate(users):
+            self.tas.add_user(user.username, 'tacc%s' % index, ['TG-ABC100'])
+        sync_user_allocation_sources = allocation.sync_user_allocation_sources
+
+        def sync_failing_for_second_user(user_sources):
+            if users[1] in user_sources:
+                raise IntegrityError("Cannot add allocation source")
+            return sync_user_allocation_sources(user_sources)
+
+        with mock.patch(
+            'jetstream.allocation.sync_user_allocation_sources',
+            side_effect=sync_failing_for_second_user
+        ):
+            resources = fill_user_allocation_sources()
+        self.assertEqual(
+            list(
+                UserAllocationSource.objects.values_list(
+                    'user__username', 'allocation_source__name'
+                )
+            ), [(users[0].username, 'TG-ABC100')]
+        )
+        self.assertEqual(resources[users[1].username], [])
+        self.assertEqual(
+            [source.name for source in resources[users[0].username]],
+            ['TG-ABC100']
+        )
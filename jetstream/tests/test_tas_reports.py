@@ -0,0 +1,92 @@
+import datetime
+from unittest import skipUnless
+
+from django.apps import apps
+from django.utils import timezone
+
+from api.tests.factories import UserFactory
+from core.models import AllocationSource, UserAllocationSource
+from jetstream.tests.test_tas_client import FakeTASTestCase
+
+
+@skipUnless(apps.is_installed('jetstream'), 'Needs the jetstream app installed')
+class TestTASReports(FakeTASTestCase):
+    def setUp(self):
+        super(TestTASReports, self).setUp()
+        self.users = [UserFactory.create() for _ in range(2)]
+        for index, user in enumerate(self.users):
+            self.tas.add_user(user.username, 'tacc%s' % index, ['TG-REP100'])
+
+    def _create_report(self, user, tacc_username, hours_ago):
+        from jetstream.models import TASAllocationReport
+        end_date = timezone.now() - datetime.timedelta(hours=hours_ago)
+        return TASAllocationReport.objects.create(
+            user=user,
+            username=tacc_username,
+            project_name='TG-REP100',
+            compute_used=1.5,
+            start_date=end_date - datetime.timedelta(hours=1),
+            end_date=end_date,
+            tacc_api=self.tas.url
+        )
+
+    def test_create_reports(self):
+        from jetstream.tasks import create_reports
+        source = AllocationSource.objects.create(
+            name='TG-REP100', compute_allowed=1000
+        )
+        for user in self.users:
+            UserAllocationSource.objects.create(
+                user=user, allocation_source=source
+            )
+        first_reports = create_reports()
+        self.assertEqual(
+            sorted(report.username for report in first_reports),
+            ['tacc0', 'tacc1']
+        )
+        self.assertEqual(
+            first_reports[0].start_date, first_reports[0].user.date_joined
+        )
+        # The next reports start where the previous ones ended
+        next_reports = create_reports()
+        self.assertEqual(
+            next_reports[0].start_date,
+            [
+                report.end_date for report in first_reports
+                if report.user == next_reports[0].user
+            ][0]
+        )
+
+    def test_send_reports_retries_only_failed_reports(self):
+        from jetstream.tasks import send_reports
+        reports = [
+            self._create_report(self.users[0], 'tacc0', hours_ago=2),
+            self._create_report(self.users[0], 'tacc0', hours_ago=1),
+            self._create_report(self.users[1], 'tacc1', hours_ago=1),
+        ]
+        self.tas.rejected_report_usernames.add('tacc1')
+        with self.assertRaises(Exception):
+            send_reports()
+        for report in reports:
+            report.refresh_from_db()
+            self.assertEqual(report.send_attempts, 1)
+            self.assertIsNotNone(report.send_duration)
+        self.assertTrue(reports[0].success)
+        self.assertFalse(reports[2].success)
+        self.assertNotEqual(reports[2].last_error, '')
+        # The reports of one user are sent in order
+        self.assertEqual(
+            [job['idempotency_key'] for job in self.tas.jobs],
+            [reports[0].idempotency_key, reports[1].idempotency_key]
+        )
+
+        self.tas.rejected_report_usernames.clear()
+        send_reports()
+        for report in reports:
+            report.refresh_from_db()
+        self.assertEqual(
+            [report.send_attempts for report in reports], [1, 1, 2]
+        )
+        self.assertTrue(reports[2].success)
+        self.assertEqual(reports[2].last_error, '')
+        self.assertEqual(len(self.tas.jobs), 3)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of tenant lookups during instance monitoring: the
+nested list scans that were used before, against the project index
+(`iter_project_instances`) and tenant name map
+(`_convert_tenant_id_to_names`).
+
+No cloud is contacted: projects and instances are generated in memory.
+"""
+import argparse
+import sys
+import time
+import uuid
+
+
+class FakeProject(object):
+    def __init__(self, project_id, name):
+        self.id = project_id
+        self.name = name
+
+
+class FakeNode(object):
+    def __init__(self):
+        self.extra = {'metadata': {}}
+
+
+class FakeInstance(object):
+    def __init__(self, tenant_id):
+        self.id = str(uuid.uuid4())
+        self.owner = tenant_id
+        self.extra = {'tenantId': tenant_id, 'status': 'active'}
+        self._node = FakeNode()
+
+
+def nested_tenant_map(all_instances, all_projects):
+    project_map = {}
+    for instance in all_instances:
+        tenant_id = instance.extra['tenantId']
+        project = [p for p in all_projects if p.id == tenant_id][0]
+        project_map.setdefault(project, []).append(instance)
+    return project_map
+
+
+def nested_convert_names(instances, tenants):
+    for i in instances:
+        for tenant in tenants:
+            if tenant.id == i.owner:
+                i.owner = tenant.name
+    return instances
+
+
+def timed(label, method, *args):
+    start = time.time()
+    method(*args)
+    duration = time.time() - start
+    print "%-32s %8.3fs" % (label, duration)
+    return duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--projects", type=int, default=8000)
+    parser.add_argument("--instances", type=int, default=20000)
+    parser.add_argument(
+        "--skip-nested",
+        action="store_true",
+        help="Only time the indexed lookups (nested scans are slow)"
+    )
+    args = parser.parse_args()
+
+    try:
+        import django
+        django.setup()
+        from service.accounts.openstack_manager import iter_project_instances
+        from service.monitoring import (
+            _convert_tenant_id_to_names, _tenant_id_name_map
+        )
+    except:
+        print "\n".join(
+            [
+                "ERROR! This script requires a proper environment! Try:", "",
+                "   export PYTHONPATH=\"/opt/dev/atmosphere:$PYTHONPATH\"",
+                "   export DJANGO_SETTINGS_MODULE='atmosphere.settings'",
+                "   . /opt/env/atmo/bin/activate"
+            ]
+        )
+        sys.exit(1)
+
+    projects = [
+        FakeProject(uuid.uuid4().hex, "project-%s" % index)
+        for index in range(args.projects)
+    ]
+    instances = [
+        FakeInstance(projects[index % args.projects].id)
+        for index in range(args.instances)
+    ]
+    print "%s instances across %s projects" % (args.instances, args.projects)
+
+    if not args.skip_nested:
+        timed("tenant map (nested)", nested_tenant_map, instances, projects)
+    timed(
+        "tenant map (index)", lambda: dict(
+            iter_project_instances(
+                instances, dict((p.id, p) for p in projects)
+            )
+        )
+    )
+
+    if not args.skip_nested:
+        for instance in instances:
+            instance.owner = instance.extra['tenantId']
+        timed("owner names (nested)", nested_convert_names, instances, projects)
+    for instance in instances:
+        instance.owner = instance.extra['tenantId']
+    timed(
+        "owner names (map)", _convert_tenant_id_to_names, instances, projects
+    )
+    tenant_names = _tenant_id_name_map(projects)
+    for instance in instances:
+        instance.owner = instance.extra['tenantId']
+    timed(
+        "owner names (shared map)", _convert_tenant_id_to_names, instances,
+        projects, tenant_names
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -72,6 +72,133 @@ def timeout_after(seconds):
     return real_timeout
 
 
+def iter_project_instances(
+    all_instances, project_index, status_list=[], match_all=False
+):
+    """
+    Group `all_instances` by their tenant and yield (project, instances)
+    for each tenant in turn, looking tenants up in `project_index`
+    ({project_id: project}).
+
+    If `status_list` is provided, only include an instance if its
+    status/task/tmp_status matches a value in the list (or all of them,
+    with `match_all`).
+    """
+    tenant_instances = {}
+    for instance in all_instances:
+        try:
+            # NOTE: will someday be 'projectId'
+            tenant_id = instance.extra['tenantId']
+        except (ValueError, KeyError):
+            raise Exception(
+                "The implementaion for recovering a tenant id has changed. Update the code base above this line!"
+            )
+        tenant_instances.setdefault(tenant_id, []).append(instance)
+
+    for tenant_id, instances in tenant_instances.iteritems():
+        project = project_index.get(tenant_id)
+        if not project:
+            logger.warn(
+                "Skipping %s instance(s) of unknown tenant %s" %
+                (len(instances), tenant_id)
+            )
+            continue
+        if status_list:
+            instances = [
+                instance for instance in instances if _instance_has_status(
+                    instance, project, status_list, match_all
+                )
+            ]
+            if not instances:
+                continue
+        yield project, instances
+
+
+def _instance_has_status(instance, project, status_list, match_all):
+    metadata = instance._node.extra.get('metadata', {})
+    instance_status = instance.extra.get('status')
+    task = instance.extra.get('task')
+    tmp_status = metadata.get('tmp_status', '')
+    if match_all:
+        truth = all(
+            True if (
+                status_name and status_name in
+                [instance_status, task, tmp_status]
+            ) else False for status_name in status_list
+        )
+    else:
+        truth = any(
+            True if (
+                status_name and status_name in
+                [instance_status, task, tmp_status]
+            ) else False for status_name in status_list
+        )
+    if not truth:
+        logger.info(
+            "Found an instance:%s for tenant:%s but skipped because %s could be found in the list: (%s - %s - %s)"
+            % (
+                instance.id, project.name, "none of the status_names"
+                if not match_all else "not all of the status names",
+                instance_status, task, tmp_status
+            )
+        )
+    return truth
+
+
+class ProjectDirectory(object):
+    """
+    Keystone projects of one provider, listed once and indexed by id and
+    by name, to be shared by every lookup made during a monitoring cycle.
+
+    Lookups that miss the index fall back to Keystone (and remember the
+    answer, found or not). `stats()` reports hits and misses.
+    `get(project_id)` makes the directory usable wherever a
+    {project_id: project} map is expected.
+    """
+
+    def __init__(self, account_driver, projects=None):
+        self.account_driver = account_driver
+        if projects is None:
+            projects = account_driver.list_projects()
+        self.by_id = dict((project.id, project) for project in projects)
+        self.by_name = dict((project.name, project) for project in projects)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, project_id, default=None):
+        project = self.get_by_id(project_id)
+        return project if project else default
+
+    def get_by_id(self, project_id):
+        if not project_id:
+            return None
+        if project_id in self.by_id:
+            self.hits += 1
+            return self.by_id[project_id]
+        self.misses += 1
+        project = self.account_driver.get_project_by_id(project_id)
+        self.by_id[project_id] = project
+        return project
+
+    def get_by_name(self, project_name):
+        if not project_name:
+            return None
+        if project_name in self.by_name:
+            self.hits += 1
+            return self.by_name[project_name]
+        self.misses += 1
+        project = self.account_driver.get_project(project_name)
+        self.by_name[project_name] = project
+        return project
+
+    def stats(self):
+        return {
+            'projects': len([p for p in self.by_id.values() if p]),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+
 class AccountDriver(BaseAccountDriver):
     user_manager = None
     image_manager = None
@@ -596,20 +723,42 @@ class AccountDriver(BaseAccountDriver):
             )
         return keypair
 
-    def get_image_members(self, image_id, status="approved"):
-        all_projects = {p.id: p for p in self.list_projects()}
-        shared_with = self.image_manager.glance.image_members.list(image_id)
+    def get_image_members(
+        self, image_id, status="approved", project_directory=None
+    ):
+        """
+        project_directory - a ProjectDirectory (or {project_id: project})
+        to resolve members with, instead of indexing the project list
+        """
+        if project_directory is not None:
+            all_projects = project_directory
+        else:
+            all_projects = {p.id: p for p in self.list_projects()}
         projects = []
+        for project_id, member_status in self.get_image_member_statuses(
+            image_id
+        ).items():
+            # Only add if status matches or ignored
+            if status and status != member_status:
+                continue
+            project = all_projects.get(project_id)
+            if not project:
+                continue
+            projects.append(project)
+        return projects
+
+    def get_image_member_statuses(self, image_id):
+        """
+        Return {project_id: member status} for the members of `image_id`.
+        Makes no Keystone or database calls, so it is safe to call from
+        worker threads.
+        """
+        members = {}
         try:
-            for member in shared_with:
-                # Only add if status matches or ignored
-                if status and status != member.status:
-                    continue
-                project_id = member.get('member_id')
-                project = all_projects.get(project_id)
-                if not project:
-                    continue
-                projects.append(project)
+            for member in self.image_manager.glance.image_members.list(
+                image_id
+            ):
+                members[member.get('member_id')] = member.status
         except glanceclient.exc.HTTPNotFound as exc:
             # If image is not found, no projects should be added
             pass
@@ -618,7 +767,7 @@ class AccountDriver(BaseAccountDriver):
             if 'Only shared images have members' not in exc.details\
                     and 'Public images do not have members' not in exc.details:
                 raise
-        return projects
+        return members
 
     @timeout_after(10)
     def share_image_with_identity(self, glance_image, identity):
@@ -921,7 +1070,11 @@ class AccountDriver(BaseAccountDriver):
         return self.image_manager.list_images(*args, **kwargs)
 
     def tenant_instances_map(
-        self, status_list=[], match_all=False, include_empty=False
+        self,
+        status_list=[],
+        match_all=False,
+        include_empty=False,
+        project_index=None
     ):
         """
         Maps 'Tenant' objects to all the 'owned instances' as listed by the admin driver
@@ -929,58 +1082,49 @@ class AccountDriver(BaseAccountDriver):
         * status_list (list) - If provided, only include instance if it's status/tmp_status matches a value in the list.
         * match_all (bool) - If True, instances must match ALL words in the list.
         * include_empty (bool) - If True, include ALL tenants in the map.
+        * project_index (dict) - {project_id: project}, to share one index
+          across a monitoring cycle. Default: `get_project_index()`
         """
-        all_projects = self.list_projects()
-        all_instances = self.list_all_instances()
+        if project_index is None:
+            project_index = self.get_project_index()
         if include_empty:
-            project_map = {proj: [] for proj in all_projects}
+            project_map = {proj: [] for proj in project_index.values()}
         else:
             project_map = {}
-        for instance in all_instances:
-            try:
-                # NOTE: will someday be 'projectId'
-                tenant_id = instance.extra['tenantId']
+        project_map.update(
+            self.iter_tenant_instances(
+                status_list=status_list,
+                match_all=match_all,
+                project_index=project_index
+            )
+        )
+        return project_map
 
-                project = [p for p in all_projects if p.id == tenant_id][0]
-            except (ValueError, KeyError):
-                raise Exception(
-                    "The implementaion for recovering a tenant id has changed. Update the code base above this line!"
-                )
+    def iter_tenant_instances(
+        self, status_list=[], match_all=False, project_index=None
+    ):
+        """
+        Generator form of `tenant_instances_map`: yields
+        (project, instances) one tenant at a time. Tenants without a
+        matching instance are not yielded.
+        """
+        if project_index is None:
+            project_index = self.get_project_index()
+        return iter_project_instances(
+            self.list_all_instances(), project_index, status_list, match_all
+        )
 
-            metadata = instance._node.extra.get('metadata', {})
-            instance_status = instance.extra.get('status')
-            task = instance.extra.get('task')
-            tmp_status = metadata.get('tmp_status', '')
-            if status_list:
-                if match_all:
-                    truth = all(
-                        True if (
-                            status_name and status_name in
-                            [instance_status, task, tmp_status]
-                        ) else False for status_name in status_list
-                    )
-                else:
-                    truth = any(
-                        True if (
-                            status_name and status_name in
-                            [instance_status, task, tmp_status]
-                        ) else False for status_name in status_list
-                    )
-                if not truth:
-                    logger.info(
-                        "Found an instance:%s for tenant:%s but skipped because %s could be found in the list: (%s - %s - %s)"
-                        % (
-                            instance.id, project.name,
-                            "none of the status_names"
-                            if not match_all else "not all of the status names",
-                            instance_status, task, tmp_status
-                        )
-                    )
-                    continue
-            instance_list = project_map.get(project, [])
-            instance_list.append(instance)
-            project_map[project] = instance_list
-        return project_map
+    def get_project_index(self, force=False, **kwargs):
+        """
+        Return {project_id: project} for every project, built once from the
+        (cached) project list.
+        """
+        if force or getattr(self, 'project_index', None) is None:
+            self.project_index = dict(
+                (project.id, project)
+                for project in self.list_projects(force=force, **kwargs)
+            )
+        return self.project_index
 
     def list_all_instances(self, **kwargs):
         return self.admin_driver.list_all_instances(**kwargs)
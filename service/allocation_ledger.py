@@ -0,0 +1,199 @@
+"""
+Incremental, event-sourced allocation usage.
+
+Rather than re-creating every report row from the start of an allocation
+window on every snapshot, each AllocationSource keeps a ledger with a
+persisted high-water mark. Advancing the ledger only reports on the
+histories and events between the mark and the new end date, then folds
+the result into per (user, allocation source, instance) accumulators.
+
+Reports are additive across adjacent windows (`calculate_allocation` clips
+every row to the report window), so the accumulated usage matches a full
+`create_report` over the whole window.
+"""
+import datetime
+import decimal
+
+from dateutil.parser import parse
+from django.db import transaction
+from threepio import logger
+
+from core.models import AtmosphereUser
+from core.models.allocation_source import (
+    AllocationSourceUsageLedger, InstanceAllocationUsage
+)
+from service.allocation_logic import generate_data, summarize_usage
+
+
+def advance_usage_ledgers(window_starts, end_date, rebuild=False):
+    """
+    Advance the usage ledger of each allocation source up to `end_date`.
+
+    window_starts - {AllocationSource: start of the allocation window}
+    rebuild - Discard the accumulated usage and start over from the window.
+
+    A ledger is rebuilt automatically when its window moved (the source was
+    renewed). A ledger whose high-water mark is already past `end_date`,
+    because an overlapping run got there first, is left as is unless
+    `rebuild` is set. Ledgers that share a high-water mark are advanced with
+    a single report.
+
+    The ledgers are locked (SELECT ... FOR UPDATE) from reading their marks
+    until the new usage is saved, so overlapping runs advance them one after
+    the other and never charge the same window twice.
+
+    Returns {allocation_source_name: {username: (compute_used, burn_rate)}}
+    where compute_used is in hours.
+    """
+    end_date = _parse_date(end_date)
+    ledgers_by_mark = {}
+    ledgers = []
+    with transaction.atomic():
+        # Lock in a fixed order, so overlapping runs cannot deadlock
+        for allocation_source, window_start in sorted(
+            window_starts.items(), key=lambda item: item[0].id
+        ):
+            ledger = _get_ledger(
+                allocation_source, _parse_date(window_start), end_date,
+                rebuild
+            )
+            ledgers.append(ledger)
+            if ledger.high_water_mark < end_date:
+                ledgers_by_mark.setdefault(ledger.high_water_mark,
+                                           []).append(ledger)
+
+        for high_water_mark, pending_ledgers in ledgers_by_mark.items():
+            logger.info(
+                "Advancing %s usage ledger(s) from %s to %s" %
+                (len(pending_ledgers), high_water_mark, end_date)
+            )
+            rows = generate_data(high_water_mark, end_date)
+            _apply_rows(pending_ledgers, rows, end_date)
+
+        return dict(
+            (ledger.allocation_source.name, get_ledger_usage(ledger))
+            for ledger in ledgers
+        )
+
+
+def get_ledger_usage(ledger):
+    """
+    Return {username: (compute_used, burn_rate)} for the ledger, with
+    compute_used in hours.
+    """
+    totals = {}
+    for username, compute_used, is_running in ledger.instance_usage.values_list(
+        'user__username', 'compute_used', 'is_running'
+    ):
+        seconds, burn_rate = totals.get(username, (0.0, 0))
+        totals[username] = (
+            seconds + float(compute_used), burn_rate + int(is_running)
+        )
+    return dict(
+        (username, (round(seconds / 3600.0, 2), burn_rate))
+        for username, (seconds, burn_rate) in totals.items()
+    )
+
+
+def _parse_date(date):
+    if isinstance(date, datetime.datetime):
+        return date
+    return parse(date)
+
+
+def _get_ledger(allocation_source, window_start, end_date, rebuild=False):
+    """
+    Return the ledger of `allocation_source`, locked for the rest of the
+    transaction.
+    """
+    AllocationSourceUsageLedger.objects.get_or_create(
+        allocation_source=allocation_source,
+        defaults={
+            'window_start': window_start,
+            'high_water_mark': window_start
+        }
+    )
+    # Read the mark under the lock: an overlapping run may have moved it
+    ledger = AllocationSourceUsageLedger.objects.select_for_update().get(
+        allocation_source=allocation_source
+    )
+    if ledger.window_start == window_start and not rebuild:
+        if ledger.high_water_mark > end_date:
+            logger.info(
+                "Usage ledger %s is already past %s, keeping it" %
+                (ledger, end_date)
+            )
+        return ledger
+    logger.info(
+        "Rebuilding usage ledger %s from window start %s" %
+        (ledger, window_start)
+    )
+    ledger.instance_usage.all().delete()
+    ledger.window_start = window_start
+    ledger.high_water_mark = window_start
+    ledger.save()
+    return ledger
+
+
+def _apply_rows(ledgers, rows, end_date):
+    """
+    Fold report rows for the window (high-water mark, end_date] into the
+    accumulators of each ledger, then move the ledgers' marks to end_date.
+    """
+    ledger_map = dict(
+        (ledger.allocation_source.name, ledger) for ledger in ledgers
+    )
+    deltas = dict((source_name, {}) for source_name in ledger_map)
+    for (username, source_name, instance_id), usage in summarize_usage(
+        rows, end_date
+    ).items():
+        if source_name in deltas:
+            deltas[source_name][(username, instance_id)] = usage
+
+    user_ids = dict(
+        AtmosphereUser.objects.filter(
+            username__in=set(
+                username for source_deltas in deltas.values()
+                for username, _ in source_deltas
+            )
+        ).values_list('username', 'id')
+    )
+
+    for source_name, ledger in ledger_map.items():
+        _apply_ledger_deltas(ledger, deltas[source_name], user_ids)
+        ledger.high_water_mark = end_date
+        ledger.save()
+
+
+def _apply_ledger_deltas(ledger, deltas, user_ids):
+    existing = dict(
+        ((usage.user.username, usage.instance_id), usage)
+        for usage in ledger.instance_usage.filter(
+            instance_id__in=set(instance_id for _, instance_id in deltas)
+        ).select_related('user')
+    )
+    touched = []
+    new_usage = []
+    for (username, instance_id), (seconds, is_running) in deltas.items():
+        delta = decimal.Decimal('%.3f' % seconds)
+        usage = existing.get((username, instance_id))
+        if usage:
+            usage.compute_used += delta
+            usage.is_running = is_running
+            usage.save()
+            touched.append(usage.id)
+        elif username in user_ids:
+            new_usage.append(
+                InstanceAllocationUsage(
+                    ledger=ledger,
+                    user_id=user_ids[username],
+                    instance_id=instance_id,
+                    compute_used=delta,
+                    is_running=is_running
+                )
+            )
+    # Any instance without a row since the last mark has stopped charging
+    ledger.instance_usage.filter(is_running=True).exclude(
+        id__in=touched
+    ).update(is_running=False)
+    InstanceAllocationUsage.objects.bulk_create(new_usage)
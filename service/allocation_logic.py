@@ -1,3 +1,4 @@
+import bisect
 import datetime
 
 import pytz
@@ -8,6 +9,7 @@ from threepio import logger
 from core.models import EventTable
 from core.models.allocation_source import AllocationSource
 from core.models.instance import Instance
+from core.models.instance_history import InstanceStatusHistory
 
 
 def create_report(
@@ -16,6 +18,138 @@ def create_report(
     user_id=None,
     allocation_source_name=None
 ):
+    report_start_date, report_end_date = _parse_report_dates(
+        report_start_date, report_end_date
+    )
+    data = generate_data(report_start_date, report_end_date, username=user_id)
+    if allocation_source_name:
+        output = []
+        for row in data:
+            if row['allocation_source'] == allocation_source_name:
+                output.append(row)
+        return output
+
+    return data
+
+
+def create_bulk_report(report_start_date, report_end_date):
+    """
+    Compute every user's usage in a single pass over the events and
+    histories of the report window.
+
+    Returns {(username, allocation_source_name): {
+        'compute_used': <hours>, 'burn_rate': <running instances>}}
+    Usage that is not charged to an allocation source ('N/A') is omitted.
+    """
+    report_start_date, report_end_date = _parse_report_dates(
+        report_start_date, report_end_date
+    )
+    data = generate_data(report_start_date, report_end_date)
+    usage = summarize_usage(data, report_end_date)
+    totals = {}
+    for (username, allocation_source, _), (seconds, is_running) in usage.items():
+        if allocation_source == 'N/A':
+            continue
+        key = (username, allocation_source)
+        total_seconds, burn_rate = totals.get(key, (0.0, 0))
+        totals[key] = (total_seconds + seconds, burn_rate + int(is_running))
+    return dict(
+        (
+            key, {
+                'compute_used': round(seconds / 3600.0, 2),
+                'burn_rate': burn_rate
+            }
+        ) for key, (seconds, burn_rate) in totals.items()
+    )
+
+
+def window_usage(windows, bucket_span=datetime.timedelta(days=1)):
+    """
+    Compute the usage of each of `windows`, a list of
+    (username, allocation_source_name, start_date, end_date).
+
+    Windows are bucketed by start date: each bucket holds the windows that
+    start within `bucket_span` of its earliest one, and its usage comes
+    from a single report spanning them all, restricted to its user when it
+    has only one. A window starting long before the others (e.g. a user's
+    first window, from the date they joined) does not make the report of
+    every other user start that early.
+
+    Returns {window: <hours>}, as `total_usage` would for each window.
+    """
+    usage = {}
+    for bucket in _bucket_windows(windows, bucket_span):
+        usernames = set(window[0] for window in bucket)
+        active_rows = {}
+        for row in generate_data(
+            min(window[2] for window in bucket),
+            max(window[3] for window in bucket),
+            username=usernames.pop() if len(usernames) == 1 else None
+        ):
+            if row['instance_status'] != 'active':
+                continue
+            active_rows.setdefault(
+                (row['username'], row['allocation_source']), []
+            ).append(row)
+        for window in bucket:
+            username, allocation_source_name, start_date, end_date = window
+            seconds = 0.0
+            for row in active_rows.get((username, allocation_source_name), []):
+                # The part of the row (see `calculate_allocation`) in the window
+                overlap = (
+                    min(row['instance_status_end_date'], end_date) -
+                    max(row['instance_status_start_date'], start_date)
+                ).total_seconds()
+                if overlap > 0:
+                    seconds += overlap * row['cpu']
+            usage[window] = round(seconds / 3600.0, 2)
+    return usage
+
+
+def _bucket_windows(windows, bucket_span):
+    """
+    Split `windows` (see `window_usage`), sorted by start date, into lists
+    of windows starting within `bucket_span` of the first of their list.
+    """
+    buckets = []
+    for window in sorted(windows, key=lambda window: window[2]):
+        if buckets and window[2] - buckets[-1][0][2] <= bucket_span:
+            buckets[-1].append(window)
+        else:
+            buckets.append([window])
+    return buckets
+
+
+def summarize_usage(data, report_end_date):
+    """
+    Collapse report rows into
+    {(username, allocation_source_name, instance_id): (seconds, is_running)}
+
+    `is_running` is True when the instance is active, and charging that
+    allocation source, at `report_end_date`.
+    """
+    usage = {}
+    last_row_by_instance = {}
+    for row in data:
+        # Rows are ordered by history start date within each instance, so
+        # the last row seen for an instance describes its final state
+        last_row_by_instance[row['instance_id']] = row
+        key = (row['username'], row['allocation_source'], row['instance_id'])
+        usage[key] = usage.get(key, 0.0) + row['applicable_duration']
+
+    running = set()
+    for instance_id, row in last_row_by_instance.items():
+        if row['instance_status'] == 'active'\
+                and row['instance_status_end_date'] >= report_end_date:
+            running.add(
+                (row['username'], row['allocation_source'], instance_id)
+            )
+    return dict(
+        (key, (seconds, key in running)) for key, seconds in usage.items()
+    )
+
+
+def _parse_report_dates(report_start_date, report_end_date):
     if not report_start_date or not report_end_date:
         raise Exception(
             "Start date and end date missing for allocation calculation function"
@@ -31,15 +165,7 @@ def create_report(
         raise Exception(
             "Cannot parse start and end dates for allocation calculation function"
         )
-    data = generate_data(report_start_date, report_end_date, username=user_id)
-    if allocation_source_name:
-        output = []
-        for row in data:
-            if row['allocation_source'] == allocation_source_name:
-                output.append(row)
-        return output
-
-    return data
+    return report_start_date, report_end_date
 
 
 def generate_data(report_start_date, report_end_date, username=None):
@@ -57,10 +183,17 @@ def generate_data(report_start_date, report_end_date, username=None):
     events_histories_dict = map_events_to_histories(
         filtered_instance_histories, event_instance_dict
     )
+    # allocation source in effect for each instance, from one event stream
+    allocation_timeline = AllocationSourceTimeline.for_report(
+        filtered_items['events'],
+        report_start_date,
+        filtered_instance_histories.keys(),
+        username=username
+    )
     # create rows of data
     data = create_rows(
         filtered_instance_histories, events_histories_dict, report_start_date,
-        report_end_date
+        report_end_date, allocation_timeline
     )
     return data
 
@@ -90,9 +223,7 @@ def filter_events_and_instances(
             user_id_int = AtmosphereUser.objects.get(username=username)
         except:
             raise Exception("User '%s' does not exist" % (username))
-        events = events.filter(
-            Q(payload__username__exact=username) | Q(entity_id=username)
-        ).order_by('timestamp')
+        events = events.for_username(username).order_by('timestamp')
         instances = instances.filter(Q(created_by__exact=user_id_int))
     instance_ids = instances.values_list("id", flat=True)
     logger.info(
@@ -113,14 +244,23 @@ def group_events_by_instances(events):
 def get_all_histories_for_instance(
     instances, report_start_date, report_end_date
 ):
+    """
+    Return {provider_alias: [InstanceStatusHistory, ...]} for every history
+    overlapping the report window, ordered by start_date.
+
+    A single query is made; the instance, its creator, the size and the
+    status are fetched along with each history, so building rows from them
+    costs no further queries.
+    """
     histories = {}
-    for instance in instances:
-        histories[
-            instance.provider_alias
-        ] = instance.instancestatushistory_set.filter(
-            ~Q(start_date__gte=report_end_date) &
-            ~Q(Q(end_date__isnull=False) & Q(end_date__lte=report_start_date))
-        ).order_by('start_date')
+    history_qs = InstanceStatusHistory.objects.filter(
+        Q(instance__in=instances) & ~Q(start_date__gte=report_end_date) &
+        ~Q(Q(end_date__isnull=False) & Q(end_date__lte=report_start_date))
+    ).select_related('instance__created_by', 'size',
+                     'status').order_by('instance_id', 'start_date')
+    for history in history_qs:
+        histories.setdefault(history.instance.provider_alias,
+                             []).append(history)
 
     return histories
 
@@ -128,47 +268,140 @@ def get_all_histories_for_instance(
 def map_events_to_histories(filtered_instance_histories, event_instance_dict):
     out_dic = {}
     for instance, events in event_instance_dict.iteritems():
-        hist_list = filtered_instance_histories.get(instance, [])
+        history_index = HistoryIntervalIndex(
+            filtered_instance_histories.get(instance, [])
+        )
         for info in events:
-            ts = info.timestamp
-            inst_history = [
-                i.id for i in hist_list if i.start_date <= ts and
-                ((not i.end_date) or (i.end_date and i.end_date >= ts))
-            ]
-            if inst_history:
-                out_dic.setdefault(inst_history[-1], []).append(info)
+            history = history_index.find(info.timestamp)
+            if history:
+                out_dic.setdefault(history.id, []).append(info)
     return out_dic
 
 
-def get_allocation_source_name_from_event(
-    username, report_start_date, instance_id, instance_history_start_date
-):
-    events = EventTable.objects.filter(
-        Q(
-            Q(timestamp__lt=report_start_date) |
-            Q(timestamp__gte=report_start_date
-             ) & Q(timestamp__lt=instance_history_start_date)
-        ) & Q(name__exact="instance_allocation_source_changed") &
-        Q(Q(payload__username__exact=username) |
-          Q(entity_id=username)) & Q(payload__instance_id__exact=instance_id)
-    ).order_by('timestamp')
-    if not events:
-        return False
-    else:
-        try:
-            allocation_source_object = AllocationSource.objects.get(
-                name=events.last().payload['allocation_source_name']
+class HistoryIntervalIndex(object):
+    """
+    The status histories of one instance, sorted by start_date, resolving a
+    timestamp to the history covering it with a binary search.
+    """
+
+    def __init__(self, histories):
+        self.histories = sorted(histories, key=lambda hist: hist.start_date)
+        self.start_dates = [hist.start_date for hist in self.histories]
+
+    def find(self, timestamp):
+        """
+        Return the latest history with start_date <= timestamp <= end_date,
+        or None if the timestamp falls outside every history.
+        """
+        index = bisect.bisect_right(self.start_dates, timestamp) - 1
+        if index < 0:
+            return None
+        history = self.histories[index]
+        if history.end_date and history.end_date < timestamp:
+            return None
+        return history
+
+
+class AllocationSourceTimeline(object):
+    """
+    `instance_allocation_source_changed` events ordered by timestamp and
+    grouped by (username, instance), answering "which allocation source was
+    in effect for this instance at time T" with a binary search.
+    """
+
+    def __init__(self):
+        self._events = {}
+        self._timestamps = {}
+        self._names_by_uuid = None
+
+    @classmethod
+    def for_report(
+        cls, window_events, report_start_date, instance_ids, username=None
+    ):
+        """
+        Build the timeline from the events inside the report window plus
+        the last event before the window, fetched in a single query.
+        """
+        instance_ids = set(instance_ids)
+        timeline = cls()
+        earlier_events = []
+        if instance_ids:
+            # Only the latest event before the window can be in effect
+            earlier_events = EventTable.objects.filter(
+                name__exact="instance_allocation_source_changed",
+                timestamp__lt=report_start_date
+            ).for_instances(instance_ids)
+            if username:
+                earlier_events = earlier_events.for_username(username)
+            earlier_events = earlier_events.latest_per_instance()
+        for event in sorted(earlier_events, key=lambda event: event.timestamp):
+            for key in _timeline_keys(event):
+                timeline._events[key] = [event]
+                timeline._timestamps[key] = [event.timestamp]
+        for event in window_events:
+            timeline.add(event)
+        return timeline
+
+    def add(self, event):
+        """
+        Append an event, which must not be older than any event added so far.
+        """
+        for key in _timeline_keys(event):
+            self._events.setdefault(key, []).append(event)
+            self._timestamps.setdefault(key, []).append(event.timestamp)
+
+    def event_before(self, username, instance_id, timestamp):
+        """
+        Return the last event for the instance (owned by username) strictly
+        before timestamp, or None.
+        """
+        key = (username, instance_id)
+        index = bisect.bisect_left(self._timestamps.get(key, []), timestamp)
+        if not index:
+            return None
+        return self._events[key][index - 1]
+
+    def allocation_source_name_at(self, username, instance_id, timestamp):
+        """
+        Return the name of the allocation source in effect just before
+        timestamp, or False if the instance has not been assigned one.
+        """
+        event = self.event_before(username, instance_id, timestamp)
+        if not event:
+            return False
+        if 'allocation_source_name' in event.payload:
+            return event.payload['allocation_source_name']
+        return self._get_names_by_uuid().get(
+            event.payload.get('allocation_source_id'), False
+        )
+
+    def _get_names_by_uuid(self):
+        # Legacy events refer to the allocation source by uuid; resolve them
+        # all at once, the first time one is needed.
+        if self._names_by_uuid is None:
+            source_ids = set(
+                event.payload['allocation_source_id']
+                for events in self._events.values() for event in events
+                if 'allocation_source_id' in event.payload
             )
-        except KeyError:
-            allocation_source_object = AllocationSource.objects.get(
-                uuid=events.last().payload['allocation_source_id']
+            self._names_by_uuid = dict(
+                (str(uuid), name)
+                for uuid, name in AllocationSource.objects.filter(
+                    uuid__in=source_ids
+                ).values_list('uuid', 'name')
             )
-        return allocation_source_object.name
+        return self._names_by_uuid
+
+
+def _timeline_keys(event):
+    instance_id = event.payload.get('instance_id')
+    usernames = set([event.entity_id, event.payload.get('username')])
+    return [(username, instance_id) for username in usernames if username]
 
 
 def create_rows(
     filtered_instance_histories, events_histories_dict, report_start_date,
-    report_end_date
+    report_end_date, allocation_timeline
 ):
     data = []
     current_user = ''
@@ -178,6 +411,12 @@ def create_rows(
 
     still_running = _get_current_date_utc()
     total_burn_rate = 0
+    application_names = get_application_names(
+        [
+            histories[0].instance_id
+            for histories in filtered_instance_histories.values() if histories
+        ]
+    )
     for instance, histories in filtered_instance_histories.iteritems():
         for hist in histories:
             if current_user != hist.instance.created_by.username:
@@ -188,9 +427,9 @@ def create_rows(
                 current_user = hist.instance.created_by.username
 
             if current_instance_id != hist.instance.id:
-                current_as_name = get_allocation_source_name_from_event(
-                    current_user, report_start_date,
-                    hist.instance.provider_alias, hist.start_date
+                current_as_name = allocation_timeline.allocation_source_name_at(
+                    current_user, hist.instance.provider_alias,
+                    max(report_start_date, hist.start_date)
                 )
                 allocation_source_name = current_as_name if current_as_name else 'N/A'
                 current_instance_id = hist.instance.id
@@ -213,7 +452,10 @@ def create_rows(
                 'applicable_duration': '',
                 'burn_rate': ''
             }
-            filled_row = fill_data(empty_row, hist, allocation_source_name)
+            filled_row = fill_data(
+                empty_row, hist, allocation_source_name,
+                application_names.get(hist.instance_id)
+            )
             # check if instance is active and has no end date. If so, increment total burn rate
             if hist.status.name == 'active' and not hist.end_date:
                 total_burn_rate += 1
@@ -284,13 +526,27 @@ def _get_current_date_utc():
     return datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
 
 
-def fill_data(row, history_obj, allocation_source):
+def get_application_names(instance_ids):
+    """
+    Return {instance_id: application name} in one query.
+
+    Equivalent to `Instance.application_name()` for each instance; instances
+    not launched from a machine map to None.
+    """
+    return dict(
+        Instance.objects.filter(id__in=instance_ids).values_list(
+            'id', 'source__providermachine__application_version__'
+            'application__name'
+        )
+    )
+
+
+def fill_data(row, history_obj, allocation_source, image_name=None):
     still_running = _get_current_date_utc()
     row['username'] = history_obj.instance.created_by.username
     row['allocation_source'] = allocation_source
     row['instance_id'] = history_obj.instance_id
-    row['image_name'] = Instance.objects.get(id=history_obj.instance_id
-                                            ).application_name()
+    row['image_name'] = image_name
     row['provider_alias'] = history_obj.instance.provider_alias
     row['instance_status_history_id'] = history_obj.id
     row['cpu'] = history_obj.size.cpu
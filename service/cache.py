@@ -1,11 +1,45 @@
+"""
+Redis-backed caches of cloud resources, shared by the API and by monitoring.
+
+Instances are stored one hash entry per instance, keyed by provider alias.
+Listings are invalidated by bumping generation counters, without having to
+find and delete their keys:
+- the provider generation invalidates every listing of the provider (the
+  provider-wide list and each identity's list),
+- an identity generation invalidates that identity's list, and the
+  all-identities generation the provider-wide list.
+
+Settings:
+    INSTANCE_CACHE_TTL - Seconds a listing is served as fresh (30)
+    INSTANCE_CACHE_STALE_TTL - Seconds a listing is kept around after it
+        was fetched, to be served while it is refreshed (300)
+    INSTANCE_CACHE_STALE_WHILE_REVALIDATE - Serve a stale listing and
+        refresh it in the background, instead of refreshing inline (False)
+    DRIVER_CACHE_SIZE - Drivers kept per process, per kind, counting each
+        thread's driver of a key (512)
+    DRIVER_CACHE_TTL - Seconds a driver is re-used before a new one is
+        built (3600)
+    DRIVER_TOKEN_EXPIRY_MARGIN - Seconds before its Keystone token expires
+        that a driver is rebuilt (300)
+"""
 import cPickle as pickle
+import contextlib
+import json
+import threading
+import time
+import uuid
+
 import redis
+from django.conf import settings
 from threepio import logger
 
 from service.driver import get_esh_driver, get_admin_driver
+from service.driver_pool import credentials_hash, driver_pool
 
-admin_drivers = {}
-drivers = {}
+# Keyed by provider
+admin_drivers = driver_pool('drivers.admin')
+# Keyed by (provider id, identity uuid, credentials hash)
+drivers = driver_pool('drivers.identity')
 connection = None
 
 INSTANCES_KEY_PROVIDER = "instances.{0}"
@@ -14,20 +48,49 @@ VOLUMES_KEY_PROVIDER = "volumes.{0}"
 VOLUMES_KEY_IDENTITY = "volumes.{0}.{1}"
 MACHINES_KEY_PROVIDER = "machines.{0}"
 MACHINES_KEY_IDENTITY = "machines.{0}.{1}"
+GENERATION_KEY_PROVIDER = "generation.{0}"
+GENERATION_KEY_IDENTITY = "generation.{0}.{1}"
+GENERATION_KEY_ALL_IDENTITIES = "generation.{0}.all"
+LEASE_KEY = "lease.{0}"
+
+# Delete a lease only while it still holds our token: once it expired,
+# another process may have taken it.
+_RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
 
 
-def _get_cached_admin_driver(provider, force=True):
-    if not admin_drivers.get(provider) or force:
-        admin_drivers[provider] = get_admin_driver(provider)
-    return admin_drivers[provider]
+def _get_cached_admin_driver(provider, force=False):
+    if force:
+        admin_drivers.invalidate(provider)
+    return admin_drivers.get_driver(
+        provider, lambda: get_admin_driver(provider)
+    )
 
 
-def _get_cached_driver(provider=None, identity=None, force=True):
+def _get_cached_driver(provider=None, identity=None, force=False):
     if provider:
         return _get_cached_admin_driver(provider, force)
-    if not drivers.get(identity) or force:
-        drivers[identity] = get_esh_driver(identity)
-    return drivers[identity]
+    key = (identity.provider_id, identity.uuid, credentials_hash(identity))
+    if force:
+        drivers.invalidate(key)
+    return drivers.get_driver(key, lambda: get_esh_driver(identity))
+
+
+def invalidate_cached_drivers(provider=None, identity=None):
+    """
+    Forget the admin driver and every identity driver of `provider`, or the
+    drivers of `identity`.
+    """
+    _validate_parameters(provider, identity)
+    if identity:
+        drivers.invalidate_matching(lambda key: key[1] == identity.uuid)
+        return
+    admin_drivers.invalidate(provider)
+    drivers.invalidate_matching(lambda key: key[0] == provider.id)
 
 
 def redis_connection():
@@ -37,37 +100,202 @@ def redis_connection():
     return connection
 
 
+@contextlib.contextmanager
+def lease(name, ttl):
+    """
+    Hold the lease `name` for the duration of the block, or at most `ttl`
+    seconds. Yields False, without waiting, while another process holds it.
+    If redis-server is down the lease is granted, so work carries on.
+    """
+    key = LEASE_KEY.format(name)
+    token = uuid.uuid4().hex
+    r = redis_connection()
+    try:
+        acquired = r.set(key, token, nx=True, ex=ttl)
+    except redis.exceptions.ConnectionError:
+        logger.error("Could not take lease %s, redis-server is down" % name)
+        r = acquired = None
+    if r and not acquired:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        if r:
+            try:
+                r.eval(_RELEASE_LEASE_SCRIPT, 1, key, token)
+            except redis.exceptions.ConnectionError:
+                logger.error(
+                    "Could not release lease %s, redis-server is down" % name
+                )
+
+
+def _cache_ttl():
+    return getattr(settings, 'INSTANCE_CACHE_TTL', 30)
+
+
+def _cache_stale_ttl():
+    return max(getattr(settings, 'INSTANCE_CACHE_STALE_TTL', 300), _cache_ttl())
+
+
+def _stale_while_revalidate():
+    return getattr(settings, 'INSTANCE_CACHE_STALE_WHILE_REVALIDATE', False)
+
+
 def _invalidate(key):
     r = redis_connection()
     if key:
         r.delete(key)
 
 
-def _get_cached(key, data_method, scrub_method, force=False):
+def _bump_generations(generation_keys):
+    """
+    Bump each of `generation_keys`, invalidating the listings cached under
+    them.
+    """
     try:
-        r = redis_connection()
-        if force:
-            _invalidate(key)
-        data = r.get(key)
+        pipe = redis_connection().pipeline(transaction=False)
+        for generation_key in generation_keys:
+            pipe.incr(generation_key)
+        pipe.execute()
     except redis.exceptions.ConnectionError:
         logger.error(
             "EXTERNAL SERVICE redis-server IS NOT RUNNING! "
             "Somebody should turn it on!"
         )
-        data = None
-    if not data:
-        data = data_method()
-        scrub_method(data)
-        logger.debug(
-            "Updated redis({0}) using {1} and {2}".format(
-                key, data_method, scrub_method
+
+
+def _generations(values):
+    return [int(value or 0) for value in values]
+
+
+def _read_objects(key, generation_keys):
+    """
+    Read a cached listing in a single round-trip.
+
+    Returns (objects, age in seconds) or (None, None) if the listing is
+    missing or was cached under an older generation.
+    """
+    pipe = redis_connection().pipeline(transaction=False)
+    pipe.mget(generation_keys)
+    pipe.get(key + ".meta")
+    pipe.hgetall(key)
+    generations, meta, entries = pipe.execute()
+    if not meta:
+        return None, None
+    meta = json.loads(meta)
+    if meta.get('generations') != _generations(generations):
+        return None, None
+    objects = [pickle.loads(entry) for entry in entries.values()]
+    return objects, time.time() - meta['fetched']
+
+
+def _write_objects(key, generations, objects, id_method):
+    """
+    Replace a cached listing atomically, one hash entry per object.
+    """
+    stale_ttl = _cache_stale_ttl()
+    pipe = redis_connection().pipeline()
+    pipe.delete(key)
+    if objects:
+        pipe.hmset(
+            key,
+            dict(
+                (
+                    id_method(obj),
+                    pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+                ) for obj in objects
+            )
+        )
+        pipe.expire(key, stale_ttl)
+    pipe.setex(
+        key + ".meta", stale_ttl,
+        json.dumps({
+            'generations': generations,
+            'fetched': time.time()
+        })
+    )
+    pipe.execute()
+
+
+def _fetch_objects(
+    key, generation_keys, data_method, scrub_method, id_method
+):
+    r = redis_connection()
+    # Read the generations *before* listing, so an invalidation that happens
+    # while listing leaves this result stale instead of hiding the change.
+    generations = _generations(r.mget(generation_keys))
+    data = data_method()
+    scrub_method(data)
+    try:
+        _write_objects(key, generations, data, id_method)
+    except redis.exceptions.ConnectionError:
+        logger.error("Could not write redis(%s), redis-server is down" % key)
+        return data
+    logger.debug(
+        "Updated redis({0}) using {1} and {2}".format(
+            key, data_method, scrub_method
+        )
+    )
+    return data
+
+
+def _revalidate(key, generation_keys, data_method, scrub_method, id_method):
+    """
+    Refresh a stale listing in the background. Only one process refreshes a
+    given key at a time; the others keep serving the stale listing.
+
+    Returns the refreshing thread, or None if another process refreshes it.
+    """
+    r = redis_connection()
+    if not r.set(key + ".refreshing", 1, nx=True, ex=_cache_ttl()):
+        return None
+
+    def _refresh():
+        try:
+            _fetch_objects(
+                key, generation_keys, data_method, scrub_method, id_method
             )
+        except Exception:
+            logger.exception("Could not refresh redis(%s)" % key)
+        finally:
+            r.delete(key + ".refreshing")
+
+    thread = threading.Thread(target=_refresh, name="revalidate-%s" % key)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def _get_cached(
+    key,
+    generation_keys,
+    data_method,
+    scrub_method,
+    id_method=lambda obj: obj.id,
+    force=False
+):
+    try:
+        if not force:
+            data, age = _read_objects(key, generation_keys)
+            if data is not None and age < _cache_ttl():
+                return data
+            if data is not None and _stale_while_revalidate():
+                _revalidate(
+                    key, generation_keys, data_method, scrub_method, id_method
+                )
+                return data
+        return _fetch_objects(
+            key, generation_keys, data_method, scrub_method, id_method
+        )
+    except redis.exceptions.ConnectionError:
+        logger.error(
+            "EXTERNAL SERVICE redis-server IS NOT RUNNING! "
+            "Somebody should turn it on!"
         )
-        r.set(key, pickle.dumps(data))
-        r.expire(key, 30)
+        data = data_method()
+        scrub_method(data)
         return data
-    logger.debug("Actual type {0}".format(type(data)))
-    return pickle.loads(data)
 
 
 def _scrub(objects):
@@ -86,16 +314,40 @@ def _validate_parameters(provider, identity):
         raise Exception("Use either provider or identity but not both.")
 
 
-def get_cached_driver(provider=None, identity=None, force=True):
+def _instances_keys(provider=None, identity=None):
+    """
+    Return (listing key, generation keys) for a provider or an identity.
+    """
+    if provider:
+        return INSTANCES_KEY_PROVIDER.format(provider.id), [
+            GENERATION_KEY_PROVIDER.format(provider.id),
+            GENERATION_KEY_ALL_IDENTITIES.format(provider.id)
+        ]
+    return INSTANCES_KEY_IDENTITY.format(
+        identity.created_by.username, identity.id
+    ), [
+        GENERATION_KEY_PROVIDER.format(identity.provider_id),
+        GENERATION_KEY_IDENTITY.format(identity.provider_id, identity.id)
+    ]
+
+
+def get_cached_driver(provider=None, identity=None, force=False):
+    """
+    Return a pooled driver for the provider (admin) or the identity.
+    force - Build a new driver, e.g. after the credentials were rejected.
+    """
     _validate_parameters(provider, identity)
     return _get_cached_driver(provider=provider, identity=identity, force=force)
 
 
 def get_cached_instances(provider=None, identity=None, force=False):
+    """
+    Return the cached instance listing of the provider or the identity.
+    force - List the instances again. The pooled driver is kept, use
+        `get_cached_driver(force=True)` to rebuild it.
+    """
     _validate_parameters(provider, identity)
-    cached_driver = _get_cached_driver(
-        provider=provider, identity=identity, force=force
-    )
+    cached_driver = _get_cached_driver(provider=provider, identity=identity)
     cached_driver.list_sizes()
     #NOTE: THIS IS A HACK -- The 'admin' user should be able to see "All the things" -- HOWEVER
     # In the current implementation of liberty on jetstream, a call to 'list_all_tenants'
@@ -108,20 +360,25 @@ def get_cached_instances(provider=None, identity=None, force=False):
     else:
         instances_method = cached_driver.list_instances
 
-    if provider:
-        key = INSTANCES_KEY_PROVIDER.format(provider.id)
-    else:
-        key = INSTANCES_KEY_IDENTITY.format(
-            identity.created_by.username, identity.id
-        )
-    return _get_cached(key, instances_method, _scrub, force=force)
+    key, generation_keys = _instances_keys(provider, identity)
+    return _get_cached(
+        key, generation_keys, instances_method, _scrub, force=force
+    )
 
 
 def invalidate_cached_instances(provider=None, identity=None):
+    """
+    Invalidate every instance listing of the provider, or the listing of the
+    identity and the provider-wide listing that includes its instances.
+    """
     if provider:
-        key = INSTANCES_KEY_PROVIDER.format(provider.id)
+        _bump_generations([GENERATION_KEY_PROVIDER.format(provider.id)])
     else:
-        key = INSTANCES_KEY_IDENTITY.format(
-            identity.created_by.username, identity.id
+        _bump_generations(
+            [
+                GENERATION_KEY_IDENTITY.format(
+                    identity.provider_id, identity.id
+                ),
+                GENERATION_KEY_ALL_IDENTITIES.format(identity.provider_id)
+            ]
         )
-    _invalidate(key)
@@ -230,9 +230,11 @@ def prepare_driver(
     used return None.
     """
     try:
+        # service.cache imports this module
+        from service.cache import get_cached_driver
         core_identity = CoreIdentity.shared_with_user(request.user)\
                 .get(provider__uuid=provider_uuid, uuid=identity_uuid)
-        return get_esh_driver(core_identity=core_identity)
+        return get_cached_driver(identity=core_identity)
     except (CoreIdentity.DoesNotExist, ValueError):
         logger.exception("Unable to prepare driver.")
         if raise_exception:
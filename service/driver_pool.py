@@ -0,0 +1,115 @@
+"""
+A process-wide pool of cloud drivers, for request threads and Celery
+workers.
+
+Building an rtwo driver reads the identity's credentials and, on first use,
+authenticates against Keystone. Pooled drivers are re-used until their
+Keystone token is about to expire, so a thread authenticates once per
+token lifetime instead of once per call.
+
+libcloud connections are not thread-safe, so a driver is never handed to
+two threads: each thread is pooled its own driver per key. Thread idents
+are only recycled once a thread has exited, so a driver is never in use by
+two live threads.
+"""
+import datetime
+import hashlib
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from service.lru_cache import LRUCache
+
+# Builds of different keys run concurrently, builds of one key don't.
+_LOCK_STRIPES = 32
+
+
+class DriverPool(LRUCache):
+    def __init__(self, name, max_size=512, ttl=3600, expiry_margin=300):
+        """
+        expiry_margin - Seconds before its token expires that a driver is
+            rebuilt, rather than handed out
+        """
+        super(DriverPool, self).__init__(name, max_size=max_size, ttl=ttl)
+        self.expiry_margin = expiry_margin
+        self.reauths = 0
+        self._build_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+    def get_driver(self, key, build_method):
+        """
+        Return the calling thread's pooled driver of `key`, or build, pool
+        and return `build_method()` if there is none or its token is about
+        to expire.
+        """
+        thread_key = (key, threading.current_thread().ident)
+        with self._build_locks[hash(key) % _LOCK_STRIPES]:
+            driver = self.get(thread_key)
+            if driver is not None and self.token_expiring(driver):
+                with self._lock:
+                    self.reauths += 1
+                super(DriverPool, self).invalidate(thread_key)
+                driver = None
+            if driver is None:
+                driver = build_method()
+                if driver:
+                    self.set(thread_key, driver)
+            return driver
+
+    def invalidate(self, key):
+        """
+        Forget the drivers of `key`, in every thread.
+        """
+        self.invalidate_matching(lambda driver_key: driver_key == key)
+
+    def invalidate_matching(self, key_test):
+        """
+        Forget the drivers, in every thread, of each key that passes
+        `key_test(key)`. Returns the number of drivers removed.
+        """
+        return super(DriverPool, self).invalidate_matching(
+            lambda thread_key: key_test(thread_key[0])
+        )
+
+    def token_expiring(self, driver):
+        expires = token_expires(driver)
+        if not expires:
+            # Not authenticated yet, or not a Keystone driver
+            return False
+        if timezone.is_naive(expires):
+            now = datetime.datetime.utcnow()
+        else:
+            now = timezone.now()
+        return expires - now < datetime.timedelta(seconds=self.expiry_margin)
+
+    def stats(self):
+        stats = super(DriverPool, self).stats()
+        stats['reauths'] = self.reauths
+        return stats
+
+
+def token_expires(driver):
+    """
+    Return when the Keystone token of an rtwo driver expires, or None if
+    it is unknown.
+    """
+    connection = getattr(getattr(driver, '_connection', None), 'connection', None)
+    return getattr(connection, 'auth_token_expires', None)
+
+
+def credentials_hash(core_identity):
+    """
+    Return a digest of every credential used to build the identity's
+    driver, so changing any of them keys a new driver.
+    """
+    credentials = sorted(core_identity.get_all_credentials().items())
+    return hashlib.sha256(repr(credentials)).hexdigest()
+
+
+def driver_pool(name):
+    return DriverPool(
+        name,
+        max_size=getattr(settings, 'DRIVER_CACHE_SIZE', 512),
+        ttl=getattr(settings, 'DRIVER_CACHE_TTL', 3600),
+        expiry_margin=getattr(settings, 'DRIVER_TOKEN_EXPIRY_MARGIN', 300)
+    )
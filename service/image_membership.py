@@ -0,0 +1,356 @@
+"""
+Set-based image membership sync for one provider.
+
+`monitor_machines_for` used to reconcile Glance members against
+ApplicationMembership, ApplicationVersionMembership and
+ProviderMachineMembership one image (and one `get_or_create`) at a time.
+Here the Glance members of every image are fetched on a bounded thread
+pool, the database memberships are loaded in a few queries, and only the
+difference between the two is written: new memberships with
+`bulk_create`, missing cloud members with one share per (image, project).
+
+As before, memberships are never removed by the sync: removals are done
+explicitly, with `service.machine.remove_membership`.
+"""
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from threepio import logger
+
+from core.models.application import ApplicationMembership
+from core.models.application_version import ApplicationVersionMembership
+from core.models.group import Group, IdentityMembership
+from core.models.machine import ProviderMachineMembership
+from core.models.machine_request import MachineRequest
+from service.accounts.openstack_manager import ProjectDirectory
+from service.exceptions import TimeoutError
+
+# An image shared with more projects than this was shared in error, see
+# `_desired_project_names`.
+MAX_SHARED_PROJECTS = 128
+
+
+def sync_image_memberships(
+    account_driver,
+    provider,
+    machines,
+    project_directory=None,
+    distribute=None,
+    dry_run=False
+):
+    """
+    Reconcile the membership of `machines`, a list of
+    (glance image, ProviderMachine) pairs of `provider`.
+
+    - Any project the image is shared with (in Glance, by its machine
+      request or by its application's access list) is added to the
+      database memberships of the machine, version and application.
+    - distribute (default: settings.ENFORCING) - also share each image with
+      the projects of its database members that are missing in Glance.
+
+    Returns a summary of the number of images and changes made.
+    """
+    if distribute is None:
+        distribute = settings.ENFORCING
+    if project_directory is None:
+        project_directory = ProjectDirectory(account_driver)
+    machines = [
+        (cloud_machine, db_machine)
+        for cloud_machine, db_machine in machines
+        if cloud_machine.get('visibility', 'private').lower() != 'public'
+    ]
+    image_ids = [cloud_machine.id for cloud_machine, _ in machines]
+    image_members = fetch_image_members(account_driver, image_ids)
+    machine_requests = _last_machine_requests(image_ids)
+    machine_groups, version_groups, application_groups = \
+        load_db_memberships(db_machine for _, db_machine in machines)
+
+    desired_names = {}
+    access_lists = {}
+    for cloud_machine, db_machine in machines:
+        project_names = _desired_project_names(
+            cloud_machine, db_machine, image_members[cloud_machine.id],
+            machine_requests.get(cloud_machine.id), project_directory,
+            access_lists
+        )
+        if project_names:
+            desired_names[db_machine] = project_names
+    groups = dict(
+        (group.name, group) for group in Group.objects.filter(
+            name__in=set().union(*desired_names.values())
+        )
+    ) if desired_names else {}
+
+    new_machine_members = []
+    new_version_members = []
+    new_application_members = []
+    for db_machine, project_names in desired_names.items():
+        version = db_machine.application_version
+        for project_name in project_names:
+            group = groups.get(project_name)
+            if not group:
+                continue
+            if _add_member(machine_groups, db_machine.id, group.id):
+                new_machine_members.append(
+                    ProviderMachineMembership(
+                        provider_machine=db_machine, group=group
+                    )
+                )
+            if _add_member(version_groups, version.id, group.id):
+                new_version_members.append(
+                    ApplicationVersionMembership(
+                        image_version=version, group=group
+                    )
+                )
+            if _add_member(
+                application_groups, version.application_id, group.id
+            ):
+                new_application_members.append(
+                    ApplicationMembership(
+                        application_id=version.application_id, group=group
+                    )
+                )
+    for model, memberships in [
+        (ApplicationMembership, new_application_members),
+        (ApplicationVersionMembership, new_version_members),
+        (ProviderMachineMembership, new_machine_members),
+    ]:
+        if memberships:
+            logger.info(
+                "Creating %s new %s for %s" %
+                (len(memberships), model.__name__, provider)
+            )
+            if not dry_run:
+                _bulk_create_memberships(model, memberships)
+
+    shared_count = 0
+    if distribute:
+        shared_count = _distribute_image_memberships(
+            account_driver, provider, machines, image_members,
+            machine_groups, project_directory, dry_run
+        )
+    return {
+        'images': len(machines),
+        'created': len(new_machine_members) + len(new_version_members) +
+        len(new_application_members),
+        'shared': shared_count
+    }
+
+
+def fetch_image_members(account_driver, image_ids, threads=None):
+    """
+    Return {image_id: {project_id: member status}} for `image_ids`, listing
+    the members of each image on a pool of at most `threads` (default:
+    settings.IMAGE_MEMBERSHIP_THREADS) threads.
+    """
+    image_ids = list(image_ids)
+    if not image_ids:
+        return {}
+    if not threads:
+        threads = getattr(settings, 'IMAGE_MEMBERSHIP_THREADS', 8)
+    pool = ThreadPool(min(len(image_ids), threads))
+    try:
+        return dict(
+            pool.map(
+                lambda image_id: (
+                    image_id,
+                    account_driver.get_image_member_statuses(image_id)
+                ), image_ids
+            )
+        )
+    finally:
+        pool.close()
+        pool.join()
+
+
+def load_db_memberships(db_machines):
+    """
+    Return the group ids that are members of each of `db_machines`, their
+    versions and their applications, in three queries:
+    ({machine_id: set}, {version_id: set}, {application_id: set})
+    """
+    machine_ids = set()
+    version_ids = set()
+    application_ids = set()
+    for db_machine in db_machines:
+        machine_ids.add(db_machine.id)
+        version_ids.add(db_machine.application_version_id)
+        application_ids.add(db_machine.application_version.application_id)
+    return (
+        _group_ids_by(
+            ProviderMachineMembership.objects.filter(
+                provider_machine_id__in=machine_ids
+            ), 'provider_machine_id'
+        ),
+        _group_ids_by(
+            ApplicationVersionMembership.objects.filter(
+                image_version_id__in=version_ids
+            ), 'image_version_id'
+        ),
+        _group_ids_by(
+            ApplicationMembership.objects.filter(
+                application_id__in=application_ids
+            ), 'application_id'
+        ),
+    )
+
+
+def _group_ids_by(queryset, key):
+    group_ids = {}
+    for key_id, group_id in queryset.values_list(key, 'group_id'):
+        group_ids.setdefault(key_id, set()).add(group_id)
+    return group_ids
+
+
+def _add_member(memberships, key, group_id):
+    """
+    Add `group_id` to memberships[key], returning False if it was there.
+    """
+    members = memberships.setdefault(key, set())
+    if group_id in members:
+        return False
+    members.add(group_id)
+    return True
+
+
+def _last_machine_requests(image_ids):
+    """
+    Return {image_id: last completed MachineRequest} for `image_ids`.
+    """
+    machine_requests = {}
+    for machine_request in MachineRequest.objects.filter(
+        new_machine__instance_source__identifier__in=image_ids,
+        status__name='completed'
+    ).select_related('new_machine__instance_source').order_by('id'):
+        machine_requests[machine_request.new_machine.identifier
+                        ] = machine_request
+    return machine_requests
+
+
+def _desired_project_names(
+    cloud_machine, db_machine, members, machine_request, project_directory,
+    access_lists
+):
+    """
+    Return the names of _all projects_ that should be members of the image:
+    - The owner of the application/Creator of the MachineRequest
+    - Projects already granted access to the image in Glance
+    - The access list of the image's (last completed) MachineRequest
+    - Users who match the application's access list (cached per
+      application in `access_lists`)
+    NOTE: This assumes that every username == project name (Openstack)
+    """
+    project_names = set()
+    image_owner = cloud_machine.get('application_owner')
+    if image_owner:
+        project_names.add(image_owner)
+    for project_id in members:
+        project = project_directory.get_by_id(project_id)
+        if project:
+            project_names.add(project.name)
+    if machine_request:
+        project_names |= set(
+            name.strip() for name in machine_request.get_access_list()
+        )
+    application = db_machine.application_version.application
+    if application.id not in access_lists:
+        access_lists[application.id] = set(
+            application.get_users_from_access_list().values_list(
+                'username', flat=True
+            )
+        )
+    project_names |= access_lists[application.id]
+
+    # THIS IS A HACK - some images have been 'compromised' in this event,
+    # reset the access list _back_ to the last-known-good configuration,
+    # based on a machine request.
+    if len(project_names) > MAX_SHARED_PROJECTS:
+        logger.warn(
+            "Application %s has too many shared users. Consider running "
+            "'prune_machines' to cleanup" % application
+        )
+        if not machine_request:
+            return set()
+        project_names = set(
+            name.strip() for name in machine_request.get_access_list()
+        )
+    return project_names
+
+
+def _bulk_create_memberships(model, memberships):
+    try:
+        with transaction.atomic():
+            model.objects.bulk_create(memberships)
+    except IntegrityError:
+        # Some were created meanwhile, e.g. by the sync of another provider
+        # sharing the same application.
+        unique_fields = model._meta.unique_together[0]
+        for membership in memberships:
+            model.objects.get_or_create(
+                **dict(
+                    (field, getattr(membership, field))
+                    for field in unique_fields
+                )
+            )
+
+
+def _distribute_image_memberships(
+    account_driver, provider, machines, image_members, machine_groups,
+    project_directory, dry_run=False
+):
+    """
+    Share each 'shared' image with the (existing) projects of its database
+    members that have not approved membership in Glance yet.
+    Returns the number of shares made.
+    """
+    machines = [
+        (cloud_machine, db_machine)
+        for cloud_machine, db_machine in machines
+        if cloud_machine.get('visibility') == 'shared'
+    ]
+    group_ids = set().union(
+        *[machine_groups.get(db_machine.id, set()) for _, db_machine in machines]
+    )
+    if not group_ids:
+        return 0
+    group_identities = {}
+    for membership in IdentityMembership.objects.filter(
+        member_id__in=group_ids, identity__provider=provider
+    ).select_related('identity').prefetch_related('identity__credential_set'):
+        group_identities.setdefault(membership.member_id,
+                                    []).append(membership.identity)
+
+    shared_count = 0
+    for cloud_machine, db_machine in machines:
+        approved_names = set()
+        for project_id, status in image_members[cloud_machine.id].items():
+            project = project_directory.get_by_id(project_id)
+            if project and status == 'approved':
+                approved_names.add(project.name)
+        for group_id in machine_groups.get(db_machine.id, set()):
+            for identity in group_identities.get(group_id, []):
+                project_name = identity.project_name()
+                if not project_name or project_name in approved_names:
+                    continue
+                if not project_directory.get_by_name(project_name):
+                    # The project was deleted, or never made, in Keystone
+                    continue
+                logger.info(
+                    "Add %s to cloud membership for %s" %
+                    (project_name, db_machine)
+                )
+                approved_names.add(project_name)
+                shared_count += 1
+                if dry_run:
+                    continue
+                try:
+                    account_driver.share_image_with_identity(
+                        cloud_machine, identity
+                    )
+                except TimeoutError:
+                    logger.warn(
+                        "Failed to add cloud membership for %s - "
+                        "Operation timed out" % project_name
+                    )
+    return shared_count
@@ -665,6 +665,8 @@ def _destroy_instance(identity_uuid, instance_alias):
         except:
             pass
     node_destroyed = esh_driver._connection.destroy_node(instance)
+    from service.quota import invalidate_quota_usage
+    invalidate_quota_usage(identity_uuid)
     return (node_destroyed, instance)
 
 
@@ -768,22 +770,28 @@ def launch_instance(
     # May raise Exception("Size not available")
     size = check_size(esh_driver, size_alias, provider, boot_source)
 
-    # Raise any other exceptions before launching here
-    _pre_launch_validation(
-        user.username, esh_driver, identity_uuid, boot_source, size,
-        launch_kwargs.get('allocation_source')
-    )
+    from service.quota import invalidate_quota_usage
+    try:
+        # Raise any other exceptions before launching here
+        _pre_launch_validation(
+            user.username, esh_driver, identity_uuid, boot_source, size,
+            launch_kwargs.get('allocation_source')
+        )
 
-    core_instance = _select_and_launch_source(
-        user,
-        identity_uuid,
-        esh_driver,
-        boot_source,
-        size,
-        name=name,
-        deploy=deploy,
-        **launch_kwargs
-    )
+        core_instance = _select_and_launch_source(
+            user,
+            identity_uuid,
+            esh_driver,
+            boot_source,
+            size,
+            name=name,
+            deploy=deploy,
+            **launch_kwargs
+        )
+    finally:
+        # Release the quota reserved by check_quota: a launched instance is
+        # listed from now on, a failed one must not be counted.
+        invalidate_quota_usage(identity_uuid)
     return core_instance
 
 
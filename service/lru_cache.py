@@ -0,0 +1,116 @@
+"""
+Bounded, in-process caches for long-lived workers.
+
+An LRUCache holds at most `max_size` entries (the least recently used is
+evicted first) and forgets an entry `ttl` seconds after it was stored.
+Every cache registers itself by name so `cache_stats()` can report on all
+of them, e.g. to check that a worker's memory stays flat over time.
+"""
+import collections
+import threading
+import time
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class LRUCache(object):
+    def __init__(self, name, max_size=256, ttl=3600):
+        """
+        name - Unique name, used by `cache_stats`
+        max_size - Maximum number of entries (None: unbounded)
+        ttl - Seconds an entry is kept (None: forever)
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.RLock()
+        with _caches_lock:
+            _caches[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return default
+            stored, value = entry
+            if self.ttl is not None and time.time() - stored >= self.ttl:
+                self.expirations += 1
+                self.misses += 1
+                return default
+            # Re-insert as the most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time(), value)
+            while self.max_size is not None\
+                    and len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def get_or_set(self, key, value_method):
+        """
+        Return the cached value of `key`, or store and return
+        `value_method()`. Falsy values are returned but not stored.
+        """
+        value = self.get(key)
+        if value:
+            return value
+        value = value_method()
+        if value:
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_matching(self, key_test):
+        """
+        Remove every entry whose key passes `key_test(key)`, e.g. all the
+        entries of one provider. Returns the number of entries removed.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key_test(key)]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+def cache_stats():
+    """
+    Return {cache name: stats} for every LRUCache in this process.
+    """
+    with _caches_lock:
+        caches = list(_caches.values())
+    return dict((cache.name, cache.stats()) for cache in caches)
@@ -6,7 +6,7 @@ from django.db.models import Q
 from django.utils import timezone
 from threepio import logger
 from core.models import AccountProvider
-from core.models.credential import Credential
+from core.models.credential import load_project_identities
 from core.models import InstanceStatusHistory
 from core.models.instance import Instance as CoreInstance
 from core.models.instance import (
@@ -60,47 +60,49 @@ def _core_instances_for(identity, start_date=None):
 
 
 def _select_identities(provider, users=None):
+    identities = provider.identity_set.prefetch_related('credential_set')
     if users:
-        return provider.identity_set.filter(created_by__username__in=users)
-    return provider.identity_set.all()
+        return identities.filter(created_by__username__in=users)
+    return identities
 
 
-def _convert_tenant_id_to_names(instances, tenants):
+def _tenant_id_name_map(tenants):
+    """
+    Return {tenant_id: tenant_name} for tenant objects or dicts.
+    """
+    return dict(
+        (tenant['id'], tenant['name']) if type(tenant) == dict else
+        (tenant.id, tenant.name) for tenant in tenants
+    )
+
+
+def _convert_tenant_id_to_names(instances, tenants, tenant_names=None):
+    """
+    Replace each instance's owner (a tenant id) with the tenant's name.
+    Pass `tenant_names` ({tenant_id: tenant_name}) to re-use one map
+    across calls instead of building it from `tenants`.
+    """
+    if tenant_names is None:
+        tenant_names = _tenant_id_name_map(tenants)
     for i in instances:
-        for tenant in tenants:
-            if type(tenant) == dict:
-                if tenant['id'] == i.owner:
-                    i.owner = tenant['name']
-            else:
-                if tenant.id == i.owner:
-                    i.owner = tenant.name
+        i.owner = tenant_names.get(i.owner, i.owner)
     return instances
 
 
-def _get_identity_from_tenant_name(provider, username):
+def _get_identity_from_tenant_name(
+    provider, username, project_identities=None
+):
+    """
+    project_identities - {(provider_id, project_name): Identity} from
+    `load_project_identities`, to resolve many tenants with one query.
+    """
     # FIXME: This needs to be `username, tenant_name` because the `project_name` no longer has to match the `username`
-    try:
-        # NOTE: I could see this being a problem when 'user1' and 'user2' use
-        # TODO: Ideally we would be able to extract some more information
-        #      when we move away from explicit user-groups.
-        credential = Credential.objects.get(
-            Q(key='ex_project_name'),
-            value=username,
-            identity__provider=provider
-        )
-        identity = credential.identity
-        return identity
-    except Credential.MultipleObjectsReturned:
-        logger.warn(
-            "%s has >1 Credentials on Provider %s" % (username, provider)
-        )
-        credential = Credential.objects.filter(
-            key='ex_project_name', value=username, identity__provider=provider
-        )[0]
-        identity = credential.identity
-        return identity
-    except Credential.DoesNotExist:
-        return None
+    # NOTE: I could see this being a problem when 'user1' and 'user2' use
+    # TODO: Ideally we would be able to extract some more information
+    #      when we move away from explicit user-groups.
+    if project_identities is None:
+        project_identities = load_project_identities([provider], [username])
+    return project_identities.get((provider.id, username))
 
 
 def _execute_provider_action(identity, user, instance, action_name):
@@ -1,15 +1,58 @@
+import threading
+
 from threepio import logger
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
 from core.models import IdentityMembership, Identity
 from core.models.quota import (
     has_floating_ip_count_quota, has_port_count_quota, has_instance_count_quota,
     has_cpu_quota, has_mem_quota, has_storage_quota, has_storage_count_quota,
-    has_snapshot_count_quota
+    has_snapshot_count_quota, QuotaUsage
 )
 from service.cache import get_cached_driver
 from service.driver import get_account_driver
+from service.lru_cache import LRUCache
+
+# Keyed by identity uuid
+_quota_usage_cache = LRUCache(
+    'quota.usage',
+    max_size=getattr(settings, 'QUOTA_USAGE_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'QUOTA_USAGE_CACHE_TTL', 0)
+)
+_quota_usage_lock = threading.Lock()
+
+
+def get_quota_usage(identity, driver):
+    """
+    Return the QuotaUsage snapshot of `identity`.
+
+    When settings.QUOTA_USAGE_CACHE_TTL (seconds, default 0: disabled) is set,
+    a snapshot is re-used by this process until it expires, for at most
+    settings.QUOTA_USAGE_CACHE_SIZE identities. Resources granted while it is
+    cached are counted through `QuotaUsage.reserve`, until the launch or
+    create that reserved them is over (see `invalidate_quota_usage`).
+    """
+    if not _quota_usage_cache.ttl:
+        return QuotaUsage(driver, identity)
+    key = str(identity.uuid)
+    # One snapshot per identity, so that every reservation is counted on it
+    with _quota_usage_lock:
+        usage = _quota_usage_cache.get(key)
+        if usage is None:
+            usage = _quota_usage_cache.set(key, QuotaUsage(driver, identity))
+    return usage
+
+
+def invalidate_quota_usage(identity_uuid):
+    """
+    Forget the cached QuotaUsage of the identity, with its reservations, so
+    that the next check lists what the identity really uses. Called when a
+    launch or a volume/snapshot create is over, whether it failed or not,
+    and when an instance or volume is deleted.
+    """
+    _quota_usage_cache.invalidate(str(identity_uuid))
 
 
 def check_over_instance_quota(
@@ -48,13 +91,23 @@ def check_over_instance_quota(
         new_port += 1
     if include_networking:
         new_floating_ip += 1
+    usage = get_quota_usage(identity, driver)
     # Will throw ValidationError if false.
     try:
-        has_cpu_quota(driver, quota, new_cpu)
-        has_mem_quota(driver, quota, new_ram)
-        has_instance_count_quota(driver, quota, new_instance)
-        has_floating_ip_count_quota(driver, quota, new_floating_ip)
-        has_port_count_quota(identity, driver, quota, new_port)
+        has_cpu_quota(driver, quota, new_cpu, usage=usage)
+        has_mem_quota(driver, quota, new_ram, usage=usage)
+        has_instance_count_quota(driver, quota, new_instance, usage=usage)
+        has_floating_ip_count_quota(
+            driver, quota, new_floating_ip, usage=usage
+        )
+        has_port_count_quota(identity, driver, quota, new_port, usage=usage)
+        usage.reserve(
+            cpu=new_cpu,
+            memory=new_ram / 1024.0,
+            instances=new_instance,
+            ports=new_port,
+            floating_ips=new_floating_ip
+        )
         return True
     except ValidationError:
         if raise_exc:
@@ -96,11 +149,15 @@ def check_over_storage_quota(
 
     new_disk = new_volume_size
     new_volume = 1 if new_volume_size > 0 else 0
+    usage = get_quota_usage(identity, driver)
     # Will throw ValidationError if false.
     try:
-        has_storage_quota(driver, quota, new_disk)
-        has_storage_count_quota(driver, quota, new_volume)
-        has_snapshot_count_quota(driver, quota, new_snapshot)
+        has_storage_quota(driver, quota, new_disk, usage=usage)
+        has_storage_count_quota(driver, quota, new_volume, usage=usage)
+        has_snapshot_count_quota(driver, quota, new_snapshot, usage=usage)
+        usage.reserve(
+            storage=new_disk, volumes=new_volume, snapshots=new_snapshot
+        )
         return True
     except ValidationError:
         if raise_exc:
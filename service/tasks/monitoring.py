@@ -1,10 +1,15 @@
+import functools
+import time
 from datetime import timedelta
+from multiprocessing.pool import ThreadPool
 
 from django.conf import settings
+from django.db import connection as db_connection
 from django.db.models import Q, Count
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 
+from celery import chord
 from celery.decorators import task
 
 from core.plugins import MachineValidationPluginManager, AllocationSourcePluginManager, EnforcementOverrideChoice
@@ -12,28 +17,28 @@ from core.query import (
     contains_credential, only_current, only_current_source, source_in_range,
     inactive_versions
 )
-from core.models.group import Group
 from core.models.size import Size, convert_esh_size
 from core.models.volume import Volume, convert_esh_volume
-from core.models.instance import convert_esh_instance
+from core.models.instance import convert_esh_instances
 from core.models.provider import Provider
-from core.models.machine import convert_glance_image, ProviderMachine, ProviderMachineMembership
-from core.models.machine_request import MachineRequest
+from core.models.machine import convert_glance_image, ProviderMachine
 from core.models.application import Application, ApplicationMembership
 from core.models.allocation_source import AllocationSource
+from core.models.credential import (
+    load_project_identities, prefetch_credentials
+)
 from core.models.application_version import ApplicationVersion
 
-from service.machine import (
-    update_db_membership_for_group, update_cloud_membership_for_machine,
-    remove_membership
-)
+from service.machine import remove_membership
 from service.monitoring import (
     _cleanup_missing_instances, _get_instance_owner_map,
     _get_identity_from_tenant_name, allocation_source_overage_enforcement_for
 )
+from service.accounts.openstack_manager import ProjectDirectory
+from service.image_membership import sync_image_memberships
+from service.lru_cache import LRUCache, cache_stats
 from service.driver import get_account_driver
-from service.cache import get_cached_driver
-from service.exceptions import TimeoutError
+from service.cache import get_cached_driver, lease
 from rtwo.models.size import OSSize
 from rtwo.exceptions import GlanceConflict, GlanceForbidden
 from libcloud.common.exceptions import BaseHTTPError
@@ -71,6 +76,35 @@ def strfdate(datetime_o, fmt=None):
     return datetime_o.strftime(fmt)
 
 
+def provider_lease(resource):
+    """
+    Skip the decorated `monitor_<resource>_for(provider_id, ...)` while
+    another run holds the lease of (provider, resource), so overlapping
+    beats never monitor the same resources of a provider at once.
+    The lease expires after settings.MONITOR_LEASE_TTL seconds, in case
+    its holder is killed.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(provider_id, *args, **kwargs):
+            with lease(
+                "monitor.%s.%s" % (resource, provider_id),
+                getattr(settings, 'MONITOR_LEASE_TTL', 10 * 60)
+            ) as acquired:
+                if not acquired:
+                    celery_logger.info(
+                        "Skipped %s for Provider %s -- already running" %
+                        (method.__name__, provider_id)
+                    )
+                    return None
+                return method(provider_id, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 def tenant_id_to_name_map(account_driver):
     """
     INPUT: account driver
@@ -181,6 +215,7 @@ def monitor_machines():
 
 
 @task(name="monitor_machines_for")
+@provider_lease('machines')
 def monitor_machines_for(
     provider_id,
     limit_machines=[],
@@ -221,171 +256,66 @@ def monitor_machines_for(
             cm for cm in cloud_machines if cm.id in limit_machines
         ]
     db_machines = []
+    synced_machines = []
     # ASSERT: All non-end-dated machines in the DB can be found in the cloud
     # if you do not believe this is the case, you should call 'prune_machines_for'
     machine_validator = MachineValidationPluginManager.get_validator(
         account_driver
     )
+    # One Keystone listing for every project lookup of this cycle
+    project_directory = ProjectDirectory(account_driver)
     for cloud_machine in cloud_machines:
         if validate and not machine_validator.machine_is_valid(cloud_machine):
             continue
         owner = cloud_machine.get('owner')
         if owner:
-            owner_project = account_driver.get_project_by_id(owner)
+            owner_project = project_directory.get_by_id(owner)
         else:
             owner = cloud_machine.get('application_owner')
-            owner_project = account_driver.get_project(owner)
+            owner_project = project_directory.get_by_name(owner)
         #STEP 1: Get the application, version, and provider_machine registered in Atmosphere
         (db_machine, created) = convert_glance_image(
-            account_driver, cloud_machine, provider.uuid, owner_project
+            account_driver,
+            cloud_machine,
+            provider.uuid,
+            owner_project,
+            project_directory=project_directory
         )
         if not db_machine:
             continue
         db_machines.append(db_machine)
-        #STEP 2: For any private cloud_machine, convert the 'shared users' as known by cloud
-        #        into DB relationships: ApplicationVersionMembership, ProviderMachineMembership
-        update_image_membership(account_driver, cloud_machine, db_machine)
-
-        # STEP 3: if ENFORCING -- occasionally 're-distribute' any ACLs that
-        # are *listed on DB but not on cloud* -- removals should be done
-        # explicitly, outside of this function
-        if settings.ENFORCING:
-            distribute_image_membership(account_driver, cloud_machine, provider)
-
-        # ASSERTIONS about this method:
-        # 1) We will never 'remove' membership,
-        # 2) We will never 'remove' a public or private flag as listed in application.
-        # 2b) Future: Individual versions/machines as described by relationships above dictate whats shown in the application.
-
-    if print_logs:
-        _exit_stdout_logging(console_handler)
-    return db_machines
-
-
-def distribute_image_membership(account_driver, cloud_machine, provider):
-    """
-    Based on what we know about the DB, at a minimum, ensure that their projects are added to the image_members list for this cloud_machine.
-    """
-    pm = ProviderMachine.objects.get(
-        instance_source__provider=provider,
-        instance_source__identifier=cloud_machine.id
+        synced_machines.append((cloud_machine, db_machine))
+
+    #STEP 2: For any private cloud_machine, convert the 'shared users' as known by cloud
+    #        into DB relationships: ApplicationVersionMembership, ProviderMachineMembership
+    # STEP 3: if ENFORCING -- 're-distribute' any ACLs that
+    # are *listed on DB but not on cloud* -- removals should be done
+    # explicitly, outside of this function
+    # Both steps diff every image at once, see service.image_membership
+    membership_changes = sync_image_memberships(
+        account_driver,
+        provider,
+        synced_machines,
+        project_directory=project_directory,
+        dry_run=dry_run
     )
-    group_ids = ProviderMachineMembership.objects.filter(provider_machine=pm
-                                                        ).values_list(
-                                                            'group', flat=True
-                                                        )
-    groups = Group.objects.filter(id__in=group_ids)
-    for group in groups:
-        try:
-            celery_logger.info(
-                "Add %s to cloud membership for %s" % (group, pm)
-            )
-            update_cloud_membership_for_machine(pm, group)
-        except TimeoutError:
-            celery_logger.warn(
-                "Failed to add cloud membership for %s - Operation timed out" %
-                group
-            )
-    return groups
-
 
-def _get_all_access_list(account_driver, db_machine, cloud_machine):
-    """
-    Input: AccountDriver, ProviderMachine, glance_image
-    Output: A list of _all project names_ that should be included on `cloud_machine`
-
-    This list will include:
-    - Users who match the provider_machine's application.access_list
-    - Users who are already approved to use the `cloud_machine`
-    - The owner of the application/Creator of the MachineRequest
-    - If using settings.REPLICATION_PROVIDER:
-      - include all those approved on the replication provider's copy of the image
-    """
-    #TODO: In a future update to 'imaging' we might image 'as the user' rather than 'as the admin user', in this case we should just use 'owner' metadata
-
-    image_owner = cloud_machine.get('application_owner')
-    # NOTE: This assumes that the 'owner' (atmosphere user) == 'project_name' (Openstack)
-    # Always include the original application owner
-    owner_set = set()
-    if image_owner:
-        owner_set.add(image_owner)
+    # ASSERTIONS about this method:
+    # 1) We will never 'remove' membership,
+    # 2) We will never 'remove' a public or private flag as listed in application.
+    # 2b) Future: Individual versions/machines as described by relationships above dictate whats shown in the application.
 
-    if hasattr(cloud_machine, 'id'):
-        image_id = cloud_machine.id
-    elif type(cloud_machine) == dict:
-        image_id = cloud_machine.get('id')
-    else:
-        raise ValueError("Unexpected cloud_machine: %s" % cloud_machine)
-
-    existing_members = account_driver.get_image_members(image_id, None)
-    # Extend to include based on projects already granted access to the image
-    cloud_shared_set = {p.name for p in existing_members}
-
-    has_machine_request = MachineRequest.objects.filter(
-        new_machine__instance_source__identifier=cloud_machine.id,
-        status__name='completed'
-    ).last()
-    machine_request_set = set()
-    if has_machine_request:
-        access_list = has_machine_request.get_access_list()
-        # NOTE: This assumes that every name in
-        #      accesslist (AtmosphereUser) == project_name(Openstack)
-        machine_request_set = {name.strip() for name in access_list}
-
-    # Extend to include new names found by application pattern_match
-    parent_app = db_machine.application_version.application
-    access_list_set = set(
-        parent_app.get_users_from_access_list().values_list(
-            'username', flat=True
+    celery_logger.info(
+        "monitor_machines_for %s: %s images, memberships %s, "
+        "project directory %s" % (
+            provider, len(cloud_machines), membership_changes,
+            project_directory.stats()
         )
     )
-    shared_project_names = list(
-        owner_set | cloud_shared_set | machine_request_set | access_list_set
-    )
-    return shared_project_names
-
-
-def update_image_membership(account_driver, cloud_machine, db_machine):
-    """
-    Given a cloud_machine and db_machine, create any relationships possible for ProviderMachineMembership and ApplicationVersionMembership
-    Return a list of all group names who have been given share access.
-    """
-    image_visibility = cloud_machine.get('visibility', 'private')
-    if image_visibility.lower() == 'public':
-        return
-    shared_project_names = _get_all_access_list(
-        account_driver, db_machine, cloud_machine
-    )
-
-    #Future-FIXME: This logic expects project_name == Group.name
-    #       When this changes, logic should update to include checks for:
-    #       - Lookup Identities with this project_name
-    #       - Share with group that has IdentityMembership
-    #       - Alternatively, consider changing ProviderMachineMembership
-    #       to point to Identity for a 1-to-1 mapping.
-    groups = Group.objects.filter(name__in=shared_project_names)
-
-    # THIS IS A HACK - some images have been 'compromised' in this event,
-    # reset the access list _back_ to the last-known-good configuration, based
-    # on a machine request.
-    has_machine_request = MachineRequest.objects.filter(
-        new_machine__instance_source__identifier=cloud_machine.id,
-        status__name='completed'
-    ).last()
-    parent_app = db_machine.application_version.application
-    if len(shared_project_names) > 128:
-        celery_logger.warn(
-            "Application %s has too many shared users. Consider running 'prune_machines' to cleanup",
-            parent_app
-        )
-        if not has_machine_request:
-            return
-        access_list = has_machine_request.get_access_list()
-        shared_project_names = access_list
-    #ENDHACK
-    for group in groups:
-        update_db_membership_for_group(db_machine, group)
-    return groups
+    celery_logger.debug("In-process caches: %s" % cache_stats())
+    if print_logs:
+        _exit_stdout_logging(console_handler)
+    return db_machines
 
 
 def remove_machine(db_machine, now_time=None, dry_run=False):
@@ -430,42 +360,70 @@ def remove_machine(db_machine, now_time=None, dry_run=False):
     return True
 
 
-def memoized_image(account_driver, db_machine, image_maps={}):
+# Bounded and expiring, since workers live for weeks: a cached image or
+# driver (and its token) must not outlive its usefulness.
+_image_cache = LRUCache(
+    'monitoring.images',
+    max_size=getattr(settings, 'MONITORING_IMAGE_CACHE_SIZE', 2048),
+    ttl=getattr(settings, 'MONITORING_CACHE_TTL', 3600)
+)
+_account_driver_cache = LRUCache(
+    'monitoring.account_drivers',
+    max_size=getattr(settings, 'MONITORING_DRIVER_CACHE_SIZE', 64),
+    ttl=getattr(settings, 'MONITORING_CACHE_TTL', 3600)
+)
+_tenant_name_map_cache = LRUCache(
+    'monitoring.tenant_name_maps',
+    max_size=getattr(settings, 'MONITORING_DRIVER_CACHE_SIZE', 64),
+    ttl=getattr(settings, 'MONITORING_CACHE_TTL', 3600)
+)
+
+
+def invalidate_monitoring_caches(provider):
+    """
+    Forget every image, account driver and tenant map cached for `provider`.
+    """
+    _image_cache.invalidate_matching(lambda key: key[0] == provider)
+    _account_driver_cache.invalidate(provider)
+    _tenant_name_map_cache.invalidate(provider)
+
+
+def memoized_image(account_driver, db_machine):
     provider = db_machine.instance_source.provider
     identifier = db_machine.instance_source.identifier
-    cloud_machine = image_maps.get((provider, identifier))
-    # Return memoized result
-    if cloud_machine:
-        return cloud_machine
-    # Retrieve and remember
-    cloud_machine = account_driver.get_image(identifier)
-    image_maps[(provider, identifier)] = cloud_machine
-    return cloud_machine
+    return _image_cache.get_or_set(
+        (provider, identifier),
+        lambda: account_driver.get_image(identifier)
+    )
 
 
-def memoized_driver(machine, account_drivers={}):
+def memoized_driver(machine):
     provider = machine.instance_source.provider
-    account_driver = account_drivers.get(provider)
+    account_driver = _account_driver_cache.get_or_set(
+        provider, lambda: get_account_driver(provider)
+    )
     if not account_driver:
-        account_driver = get_account_driver(provider)
-        if not account_driver:
-            raise Exception(
-                "Cannot instantiate an account driver for %s" % provider
-            )
-        account_drivers[provider] = account_driver
+        raise Exception(
+            "Cannot instantiate an account driver for %s" % provider
+        )
     return account_driver
 
 
-def memoized_tenant_name_map(account_driver, tenant_list_maps={}):
-    tenant_id_name_map = tenant_list_maps.get(account_driver.core_provider)
-    if not tenant_id_name_map:
-        tenant_id_name_map = tenant_id_to_name_map(account_driver)
-        tenant_list_maps[account_driver.core_provider] = tenant_id_name_map
-
-    return tenant_id_name_map
+def memoized_tenant_name_map(account_driver):
+    return _tenant_name_map_cache.get_or_set(
+        account_driver.core_provider,
+        lambda: tenant_id_to_name_map(account_driver)
+    )
 
 
-def get_current_members(account_driver, machine, tenant_id_name_map):
+def get_current_members(
+    account_driver, machine, tenant_id_name_map=None, project_directory=None
+):
+    """
+    Return the names of the tenants `machine` is shared with, resolved
+    through `project_directory` (a ProjectDirectory) or, failing that,
+    `tenant_id_name_map` ({tenant_id: tenant_name}).
+    """
     current_membership = account_driver.image_manager.shared_images_for(
         image_id=machine.identifier
     )
@@ -473,7 +431,11 @@ def get_current_members(account_driver, machine, tenant_id_name_map):
     current_tenants = []
     for membership in current_membership:
         tenant_id = membership.member_id
-        tenant_name = tenant_id_name_map.get(tenant_id)
+        if project_directory is not None:
+            project = project_directory.get_by_id(tenant_id)
+            tenant_name = project.name if project else None
+        else:
+            tenant_name = tenant_id_name_map.get(tenant_id)
         if tenant_name:
             current_tenants.append(tenant_name)
     return current_tenants
@@ -512,25 +474,82 @@ def monitor_resources():
 def monitor_resources_for(provider_id, users=None, print_logs=False):
     """
     Run the set of tasks related to monitoring all cloud resources for a provider.
+
+    Sizes, volumes, machines and instances are monitored concurrently.
+    Machines are monitored on the calling thread: sharing an image times
+    out with SIGALRM (see `timeout_after`), which only works on the main
+    thread. The other phases run on a thread each. Each phase holds the
+    lease of its resource (see `provider_lease`): a phase that is already
+    running for this provider is skipped, and a phase that fails does not
+    stop the others.
+    Returns the result of each phase, and each phase's duration under
+    'durations'.
     """
-    resources = {}
-    sizes = monitor_sizes_for(provider_id, print_logs=print_logs)
-    volumes = monitor_volumes_for(provider_id, print_logs=print_logs)
-    machines = monitor_machines_for(provider_id, print_logs=print_logs)
-    instances = monitor_instances_for(
-        provider_id, users=users, print_logs=print_logs
+    phases = {
+        'sizes': lambda: monitor_sizes_for(provider_id, print_logs=print_logs),
+        'volumes':
+            lambda: monitor_volumes_for(provider_id, print_logs=print_logs),
+        'instances': lambda: monitor_instances_for(
+            provider_id, users=users, print_logs=print_logs
+        ),
+    }
+    started = time.time()
+    pool = ThreadPool(len(phases))
+    try:
+        pooled_results = pool.map_async(
+            lambda name: _run_monitor_phase(provider_id, name, phases[name]),
+            sorted(phases.keys())
+        )
+        results = [
+            _run_monitor_phase(
+                provider_id,
+                'machines',
+                lambda: monitor_machines_for(
+                    provider_id, print_logs=print_logs
+                ),
+                close_connection=False
+            )
+        ] + pooled_results.get()
+    finally:
+        pool.close()
+        pool.join()
+    results.sort(key=lambda result: result[0])
+    resources = dict((name, result) for name, result, _ in results)
+    resources['durations'] = dict(
+        (name, duration) for name, _, duration in results
     )
-    resources.update(
-        {
-            'instances': instances,
-            'machines': machines,
-            'sizes': sizes,
-            'volumes': volumes,
-        }
+    celery_logger.info(
+        "monitor_resources_for Provider %s in %.2fs (%s)" % (
+            provider_id, time.time() - started, ", ".join(
+                "%s: %.2fs" % (name, duration)
+                for name, _, duration in results
+            )
+        )
     )
     return resources
 
 
+def _run_monitor_phase(provider_id, name, phase, close_connection=True):
+    """
+    Return (name, result, duration) of one phase of `monitor_resources_for`.
+    close_connection - Close the database connection of this thread once
+        the phase is done, for phases run on a pool thread.
+    """
+    started = time.time()
+    result = None
+    try:
+        result = phase()
+    except Exception:
+        celery_logger.exception(
+            "monitor_resources_for Provider %s: %s failed" % (provider_id, name)
+        )
+    finally:
+        if close_connection:
+            # Each pool thread opened its own database connection
+            db_connection.close()
+    return name, result, time.time() - started
+
+
 @task(name="monitor_instances")
 def monitor_instances():
     """
@@ -628,42 +647,135 @@ def allocation_source_overage_enforcement_for_user(allocation_source, user):
 
 
 @task(name="monitor_instances_for")
+@provider_lease('instances')
 def monitor_instances_for(
-    provider_id, users=None, print_logs=False, start_date=None, end_date=None
+    provider_id,
+    users=None,
+    print_logs=False,
+    start_date=None,
+    end_date=None,
+    fan_out=None
 ):
     """
     Run the set of tasks related to monitoring instances for a provider.
     Optionally, provide a list of usernames to monitor
     While debugging, print_logs=True can be very helpful.
     start_date and end_date allow you to search a 'non-standard' window of time.
+
+    The provider-wide instance list is fetched once, then tenants are
+    processed according to `fan_out` (default: settings.MONITOR_INSTANCES_FAN_OUT):
+    - None: one tenant after another, in this task.
+    - 'threads': shards of tenants on a bounded thread pool, in this task.
+    - 'celery': one `monitor_instances_for_tenants` subtask per shard, in a
+      chord, so the cycle time scales with the number of workers.
     """
     provider = Provider.objects.get(id=provider_id)
 
     # For now, lets just ignore everything that isn't openstack.
     if 'openstack' not in provider.type.name.lower():
         return
+    cycle_started = time.time()
     instance_map = _get_instance_owner_map(provider, users=users)
 
-    if print_logs:
-        console_handler = _init_stdout_logging()
-    seen_instances = []
-    # DEVNOTE: Potential slowdown running multiple functions
-    # Break this out when instance-caching is enabled
     if not settings.ENFORCING:
         celery_logger.debug('Settings dictate allocations are NOT enforced')
-    for tenant_name in sorted(instance_map.keys()):
-        running_instances = instance_map[tenant_name]
-        identity = _get_identity_from_tenant_name(provider, tenant_name)
+    if fan_out is None:
+        fan_out = getattr(settings, 'MONITOR_INSTANCES_FAN_OUT', None)
+    shards = _shard_tenants(instance_map)
+    if fan_out == 'celery':
+        chord(
+            monitor_instances_for_tenants.s(provider_id, shard)
+            for shard in shards
+        )(monitor_instances_for_complete.s(provider_id, cycle_started))
+        return
+
+    if print_logs:
+        console_handler = _init_stdout_logging()
+    if fan_out == 'threads':
+        pool = ThreadPool(
+            min(
+                len(shards) or 1,
+                getattr(settings, 'MONITOR_INSTANCES_THREADS', 8)
+            )
+        )
+        try:
+            timings = pool.map(
+                lambda shard: _monitor_tenants_in_thread(provider, shard),
+                shards
+            )
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        timings = [_monitor_tenants(provider, instance_map)]
+    _log_monitor_instances_cycle(provider_id, timings, cycle_started)
+    if print_logs:
+        _exit_stdout_logging(console_handler)
+    # return seen_instances  NOTE: this has been commented out to avoid PicklingError!
+    # TODO: Uncomment the above, Determine what _we can return_ and return that instead....
+    return
+
+
+@task(name="monitor_instances_for_tenants")
+def monitor_instances_for_tenants(provider_id, tenant_instance_map):
+    """
+    Monitor one shard of a provider's tenants.
+    `tenant_instance_map` maps tenant name to that tenant's cloud instances.
+    """
+    provider = Provider.objects.get(id=provider_id)
+    return _monitor_tenants(provider, tenant_instance_map)
+
+
+@task(name="monitor_instances_for_complete")
+def monitor_instances_for_complete(timings, provider_id, cycle_started):
+    """
+    Chord callback for `monitor_instances_for`, recording the cycle time.
+    """
+    _log_monitor_instances_cycle(provider_id, timings, cycle_started)
+
+
+def _shard_tenants(instance_map, shard_size=None):
+    """
+    Split {tenant_name: instances} into a list of smaller maps of at most
+    `shard_size` (default: settings.MONITOR_INSTANCES_SHARD_SIZE) tenants.
+    """
+    if not shard_size:
+        shard_size = getattr(settings, 'MONITOR_INSTANCES_SHARD_SIZE', 50)
+    tenant_names = sorted(instance_map.keys())
+    return [
+        dict(
+            (tenant_name, instance_map[tenant_name])
+            for tenant_name in tenant_names[index:index + shard_size]
+        ) for index in range(0, len(tenant_names), shard_size)
+    ]
+
+
+def _monitor_tenants(provider, tenant_instance_map):
+    """
+    Convert the running instances of each tenant, then cleanup the instances
+    that are missing from the cloud.
+    Returns the timing of this shard.
+    """
+    started = time.time()
+    instance_count = 0
+    # The identity of every tenant, and their credentials, in a few queries
+    project_identities = load_project_identities(
+        [provider], tenant_instance_map.keys()
+    )
+    prefetch_credentials(project_identities.values())
+    for tenant_name in sorted(tenant_instance_map.keys()):
+        running_instances = tenant_instance_map[tenant_name]
+        identity = _get_identity_from_tenant_name(
+            provider, tenant_name, project_identities
+        )
         if identity and running_instances:
             try:
                 driver = get_cached_driver(identity=identity)
-                core_running_instances = [
-                    convert_esh_instance(
-                        driver, inst, identity.provider.uuid, identity.uuid,
-                        identity.created_by
-                    ) for inst in running_instances
-                ]
-                seen_instances.extend(core_running_instances)
+                core_running_instances = convert_esh_instances(
+                    driver, running_instances, identity.provider.uuid,
+                    identity.uuid, identity.created_by
+                )
+                instance_count += len(core_running_instances)
             except Exception:
                 celery_logger.exception(
                     "Could not convert running instances for %s" % tenant_name
@@ -673,12 +785,44 @@ def monitor_instances_for(
             # No running instances.
             core_running_instances = []
         # Using the 'known' list of running instances, cleanup the DB
-        _cleanup_missing_instances(identity, core_running_instances)
-    if print_logs:
-        _exit_stdout_logging(console_handler)
-    # return seen_instances  NOTE: this has been commented out to avoid PicklingError!
-    # TODO: Uncomment the above, Determine what _we can return_ and return that instead....
-    return
+        try:
+            _cleanup_missing_instances(identity, core_running_instances)
+        except Exception:
+            celery_logger.exception(
+                "Could not cleanup missing instances for %s" % tenant_name
+            )
+    timing = {
+        'tenants': len(tenant_instance_map),
+        'instances': instance_count,
+        'duration': time.time() - started
+    }
+    celery_logger.info(
+        "monitor_instances_for %s: %s tenants (%s instances) in %.2fs" %
+        (provider, timing['tenants'], timing['instances'], timing['duration'])
+    )
+    return timing
+
+
+def _monitor_tenants_in_thread(provider, tenant_instance_map):
+    try:
+        return _monitor_tenants(provider, tenant_instance_map)
+    finally:
+        # Each thread opened its own database connection
+        db_connection.close()
+
+
+def _log_monitor_instances_cycle(provider_id, timings, cycle_started):
+    timings = [timing for timing in timings if timing]
+    celery_logger.info(
+        "monitor_instances_for Provider %s: %s shards, %s tenants, "
+        "%s instances in %.2fs (slowest shard: %.2fs)" % (
+            provider_id, len(timings),
+            sum(timing['tenants'] for timing in timings),
+            sum(timing['instances'] for timing in timings),
+            time.time() - cycle_started,
+            max([timing['duration'] for timing in timings] or [0])
+        )
+    )
 
 
 @task(name="monitor_volumes")
@@ -691,6 +835,7 @@ def monitor_volumes():
 
 
 @task(name="monitor_volumes_for")
+@provider_lease('volumes')
 def monitor_volumes_for(provider_id, print_logs=False):
     """
     Run the set of tasks related to monitoring sizes for a provider.
@@ -773,6 +918,7 @@ def monitor_sizes():
 
 
 @task(name="monitor_sizes_for")
+@provider_lease('sizes')
 def monitor_sizes_for(provider_id, print_logs=False):
     """
     Run the set of tasks related to monitoring sizes for a provider.
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from dateutil.parser import parse
+from django.test import TestCase
+
+from api.tests.factories import (
+    AllocationSourceFactory, InstanceFactory, InstanceHistoryFactory,
+    InstanceStatusFactory, SizeFactory
+)
+from core.models import EventTable
+from core.models.allocation_source import total_usage
+from service.allocation_ledger import advance_usage_ledgers
+
+
+class AllocationLedgerTest(TestCase):
+    def setUp(self):
+        self.start = parse('2017-10-01T00:00+00:00')
+        self.allocation_source = AllocationSourceFactory.create(
+            name='TG-LEDGER'
+        )
+        self.instance = InstanceFactory.create(start_date=self.start)
+        self.user = self.instance.created_by
+        active = InstanceStatusFactory.create(name='active')
+        suspended = InstanceStatusFactory.create(name='suspended')
+        size = SizeFactory.create(cpu=2)
+        EventTable.objects.create(
+            name='instance_allocation_source_changed',
+            entity_id=self.user.username,
+            payload={
+                'instance_id': self.instance.provider_alias,
+                'allocation_source_name': self.allocation_source.name
+            },
+            timestamp=self.start
+        )
+        InstanceHistoryFactory.create(
+            instance=self.instance,
+            size=size,
+            status=active,
+            start_date=self.start,
+            end_date=self.start + timedelta(hours=10)
+        )
+        InstanceHistoryFactory.create(
+            instance=self.instance,
+            size=size,
+            status=suspended,
+            start_date=self.start + timedelta(hours=10),
+            end_date=self.start + timedelta(hours=12)
+        )
+        InstanceHistoryFactory.create(
+            instance=self.instance,
+            size=size,
+            status=active,
+            start_date=self.start + timedelta(hours=12)
+        )
+
+    def _ledger_usage(self, end_date, rebuild=False):
+        usage = advance_usage_ledgers(
+            {
+                self.allocation_source: self.start
+            }, end_date, rebuild=rebuild
+        )
+        return usage[self.allocation_source.name][self.user.username]
+
+    def test_incremental_matches_full_report(self):
+        for hours in [5, 11, 20, 30]:
+            end_date = self.start + timedelta(hours=hours)
+            compute_used, burn_rate = self._ledger_usage(end_date)
+            self.assertEqual(
+                compute_used,
+                total_usage(
+                    self.user.username,
+                    self.start,
+                    allocation_source_name=self.allocation_source.name,
+                    end_date=end_date
+                )
+            )
+        self.assertEqual(compute_used, 56.0)
+        self.assertEqual(burn_rate, 1)
+
+    def test_same_window_is_charged_once(self):
+        end_date = self.start + timedelta(hours=20)
+        self.assertEqual(self._ledger_usage(end_date), (36.0, 1))
+        # An overlapping run over the same window finds the mark moved
+        self.assertEqual(self._ledger_usage(end_date), (36.0, 1))
+        self.assertEqual(
+            self._ledger_usage(self.start + timedelta(hours=30)), (56.0, 1)
+        )
+
+    def test_older_end_date_keeps_ledger(self):
+        self._ledger_usage(self.start + timedelta(hours=30))
+        # A slower run with an earlier end date does not rewind the ledger
+        compute_used, _ = self._ledger_usage(self.start + timedelta(hours=5))
+        self.assertEqual(compute_used, 56.0)
+
+    def test_rebuild_rewinds_ledger(self):
+        self._ledger_usage(self.start + timedelta(hours=30))
+        compute_used, _ = self._ledger_usage(
+            self.start + timedelta(hours=5), rebuild=True
+        )
+        self.assertEqual(compute_used, 10.0)
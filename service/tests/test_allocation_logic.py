@@ -0,0 +1,252 @@
+from datetime import timedelta
+
+import mock
+from dateutil.parser import parse
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.factories import (
+    AllocationSourceFactory, InstanceFactory, InstanceHistoryFactory,
+    InstanceStatusFactory, SizeFactory
+)
+from core.models import EventTable
+from core.models.allocation_source import total_usage
+from service.allocation_logic import (
+    create_bulk_report, create_report, generate_data, window_usage
+)
+
+
+class BulkReportTest(TestCase):
+    def setUp(self):
+        self.start = parse('2017-10-01T00:00+00:00')
+        self.allocation_source = AllocationSourceFactory.create(
+            name='TG-BULK'
+        )
+        self.active = InstanceStatusFactory.create(name='active')
+        self.instances = [
+            self._create_instance(cpu=1, hours=None),
+            self._create_instance(cpu=4, hours=3),
+        ]
+
+    def _create_instance(self, cpu, hours):
+        instance = InstanceFactory.create(start_date=self.start)
+        EventTable.objects.create(
+            name='instance_allocation_source_changed',
+            entity_id=instance.created_by.username,
+            payload={
+                'instance_id': instance.provider_alias,
+                'allocation_source_name': self.allocation_source.name
+            },
+            timestamp=self.start
+        )
+        InstanceHistoryFactory.create(
+            instance=instance,
+            size=SizeFactory.create(cpu=cpu),
+            status=self.active,
+            start_date=self.start,
+            end_date=self.start + timedelta(hours=hours) if hours else None
+        )
+        return instance
+
+    def test_bulk_report_matches_per_user_report(self):
+        end_date = self.start + timedelta(hours=10)
+        report = create_bulk_report(self.start, end_date)
+        for instance in self.instances:
+            username = instance.created_by.username
+            compute_used, burn_rate = total_usage(
+                username,
+                self.start,
+                allocation_source_name=self.allocation_source.name,
+                end_date=end_date,
+                burn_rate=True
+            )
+            usage = report[(username, self.allocation_source.name)]
+            self.assertEqual(usage['compute_used'], compute_used)
+        self.assertEqual(
+            report[(self.instances[0].created_by.username,
+                    self.allocation_source.name)],
+            {
+                'compute_used': 10.0,
+                'burn_rate': 1
+            }
+        )
+        self.assertEqual(
+            report[(self.instances[1].created_by.username,
+                    self.allocation_source.name)],
+            {
+                'compute_used': 12.0,
+                'burn_rate': 0
+            }
+        )
+
+    def test_window_usage_matches_per_window_report(self):
+        end_date = self.start + timedelta(hours=10)
+        windows = [
+            (
+                instance.created_by.username, self.allocation_source.name,
+                self.start + timedelta(hours=offset),
+                end_date - timedelta(hours=1)
+            ) for instance in self.instances for offset in (0, 2)
+        ]
+        usage = window_usage(windows)
+        for window in windows:
+            username, allocation_source_name, start_date, window_end = window
+            self.assertEqual(
+                usage[window],
+                total_usage(
+                    username,
+                    start_date,
+                    allocation_source_name=allocation_source_name,
+                    end_date=window_end
+                )
+            )
+        # 4 cpus for the first 3 hours, 1 of them after the window starts
+        self.assertEqual(usage[windows[3]], 4.0)
+
+    def test_window_usage_buckets_windows_by_start_date(self):
+        end_date = self.start + timedelta(hours=10)
+        # A first window, from long before the others
+        first_window = (
+            self.instances[0].created_by.username,
+            self.allocation_source.name, self.start - timedelta(days=30),
+            end_date
+        )
+        windows = [first_window] + [
+            (
+                self.instances[1].created_by.username,
+                self.allocation_source.name,
+                self.start + timedelta(hours=offset), end_date
+            ) for offset in (1, 2)
+        ]
+        with mock.patch(
+            'service.allocation_logic.generate_data', wraps=generate_data
+        ) as report:
+            usage = window_usage(windows)
+        self.assertEqual(
+            [(args, kwargs['username']) for args, kwargs in report.call_args_list],
+            [
+                (
+                    (self.start - timedelta(days=30), end_date),
+                    self.instances[0].created_by.username
+                ),
+                (
+                    (self.start + timedelta(hours=1), end_date),
+                    self.instances[1].created_by.username
+                ),
+            ]
+        )
+        self.assertEqual(
+            [usage[window] for window in windows], [10.0, 8.0, 4.0]
+        )
+
+
+class ReportQueryCountTest(TestCase):
+    # Queries made by a report, no matter how many histories or instances
+    # it covers
+    MAX_QUERIES = 6
+
+    def setUp(self):
+        self.start = parse('2017-10-01T00:00+00:00')
+        self.allocation_source = AllocationSourceFactory.create(
+            name='TG-QUERIES'
+        )
+        self.instance = self._create_instance()
+        self.statuses = [
+            InstanceStatusFactory.create(name='active'),
+            InstanceStatusFactory.create(name='suspended')
+        ]
+
+    def _create_instance(self, created_by=None):
+        instance = InstanceFactory.create(start_date=self.start)
+        if created_by:
+            instance.created_by = created_by
+            instance.save()
+        EventTable.objects.create(
+            name='instance_allocation_source_changed',
+            entity_id=instance.created_by.username,
+            payload={
+                'instance_id': instance.provider_alias,
+                'allocation_source_name': self.allocation_source.name
+            },
+            timestamp=self.start - timedelta(days=1)
+        )
+        return instance
+
+    def _add_histories(self, count, offset=0, instance=None):
+        for hour in range(offset, offset + count):
+            InstanceHistoryFactory.create(
+                instance=instance or self.instance,
+                size=SizeFactory.create(cpu=1 + hour % 4),
+                status=self.statuses[hour % 2],
+                start_date=self.start + timedelta(hours=hour),
+                end_date=self.start + timedelta(hours=hour + 1)
+            )
+
+    def _report_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            rows = create_report(
+                self.start,
+                self.start + timedelta(days=7),
+                user_id=self.instance.created_by.username
+            )
+        return rows, len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self._add_histories(4)
+        rows, queries = self._report_queries()
+        self.assertEqual(len(rows), 4)
+        self.assertLessEqual(queries, self.MAX_QUERIES)
+
+        self._add_histories(40, offset=4)
+        rows, more_queries = self._report_queries()
+        self.assertEqual(len(rows), 44)
+        self.assertEqual(more_queries, queries)
+
+    def test_query_count_does_not_grow_with_instances(self):
+        self._add_histories(4)
+        rows, queries = self._report_queries()
+        self.assertLessEqual(queries, self.MAX_QUERIES)
+
+        for _ in range(5):
+            instance = self._create_instance(
+                created_by=self.instance.created_by
+            )
+            self._add_histories(4, instance=instance)
+        rows, more_queries = self._report_queries()
+        self.assertEqual(len(rows), 24)
+        self.assertEqual(more_queries, queries)
+        self.assertEqual(
+            set(row['allocation_source'] for row in rows),
+            set([self.allocation_source.name])
+        )
+
+    def test_latest_event_before_window_is_in_effect(self):
+        self._add_histories(2)
+        EventTable.objects.create(
+            name='instance_allocation_source_changed',
+            entity_id=self.instance.created_by.username,
+            payload={
+                'instance_id': self.instance.provider_alias,
+                'allocation_source_name': 'TG-OLDER'
+            },
+            timestamp=self.start - timedelta(days=2)
+        )
+        # Events of instances outside the report are not fetched
+        other_instance = self._create_instance()
+        with CaptureQueriesContext(connection) as context:
+            rows = create_report(
+                self.start,
+                self.start + timedelta(days=7),
+                user_id=self.instance.created_by.username
+            )
+        self.assertEqual(
+            set(row['allocation_source'] for row in rows),
+            set([self.allocation_source.name])
+        )
+        earlier_event_sql = [
+            query['sql'] for query in context.captured_queries
+            if 'DISTINCT ON' in query['sql']
+        ]
+        self.assertEqual(len(earlier_event_sql), 1)
+        self.assertNotIn(other_instance.provider_alias, earlier_event_sql[0])
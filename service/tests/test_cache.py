@@ -0,0 +1,176 @@
+import threading
+
+import mock
+from django.test import SimpleTestCase, override_settings
+
+from service.cache import (
+    _get_cached, _instances_keys, invalidate_cached_instances
+)
+
+
+class FakeRedis(object):
+    """
+    The subset of StrictRedis used by service.cache, kept in a dict.
+    Expiry is ignored.
+    """
+
+    def __init__(self):
+        self.keys = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def mget(self, keys):
+        return [self.keys.get(key) for key in keys]
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = value
+        return True
+
+    def setex(self, key, ttl, value):
+        self.keys[key] = value
+        return True
+
+    def setnx(self, key, value):
+        return self.set(key, value, nx=True)
+
+    def incr(self, key):
+        self.keys[key] = int(self.keys.get(key, 0)) + 1
+        return self.keys[key]
+
+    def delete(self, key):
+        return int(self.keys.pop(key, None) is not None)
+
+    def expire(self, key, ttl):
+        return key in self.keys
+
+    def hgetall(self, key):
+        return dict(self.keys.get(key, {}))
+
+    def hmset(self, key, mapping):
+        self.keys.setdefault(key, {}).update(mapping)
+        return True
+
+
+class FakePipeline(object):
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+
+        return command
+
+    def execute(self):
+        results = [
+            getattr(self.redis, name)(*args, **kwargs)
+            for name, args, kwargs in self.commands
+        ]
+        self.commands = []
+        return results
+
+
+def _identity(identity_id, provider_id=1):
+    return mock.Mock(
+        id=identity_id,
+        provider_id=provider_id,
+        created_by=mock.Mock(username='user%s' % identity_id)
+    )
+
+
+@override_settings(INSTANCE_CACHE_TTL=30, INSTANCE_CACHE_STALE_TTL=300)
+class InstanceCacheTest(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch(
+            'service.cache.redis_connection', return_value=FakeRedis()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_instances(self, instances, provider=None, identity=None):
+        """
+        Return (cached listing, number of times the cloud was listed).
+        """
+        data_method = mock.Mock(side_effect=lambda: list(instances))
+        key, generation_keys = _instances_keys(provider, identity)
+        data = _get_cached(
+            key,
+            generation_keys,
+            data_method,
+            lambda data: None,
+            id_method=lambda instance: instance['id']
+        )
+        return data, data_method.call_count
+
+    def test_miss_then_hit(self):
+        identity = _identity(1)
+        data, listed = self._get_instances([{'id': 'a'}], identity=identity)
+        self.assertEqual((data, listed), ([{'id': 'a'}], 1))
+        data, listed = self._get_instances([{'id': 'b'}], identity=identity)
+        self.assertEqual((data, listed), ([{'id': 'a'}], 0))
+
+    @override_settings(
+        INSTANCE_CACHE_TTL=0, INSTANCE_CACHE_STALE_WHILE_REVALIDATE=True
+    )
+    def test_stale_listing_is_served_while_refreshed(self):
+        identity = _identity(1)
+        self._get_instances([{'id': 'a'}], identity=identity)
+        data, _ = self._get_instances([{'id': 'b'}], identity=identity)
+        # The stale listing is served, and refreshed in the background
+        self.assertEqual(data, [{'id': 'a'}])
+        for thread in threading.enumerate():
+            if thread.name.startswith('revalidate-'):
+                thread.join()
+        with override_settings(INSTANCE_CACHE_TTL=30):
+            data, listed = self._get_instances([], identity=identity)
+        self.assertEqual((data, listed), ([{'id': 'b'}], 0))
+
+    def test_invalidating_an_identity_keeps_other_identities(self):
+        provider = mock.Mock(id=1)
+        identity, other_identity = _identity(1), _identity(2)
+        for kwargs in [
+            {'provider': provider},
+            {'identity': identity},
+            {'identity': other_identity},
+        ]:
+            self._get_instances([{'id': 'a'}], **kwargs)
+
+        invalidate_cached_instances(identity=identity)
+        self.assertEqual(
+            self._get_instances([{'id': 'b'}], identity=identity)[1], 1
+        )
+        self.assertEqual(
+            self._get_instances([{'id': 'b'}], provider=provider)[1], 1
+        )
+        self.assertEqual(
+            self._get_instances([{'id': 'b'}], identity=other_identity),
+            ([{'id': 'a'}], 0)
+        )
+
+    def test_invalidating_a_provider_bumps_every_listing(self):
+        provider = mock.Mock(id=1)
+        identity = _identity(1)
+        self._get_instances([{'id': 'a'}], provider=provider)
+        self._get_instances([{'id': 'a'}], identity=identity)
+        # Listings of other providers are kept
+        other_identity = _identity(2, provider_id=2)
+        self._get_instances([{'id': 'a'}], identity=other_identity)
+
+        invalidate_cached_instances(provider=provider)
+        self.assertEqual(
+            self._get_instances([{'id': 'b'}], provider=provider)[1], 1
+        )
+        self.assertEqual(
+            self._get_instances([{'id': 'b'}], identity=identity)[1], 1
+        )
+        self.assertEqual(
+            self._get_instances([{'id': 'b'}], identity=other_identity)[1], 0
+        )
@@ -0,0 +1,84 @@
+import datetime
+import threading
+import unittest
+
+import mock
+from django.utils import timezone
+
+from service.driver_pool import DriverPool, credentials_hash
+
+
+def _driver(expires_in=None):
+    driver = mock.Mock()
+    driver._connection.connection.auth_token_expires = \
+        timezone.now() + datetime.timedelta(seconds=expires_in)\
+        if expires_in is not None else None
+    return driver
+
+
+class DriverPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = DriverPool(
+            'test.drivers', max_size=2, ttl=None, expiry_margin=300
+        )
+
+    def test_reuses_driver_until_token_expires(self):
+        build_method = mock.Mock(side_effect=[_driver(3600), _driver(3600)])
+        first = self.pool.get_driver('identity', build_method)
+        self.assertIs(self.pool.get_driver('identity', build_method), first)
+        self.assertEqual(build_method.call_count, 1)
+
+        first._connection.connection.auth_token_expires = \
+            timezone.now() + datetime.timedelta(seconds=60)
+        second = self.pool.get_driver('identity', build_method)
+        self.assertIsNot(second, first)
+        stats = self.pool.stats()
+        self.assertEqual((stats['hits'], stats['reauths']), (2, 1))
+
+    def test_unauthenticated_driver_is_reused(self):
+        build_method = mock.Mock(return_value=_driver())
+        self.pool.get_driver('identity', build_method)
+        self.pool.get_driver('identity', build_method)
+        self.assertEqual(build_method.call_count, 1)
+
+    def test_threads_get_their_own_driver(self):
+        build_method = mock.Mock(side_effect=lambda: _driver(3600))
+        first = self.pool.get_driver('identity', build_method)
+        other_drivers = []
+        thread = threading.Thread(
+            target=lambda: other_drivers.extend(
+                [
+                    self.pool.get_driver('identity', build_method),
+                    self.pool.get_driver('identity', build_method)
+                ]
+            )
+        )
+        thread.start()
+        thread.join()
+        self.assertIsNot(other_drivers[0], first)
+        self.assertIs(other_drivers[1], other_drivers[0])
+        self.assertIs(self.pool.get_driver('identity', build_method), first)
+        self.assertEqual(build_method.call_count, 2)
+
+        # Invalidating a key forgets the drivers of every thread
+        self.pool.invalidate('identity')
+        self.assertEqual(len(self.pool), 0)
+
+    def test_evicts_least_recently_used_driver(self):
+        for key in ['a', 'b', 'c']:
+            self.pool.get_driver(key, lambda: _driver(3600))
+        self.assertEqual(len(self.pool), 2)
+        self.assertEqual(self.pool.stats()['evictions'], 1)
+
+    def test_credentials_hash_changes_with_credentials(self):
+        identity = mock.Mock()
+        identity.get_all_credentials.return_value = {
+            'key': 'user',
+            'secret': 'one'
+        }
+        first = credentials_hash(identity)
+        identity.get_all_credentials.return_value = {
+            'key': 'user',
+            'secret': 'two'
+        }
+        self.assertNotEqual(credentials_hash(identity), first)
@@ -0,0 +1,125 @@
+import mock
+from django.test import TestCase
+
+from api.tests.factories import (
+    ApplicationVersionFactory, GroupFactory, IdentityFactory,
+    ProviderMachineFactory
+)
+from core.models import (
+    ApplicationMembership, ApplicationVersionMembership, Credential,
+    ProviderMachineMembership
+)
+from service.accounts.openstack_manager import ProjectDirectory
+from service.image_membership import sync_image_memberships
+
+
+class FakeImage(dict):
+    def __init__(self, image_id, **kwargs):
+        super(FakeImage, self).__init__(id=image_id, **kwargs)
+        self.id = image_id
+
+
+class SyncImageMembershipsTest(TestCase):
+    def setUp(self):
+        version = ApplicationVersionFactory.create()
+        self.machines = [
+            ProviderMachineFactory.create(application_version=version)
+            for _ in range(2)
+        ]
+        self.provider = self.machines[0].instance_source.provider
+        self.groups = [GroupFactory.create() for _ in range(2)]
+        projects = []
+        for index, group in enumerate(self.groups):
+            project = mock.Mock(id='project-%s' % index)
+            project.name = group.name
+            projects.append(project)
+        self.account_driver = mock.Mock()
+        self.account_driver.get_image_member_statuses.side_effect = {
+            'image-0': {
+                'project-0': 'approved',
+                'project-unknown': 'approved'
+            },
+            'image-1': {
+                'project-0': 'approved',
+                'project-1': 'pending'
+            },
+            'image-public': {}
+        }.get
+        self.project_directory = ProjectDirectory(
+            self.account_driver, projects=projects
+        )
+        self.account_driver.get_project_by_id.return_value = None
+        self.cloud_machines = [
+            FakeImage('image-0', visibility='shared'),
+            FakeImage('image-1', visibility='private'),
+        ]
+
+    def _sync(self, machines, distribute=False):
+        return sync_image_memberships(
+            self.account_driver,
+            self.provider,
+            machines,
+            project_directory=self.project_directory,
+            distribute=distribute
+        )
+
+    def _member_identity(self, group, project_name):
+        identity = IdentityFactory.create_identity(
+            None, group=group, provider=self.provider
+        )
+        Credential.objects.create(
+            identity=identity, key='ex_project_name', value=project_name
+        )
+        return identity
+
+    def test_creates_missing_memberships_once(self):
+        machines = zip(self.cloud_machines, self.machines)
+        changes = self._sync(machines)
+        self.assertEqual(changes, {'images': 2, 'created': 7, 'shared': 0})
+        self.assertEqual(
+            set(
+                ProviderMachineMembership.objects.values_list(
+                    'provider_machine_id', 'group_id'
+                )
+            ),
+            set(
+                [
+                    (self.machines[0].id, self.groups[0].id),
+                    (self.machines[1].id, self.groups[0].id),
+                    (self.machines[1].id, self.groups[1].id),
+                ]
+            )
+        )
+        self.assertEqual(ApplicationVersionMembership.objects.count(), 2)
+        self.assertEqual(ApplicationMembership.objects.count(), 2)
+
+        changes = self._sync(machines)
+        self.assertEqual(changes['created'], 0)
+        self.assertEqual(ProviderMachineMembership.objects.count(), 3)
+
+    def test_skips_public_images(self):
+        changes = self._sync(
+            [(FakeImage('image-public', visibility='public'), self.machines[0])]
+        )
+        self.assertEqual(changes, {'images': 0, 'created': 0, 'shared': 0})
+        self.assertFalse(self.account_driver.get_image_member_statuses.called)
+
+    def test_distributes_to_existing_projects_only(self):
+        deleted_group = GroupFactory.create()
+        for group in [self.groups[1], deleted_group]:
+            ProviderMachineMembership.objects.create(
+                provider_machine=self.machines[0], group=group
+            )
+        identity = self._member_identity(self.groups[1], self.groups[1].name)
+        self._member_identity(deleted_group, deleted_group.name)
+        # Keystone does not know the deleted group's project
+        self.account_driver.get_project.return_value = None
+
+        changes = self._sync(
+            [(self.cloud_machines[0], self.machines[0])], distribute=True
+        )
+
+        self.assertEqual(changes['shared'], 1)
+        self.account_driver.share_image_with_identity.assert_called_once_with(
+            self.cloud_machines[0], identity
+        )
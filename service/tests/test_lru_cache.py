@@ -0,0 +1,48 @@
+import unittest
+
+import mock
+
+from service.lru_cache import LRUCache, cache_stats
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache('test.lru', max_size=2, ttl=None)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache_stats()['test.lru']['evictions'], 1)
+
+    def test_entries_expire(self):
+        cache = LRUCache('test.ttl', max_size=None, ttl=60)
+        with mock.patch('service.lru_cache.time.time', return_value=1000):
+            cache.set('a', 1)
+        with mock.patch('service.lru_cache.time.time', return_value=1059):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('service.lru_cache.time.time', return_value=1060):
+            self.assertEqual(cache.get('a'), None)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['expirations']), (1, 1))
+        self.assertEqual(stats['size'], 0)
+
+    def test_invalidate_matching(self):
+        cache = LRUCache('test.invalidate')
+        cache.set(('provider-1', 'image-1'), 1)
+        cache.set(('provider-1', 'image-2'), 2)
+        cache.set(('provider-2', 'image-1'), 3)
+        removed = cache.invalidate_matching(
+            lambda key: key[0] == 'provider-1'
+        )
+        self.assertEqual(removed, 2)
+        self.assertEqual(cache.get(('provider-2', 'image-1')), 3)
+
+    def test_get_or_set_does_not_store_falsy_values(self):
+        cache = LRUCache('test.falsy')
+        value_method = mock.Mock(return_value=None)
+        cache.get_or_set('a', value_method)
+        cache.get_or_set('a', value_method)
+        self.assertEqual(value_method.call_count, 2)
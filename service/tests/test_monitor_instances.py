@@ -0,0 +1,101 @@
+import unittest
+
+import mock
+from django.test import override_settings
+
+from service.tasks.monitoring import (
+    _monitor_tenants, _shard_tenants, monitor_instances_for
+)
+from service.tests.test_provider_lease import FakeRedis
+
+
+class ShardTenantsTest(unittest.TestCase):
+    def test_shards_are_sized_and_ordered_by_tenant(self):
+        instance_map = dict(
+            (tenant_name, [tenant_name + '-instance'])
+            for tenant_name in ['e', 'c', 'a', 'd', 'b']
+        )
+        shards = _shard_tenants(instance_map, shard_size=2)
+        self.assertEqual(
+            [sorted(shard.keys()) for shard in shards],
+            [['a', 'b'], ['c', 'd'], ['e']]
+        )
+        self.assertEqual(shards[1]['c'], ['c-instance'])
+        self.assertEqual(_shard_tenants({}, shard_size=2), [])
+
+    @override_settings(MONITOR_INSTANCES_SHARD_SIZE=3)
+    def test_default_shard_size(self):
+        instance_map = dict((str(index), []) for index in range(7))
+        self.assertEqual(
+            [len(shard) for shard in _shard_tenants(instance_map)], [3, 3, 1]
+        )
+
+
+def _convert_esh_instances(driver, running_instances, *args):
+    if running_instances == ['broken']:
+        raise Exception("Cannot convert")
+    return running_instances
+
+
+@mock.patch(
+    'service.tasks.monitoring.convert_esh_instances',
+    side_effect=_convert_esh_instances
+)
+@mock.patch('service.tasks.monitoring.get_cached_driver')
+@mock.patch('service.tasks.monitoring._cleanup_missing_instances')
+@mock.patch('service.tasks.monitoring._get_identity_from_tenant_name')
+@mock.patch('service.tasks.monitoring.prefetch_credentials')
+@mock.patch('service.tasks.monitoring.load_project_identities')
+class MonitorTenantsTest(unittest.TestCase):
+    def setUp(self):
+        self.provider = mock.Mock()
+        self.provider.type.name = 'OpenStack'
+        self.instance_map = {
+            'tenant-a': ['a1', 'a2'],
+            'tenant-b': ['broken'],
+            'tenant-c': ['c1'],
+            'tenant-d': [],
+        }
+
+    def test_tenant_failures_are_isolated(self, *mocks):
+        load_project_identities, _, _, cleanup_missing_instances = mocks[:4]
+        cleanup_missing_instances.side_effect = \
+            lambda identity, instances: 1 / len(instances)
+        timing = _monitor_tenants(self.provider, self.instance_map)
+        self.assertEqual(timing['tenants'], 4)
+        self.assertEqual(timing['instances'], 3)
+        # The broken tenant is not cleaned up: its instances are unknown
+        self.assertEqual(
+            [
+                call[0][1] for call in cleanup_missing_instances.call_args_list
+            ], [['a1', 'a2'], ['c1'], []]
+        )
+        load_project_identities.assert_called_once_with(
+            [self.provider], mock.ANY
+        )
+
+    @override_settings(
+        MONITOR_INSTANCES_SHARD_SIZE=2, MONITOR_INSTANCES_THREADS=2
+    )
+    @mock.patch('service.tasks.monitoring.db_connection')
+    @mock.patch('service.tasks.monitoring._log_monitor_instances_cycle')
+    @mock.patch('service.tasks.monitoring._get_instance_owner_map')
+    @mock.patch('service.tasks.monitoring.Provider')
+    @mock.patch('service.cache.redis_connection')
+    def test_threads_fan_out(
+        self, redis_connection, provider_model, get_instance_owner_map,
+        log_monitor_instances_cycle, db_connection, *mocks
+    ):
+        redis_connection.return_value = FakeRedis()
+        provider_model.objects.get.return_value = self.provider
+        get_instance_owner_map.return_value = self.instance_map
+        monitor_instances_for(1, fan_out='threads')
+
+        # Two shards of two tenants, each closing its database connection
+        self.assertEqual(db_connection.close.call_count, 2)
+        _, timings, _ = log_monitor_instances_cycle.call_args[0]
+        self.assertEqual(
+            sorted(
+                (timing['tenants'], timing['instances']) for timing in timings
+            ), [(2, 1), (2, 2)]
+        )
@@ -0,0 +1,64 @@
+import threading
+
+import mock
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from api.tests.factories import ProviderFactory
+from service.accounts.openstack_manager import timeout_after
+from service.tasks.monitoring import monitor_resources_for
+from service.tests.test_provider_lease import FakeRedis
+
+
+def _sync_image_memberships(account_driver, provider, machines, **kwargs):
+    # Shares one image, as sync_image_memberships does when distributing
+    if settings.ENFORCING:
+        account_driver.share_image_with_identity('image', 'identity')
+    return {'images': 1, 'created': 0, 'shared': int(settings.ENFORCING)}
+
+
+@override_settings(ENFORCING=True)
+@mock.patch(
+    'service.tasks.monitoring.sync_image_memberships',
+    side_effect=_sync_image_memberships
+)
+@mock.patch('service.tasks.monitoring.MachineValidationPluginManager')
+@mock.patch('service.tasks.monitoring.get_account_driver')
+@mock.patch('service.tasks.monitoring.monitor_instances_for')
+@mock.patch('service.tasks.monitoring.monitor_volumes_for')
+@mock.patch('service.tasks.monitoring.monitor_sizes_for')
+@mock.patch('service.cache.redis_connection')
+class MonitorResourcesTest(TestCase):
+    def test_images_are_shared_on_the_calling_thread(
+        self, redis_connection, monitor_sizes_for, monitor_volumes_for,
+        monitor_instances_for, get_account_driver, *mocks
+    ):
+        redis_connection.return_value = FakeRedis()
+        provider = ProviderFactory.create()
+        sharing_threads = []
+
+        # Like AccountDriver.share_image_with_identity, which times out
+        # with SIGALRM
+        @timeout_after(10)
+        def share_image_with_identity(cloud_machine, identity):
+            sharing_threads.append(threading.current_thread())
+
+        account_driver = get_account_driver.return_value
+        account_driver.list_all_images.return_value = []
+        account_driver.list_projects.return_value = []
+        account_driver.share_image_with_identity = share_image_with_identity
+        monitor_sizes_for.return_value = 'sizes'
+        monitor_volumes_for.side_effect = Exception("Cannot list volumes")
+
+        resources = monitor_resources_for(provider.id)
+
+        self.assertEqual(sharing_threads, [threading.current_thread()])
+        self.assertEqual(resources['machines'], [])
+        self.assertEqual(resources['sizes'], 'sizes')
+        # A failed phase does not stop the others
+        self.assertIsNone(resources['volumes'])
+        self.assertTrue(monitor_instances_for.called)
+        self.assertEqual(
+            sorted(resources['durations'].keys()),
+            ['instances', 'machines', 'sizes', 'volumes']
+        )
@@ -0,0 +1,59 @@
+import unittest
+
+import mock
+import redis
+
+from service.cache import lease
+from service.tasks.monitoring import provider_lease
+
+
+class FakeRedis(object):
+    def __init__(self):
+        self.keys = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = value
+        return True
+
+    def eval(self, script, numkeys, key, token):
+        if self.keys.get(key) == token:
+            del self.keys[key]
+            return 1
+        return 0
+
+
+@mock.patch('service.cache.redis_connection')
+class LeaseTest(unittest.TestCase):
+    def test_lease_is_exclusive_until_released(self, redis_connection):
+        redis_connection.return_value = FakeRedis()
+        with lease('monitor.sizes.1', 60) as acquired:
+            self.assertTrue(acquired)
+            with lease('monitor.sizes.1', 60) as acquired_again:
+                self.assertFalse(acquired_again)
+            with lease('monitor.sizes.2', 60) as other_provider:
+                self.assertTrue(other_provider)
+        with lease('monitor.sizes.1', 60) as acquired:
+            self.assertTrue(acquired)
+
+    def test_lease_is_granted_without_redis(self, redis_connection):
+        redis_connection.return_value.set.side_effect = \
+            redis.exceptions.ConnectionError()
+        with lease('monitor.sizes.1', 60) as acquired:
+            self.assertTrue(acquired)
+
+    def test_provider_lease_skips_overlapping_runs(self, redis_connection):
+        redis_connection.return_value = FakeRedis()
+        calls = []
+
+        @provider_lease('volumes')
+        def monitor_volumes_for(provider_id):
+            calls.append(provider_id)
+            # An overlapping beat for the same provider is skipped
+            self.assertEqual(monitor_volumes_for(provider_id), None)
+            return provider_id
+
+        self.assertEqual(monitor_volumes_for(1), 1)
+        self.assertEqual(monitor_volumes_for(1), 1)
+        self.assertEqual(calls, [1, 1])
@@ -0,0 +1,49 @@
+import mock
+from django.test import TestCase
+
+from api.tests.factories import IdentityFactory, QuotaFactory, UserFactory
+from service import exceptions
+from service.lru_cache import LRUCache
+from service.volume import create_esh_volume
+
+
+class QuotaReservationTest(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.identity = IdentityFactory.create_identity(
+            self.user, quota=QuotaFactory.create(storage=15, storage_count=5)
+        )
+        self.driver = mock.Mock()
+        self.driver.list_volumes.return_value = []
+        self.driver._connection.ex_list_snapshots.return_value = []
+        for patcher in [
+            mock.patch(
+                'service.quota.get_cached_driver', return_value=self.driver
+            ),
+            mock.patch(
+                'service.quota._quota_usage_cache',
+                LRUCache('test.quota.usage', max_size=8, ttl=60)
+            ),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _create_volume(self, size):
+        return create_esh_volume(
+            self.driver, self.user.username, self.identity.uuid, 'volume',
+            size
+        )
+
+    def test_failed_create_releases_reservation(self):
+        self.driver.create_volume.side_effect = Exception("Cinder is down")
+        with self.assertRaises(Exception):
+            self._create_volume(10)
+
+        # The 10 GB reserved by the failed create are not counted
+        self.driver.create_volume.side_effect = None
+        self.driver.create_volume.return_value = (True, mock.Mock(size=10))
+        self.assertTrue(self._create_volume(10)[0])
+
+        self.driver.list_volumes.return_value = [mock.Mock(size=10)]
+        with self.assertRaises(exceptions.OverQuotaError):
+            self._create_volume(10)
@@ -0,0 +1,71 @@
+import unittest
+
+import mock
+
+from service.accounts.openstack_manager import (
+    ProjectDirectory, iter_project_instances
+)
+from service.monitoring import _convert_tenant_id_to_names
+
+
+def _mock_instance(tenant_id, status='active'):
+    instance = mock.Mock()
+    instance.owner = tenant_id
+    instance.extra = {'tenantId': tenant_id, 'status': status}
+    instance._node.extra = {'metadata': {}}
+    return instance
+
+
+class TenantLookupTest(unittest.TestCase):
+    def setUp(self):
+        self.projects = [mock.Mock(id='id-%s' % i) for i in range(3)]
+        for index, project in enumerate(self.projects):
+            project.name = 'project-%s' % index
+        self.project_index = dict((p.id, p) for p in self.projects)
+
+    def test_groups_instances_by_project(self):
+        instances = [
+            _mock_instance('id-0'),
+            _mock_instance('id-2', status='suspended'),
+            _mock_instance('id-0'),
+            _mock_instance('id-unknown'),
+        ]
+        project_map = dict(
+            iter_project_instances(instances, self.project_index)
+        )
+        self.assertEqual(
+            project_map, {
+                self.projects[0]: [instances[0], instances[2]],
+                self.projects[2]: [instances[1]]
+            }
+        )
+        project_map = dict(
+            iter_project_instances(
+                instances, self.project_index, status_list=['active']
+            )
+        )
+        self.assertEqual(project_map.keys(), [self.projects[0]])
+
+    def test_convert_tenant_id_to_names(self):
+        instances = [_mock_instance('id-1'), _mock_instance('id-unknown')]
+        _convert_tenant_id_to_names(instances, self.projects)
+        self.assertEqual(
+            [i.owner for i in instances], ['project-1', 'id-unknown']
+        )
+
+    def test_project_directory_counts_hits_and_misses(self):
+        account_driver = mock.Mock()
+        account_driver.get_project_by_id.return_value = None
+        directory = ProjectDirectory(account_driver, projects=self.projects)
+        self.assertEqual(directory.get_by_id('id-1'), self.projects[1])
+        self.assertEqual(directory.get_by_name('project-2'), self.projects[2])
+        self.assertEqual(directory.get_by_id('id-gone'), None)
+        self.assertEqual(directory.get_by_id('id-gone'), None)
+        account_driver.get_project_by_id.assert_called_once_with('id-gone')
+        self.assertEqual(
+            directory.stats(), {
+                'projects': 3,
+                'hits': 3,
+                'misses': 1
+            }
+        )
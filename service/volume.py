@@ -8,7 +8,7 @@ from core.models.instance_source import InstanceSource
 
 from service.cache import get_cached_driver
 from service.driver import _retrieve_source, get_esh_driver
-from service.quota import check_over_storage_quota
+from service.quota import check_over_storage_quota, invalidate_quota_usage
 from service import exceptions
 from service.instance import boot_volume_instance
 
@@ -143,14 +143,20 @@ def create_snapshot(
     if not volume:
         raise ValueError("Volume is required to create VolumeSnapshot")
     try:
-        check_over_storage_quota(
-            username, identity_uuid, new_snapshot_size=volume.size
+        try:
+            check_over_storage_quota(
+                username, identity_uuid, new_snapshot_size=volume.size
+            )
+        except ValidationError as over_quota:
+            raise exceptions.OverQuotaError(message=over_quota.message)
+        esh_ss = esh_driver._connection.ex_create_snapshot(
+            volume_id=volume.id,
+            display_name=name,
+            display_description=description
         )
-    except ValidationError as over_quota:
-        raise exceptions.OverQuotaError(message=over_quota.message)
-    esh_ss = esh_driver._connection.ex_create_snapshot(
-        volume_id=volume.id, display_name=name, display_description=description
-    )
+    finally:
+        # Release the reserved quota, see service.quota.get_quota_usage
+        invalidate_quota_usage(identity_uuid)
 
     if not esh_ss and raise_exception:
         raise exceptions.VolumeError("The volume failed to be created.")
@@ -172,24 +178,30 @@ def create_esh_volume(
 ):
     quota = get_quota(identity_uuid)
     try:
-        check_over_storage_quota(username, identity_uuid, new_volume_size=size)
-    except ValidationError as over_quota:
-        raise exceptions.OverQuotaError(message=over_quota.message)
-    if not has_storage_count_quota(esh_driver, quota, 1):
-        raise exceptions.OverQuotaError(
-            message="Maximum # of Storage Volumes Exceeded"
+        try:
+            check_over_storage_quota(
+                username, identity_uuid, new_volume_size=size
+            )
+        except ValidationError as over_quota:
+            raise exceptions.OverQuotaError(message=over_quota.message)
+        if not has_storage_count_quota(esh_driver, quota, 1):
+            raise exceptions.OverQuotaError(
+                message="Maximum # of Storage Volumes Exceeded"
+            )
+        # NOTE: Calling non-standard create_volume_obj so we know the ID
+        # of newly created volume. Libcloud just returns 'True'... --Steve
+        conn_kwargs = {'max_attempts': 1}
+        success, esh_volume = esh_driver.create_volume(
+            size=size,
+            name=name,
+            metadata=metadata,
+            snapshot=snapshot,
+            image=image,
+            **conn_kwargs
         )
-    # NOTE: Calling non-standard create_volume_obj so we know the ID
-    # of newly created volume. Libcloud just returns 'True'... --Steve
-    conn_kwargs = {'max_attempts': 1}
-    success, esh_volume = esh_driver.create_volume(
-        size=size,
-        name=name,
-        metadata=metadata,
-        snapshot=snapshot,
-        image=image,
-        **conn_kwargs
-    )
+    finally:
+        # Release the reserved quota, see service.quota.get_quota_usage
+        invalidate_quota_usage(identity_uuid)
 
     if not success and raise_exception:
         raise exceptions.VolumeError("The volume failed to be created.")
@@ -223,7 +235,9 @@ def destroy_volume_or_fail(volume, user, cascade=False):
             driver.destroy_snapshot(snapshot)
 
     # destroy the volume successfully or raise an exception
-    if not driver.destroy_volume(esh_volume):
+    destroyed = driver.destroy_volume(esh_volume)
+    invalidate_quota_usage(identity.uuid)
+    if not destroyed:
         raise Exception("Encountered an error destroying the volume.")
 
 